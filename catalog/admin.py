@@ -1,4 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import (
     CatalogItem,
@@ -6,39 +10,144 @@ from .models import (
     CatalogGroup,
     ItemDefinition,
     CatalogEntry,
+    Task,
 )
 
 
+def estimated_count(queryset):
+    """
+    Row count of the whole table from the database statistics, None when the
+    backend has no cheap estimate
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [table],
+            )
+        elif connection.vendor == "sqlite":
+            # Integer primary keys are the rowid, MAX() reads the last b-tree
+            # page. Deleted rows make it an overestimate.
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a large table: the unfiltered changelist
+    uses the database estimate, filtered ones count at most COUNT_LIMIT rows.
+    """
+
+    COUNT_LIMIT = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None:
+                return estimate
+        return queryset[: self.COUNT_LIMIT].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows"""
+
+    paginator = EstimatedCountPaginator
+    # Avoids a second COUNT(*) of the unfiltered table
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # With prefix search every word would have to start a field, the
+        # whole input is one prefix instead so "oat m" finds "Oat milk"
+        search_term = search_term.strip()
+        if search_term and '"' not in search_term:
+            search_term = f'"{search_term}"'
+        return super().get_search_results(request, queryset, search_term)
+
+
 @admin.register(ItemGroup)
 class ItemGroupAdmin(admin.ModelAdmin):
-    list_display = ["title", "slug"]
+    list_display = ["title", "parent", "slug"]
+    list_select_related = ["parent"]
+    search_fields = ["^title"]
+    autocomplete_fields = ["parent"]
 
 
 @admin.register(CatalogGroup)
 class CatalogGroupAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ["^name"]
+    autocomplete_fields = ["owners"]
 
 
 @admin.register(ItemDefinition)
-class ItemDefinitionAdmin(admin.ModelAdmin):
+class ItemDefinitionAdmin(LargeTableAdmin):
     list_display = ["name", "slug"]
-    search_fields = ["name__icontains", "group__title"]
+    # Prefix searches can use the name indexes, see migration 0013
+    search_fields = ["^name", "^group__title"]
     ordering = ["name", "pk"]
     prepopulated_fields = {"slug": ("name",)}
+    autocomplete_fields = ["group"]
+
+    def get_queryset(self, request):
+        # str() lists the groups, in the changelist and autocomplete results
+        return super().get_queryset(request).prefetch_related("group")
 
 
 @admin.register(CatalogEntry)
-class CatalogEntryAdmin(admin.ModelAdmin):
-    list_display = ["item_definition", "catalog_group", "to_buy"]
+class CatalogEntryAdmin(LargeTableAdmin):
+    list_display = ["item_name", "catalog_group", "to_buy"]
     list_editable = ["to_buy"]
     list_filter = ["to_buy", "catalog_group"]
-    search_fields = ["item_definition__name__icontains"]
+    list_select_related = ["item_definition", "catalog_group"]
+    search_fields = ["^item_definition__name"]
     ordering = ["item_definition__name", "pk"]
+    autocomplete_fields = ["item_definition", "catalog_group"]
+
+    @admin.display(description="Item", ordering="item_definition__name")
+    def item_name(self, obj):
+        # str(item_definition) lists its groups, one query per row
+        return obj.item_definition.name
+
+    # With SHARDS the entries are spread over several databases and their
+    # ids are only unique within one, the admin would show a single shard
+    def has_view_permission(self, request, obj=None):
+        return not settings.SHARDS and super().has_view_permission(request, obj)
+
+    def has_add_permission(self, request):
+        return not settings.SHARDS and super().has_add_permission(request)
+
+    def has_change_permission(self, request, obj=None):
+        return not settings.SHARDS and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not settings.SHARDS and super().has_delete_permission(request, obj)
 
 
 @admin.register(CatalogItem)
-class CatalogItemAdmin(admin.ModelAdmin):
+class CatalogItemAdmin(LargeTableAdmin):
     list_display = ["name", "slug", "to_buy", "catalog_group"]
     list_filter = ["to_buy", "catalog_group"]
-    search_fields = ["name__icontains", "group__title"]
+    list_select_related = ["catalog_group"]
+    search_fields = ["^name", "^group__title"]
     ordering = ["name", "pk"]
+    autocomplete_fields = ["group", "catalog_group"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("group")
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "run_at", "attempts", "finished_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["^name", "idempotency_key"]
+    ordering = ["-run_at", "-pk"]
@@ -6,6 +6,7 @@ from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
@@ -21,7 +22,13 @@ from .serializers import (
     CatalogGroupSerializer,
     CatalogGroupInvitationSerializer,
     ItemDefinitionSerializer,
+    QuantityAdjustmentSerializer,
+    QuantitySerializer,
 )
+from .catalog_context import catalog_filter, get_catalog_group
+from .sharding import locked_shard
+from .throttling import TokenBucketThrottle
+from .writes import write
 
 
 class CatalogResourceSerializer(ItemDefinitionSerializer):
@@ -41,17 +48,13 @@ class CatalogResourceSerializer(ItemDefinitionSerializer):
         Returns the 'to_buy' status for the current user.
         Defaults to False if no CatalogEntry exists.
         """
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
+        if hasattr(obj, "user_to_buy"):
+            # Annotated by CatalogResourceViewSet.get_queryset
+            return obj.user_to_buy
 
-        try:
-            entry = CatalogEntry.objects.get(
-                item_definition=obj, catalog_group__owners=user
-            )
-            return entry.to_buy
-        except CatalogEntry.DoesNotExist:
-            return False
+        return CatalogEntry.objects.filter(
+            catalog_filter(self.context["request"]), item_definition=obj, to_buy=True
+        ).exists()
 
 
 def search_smart_split(search_terms):
@@ -77,7 +80,9 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        return request.user in obj.owners.all() or request.user.is_superuser
+        return (
+            request.user.is_superuser or obj.owners.filter(pk=request.user.pk).exists()
+        )
 
 
 class MyBackend(filters.SearchFilter):
@@ -105,6 +110,28 @@ class CatalogResourceViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [MyBackend]
     search_fields = ["slug", "group__slug"]
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scopes = {
+        "list": "search",
+        "partial_update": "write",
+        "quantity": "write",
+        "quantities": "write",
+    }
+
+    def get_queryset(self):
+        """
+        Loads the groups and the user's 'to_buy' status of all items with
+        the page instead of one query per item.
+        """
+        to_buy_entries = CatalogEntry.objects.filter(
+            catalog_filter(self.request), item_definition=OuterRef("pk"), to_buy=True
+        )
+        return (
+            super()
+            .get_queryset()
+            .prefetch_related("group")
+            .annotate(user_to_buy=Exists(to_buy_entries))
+        )
 
     def get_serializer_context(self):
         """
@@ -126,8 +153,7 @@ class CatalogResourceViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        user = request.user
-        catalog_group = CatalogGroup.objects.filter(owners=user).first()
+        catalog_group = get_catalog_group(request)
 
         if not catalog_group:
             return Response(
@@ -135,24 +161,81 @@ class CatalogResourceViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        entry, created = CatalogEntry.objects.get_or_create(
-            item_definition=instance,
-            catalog_group=catalog_group,
-            defaults={"to_buy": to_buy},
-        )
-
-        if not created:
-            entry.to_buy = to_buy
-            entry.save()
+        write(self.save_to_buy, instance, catalog_group, to_buy)
 
+        # The annotated status was loaded before the update
+        del instance.user_to_buy
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+    def save_to_buy(self, item_definition, catalog_group, to_buy):
+        with locked_shard(catalog_group):
+            entry, created = CatalogEntry.objects.get_or_create(
+                item_definition=item_definition,
+                catalog_group=catalog_group,
+                defaults={"to_buy": to_buy},
+            )
+
+            if not created:
+                entry.to_buy = to_buy
+                entry.save()
+
+    def adjust_quantities(self, item_ids, adjustment):
+        entries = CatalogEntry.objects.filter(
+            catalog_filter(self.request), item_definition__in=item_ids
+        )
+        with locked_shard(get_catalog_group(self.request)):
+            counts = entries.adjust_count(
+                adjustment["op"],
+                adjustment["amount"],
+                clamp=adjustment["clamp"],
+                key="item_definition_id",
+            )
+        return [{"pk": pk, "count": count} for pk, count in sorted(counts.items())]
+
+    @action(detail=True, methods=["post"])
+    def quantity(self, request, pk=None):
+        """
+        Increments, decrements or sets the quantity of an item in the user's
+        catalog: {"op": "increment", "amount": "1", "clamp": true}.
+        """
+        adjustment = QuantityAdjustmentSerializer(data=request.data)
+        adjustment.is_valid(raise_exception=True)
+        try:
+            item_id = int(pk)
+        except ValueError:
+            results = []
+        else:
+            results = self.adjust_quantities([item_id], adjustment.validated_data)
+        if not results:
+            return Response(
+                {"error": "The item is not in your catalog."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(QuantitySerializer(results[0]).data)
+
+    @action(detail=False, methods=["post"])
+    def quantities(self, request):
+        """
+        Adjusts the quantities of several items at once, the items are
+        listed by pk in "items". Items not in the catalog are skipped.
+        """
+        adjustment = QuantityAdjustmentSerializer(data=request.data)
+        adjustment.is_valid(raise_exception=True)
+        if "items" not in adjustment.validated_data:
+            raise ValidationError({"items": "This field is required."})
+        results = self.adjust_quantities(
+            adjustment.validated_data["items"], adjustment.validated_data
+        )
+        return Response({"results": QuantitySerializer(results, many=True).data})
+
 
 class CatalogGroupViewSet(viewsets.ModelViewSet):
     queryset = CatalogGroup.objects.all()
     serializer_class = CatalogGroupSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scopes = {"create_invitation": "invitation"}
 
     def get_queryset(self):
         user = self.request.user
@@ -0,0 +1,106 @@
+"""
+Caches the authenticated user and their catalog group in the shared cache,
+so that with CACHED_AUTH enabled the auth plumbing of a warm request doesn't
+touch the database. Cached entries are dropped whenever the underlying rows
+change, see the receivers below.
+"""
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from social_django.models import UserSocialAuth
+
+from .models import CatalogGroup
+
+USER_KEY = "catalog:user:{}"
+CATALOG_GROUP_KEY = "catalog:user-catalog-group:{}"
+# Stored for users without a catalog group, cache.get() returns None on a miss
+NO_CATALOG_GROUP = 0
+
+
+def get_user(request):
+    """
+    Same as django.contrib.auth.get_user, but the user is loaded from the
+    cache when possible. The session hash is still verified on every request,
+    anything unusual is left to Django's implementation.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    if user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    user = cache.get(USER_KEY.format(user_id))
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(USER_KEY.format(user.pk), user, settings.CACHED_AUTH_TIMEOUT)
+        return user
+
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if session_hash and constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    ):
+        return user
+    return auth.get_user(request)
+
+
+def get_user_catalog_group(user):
+    """Returns the catalog group of the user, cached when CACHED_AUTH is on."""
+    if not settings.CACHED_AUTH:
+        return CatalogGroup.objects.filter(owners=user).first()
+
+    key = CATALOG_GROUP_KEY.format(user.pk)
+    catalog_group = cache.get(key)
+    if catalog_group is None:
+        catalog_group = CatalogGroup.objects.filter(owners=user).first()
+        cache.set(key, catalog_group or NO_CATALOG_GROUP, settings.CACHED_AUTH_TIMEOUT)
+    return catalog_group or None
+
+
+def invalidate_user(user_id):
+    cache.delete_many([USER_KEY.format(user_id), CATALOG_GROUP_KEY.format(user_id)])
+
+
+def invalidate_catalog_group_owners(user_ids):
+    cache.delete_many([CATALOG_GROUP_KEY.format(user_id) for user_id in user_ids])
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Covers password changes, last_login updates and social-auth user details
+    invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserSocialAuth)
+def social_auth_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
+
+
+@receiver(m2m_changed, sender=CatalogGroup.owners.through)
+def catalog_group_owners_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and reverse:
+        invalidate_catalog_group_owners([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        invalidate_catalog_group_owners(pk_set)
+    elif action == "pre_clear" and settings.CACHED_AUTH:
+        invalidate_catalog_group_owners(instance.owners.values_list("pk", flat=True))
+
+
+@receiver([post_save, pre_delete], sender=CatalogGroup)
+def catalog_group_changed(sender, instance, created=False, **kwargs):
+    # Owners are only looked up when cached groups may exist, to keep plain
+    # writes free of extra queries
+    if settings.CACHED_AUTH and not created:
+        invalidate_catalog_group_owners(instance.owners.values_list("pk", flat=True))
@@ -0,0 +1,103 @@
+"""
+Online copies of the SQLite database with SQLite's backup API. The copy
+advances a few pages at a time and sleeps in between, so the server keeps
+reading and writing while a large database is copied. Used by the
+backup_db, restore_db and refresh_replica commands; with shards the backup
+is one file per database, see backup_path().
+"""
+
+import gzip
+import os
+import shutil
+import sqlite3
+
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections
+
+# Pages copied per backup step, the database is unlocked between steps
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.005
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def backup_path(path, alias):
+    """
+    Backup file of the database `alias` next to the default database's
+    `path`: backup.sqlite3.gz holds default, backup.shard_0.sqlite3.gz shard_0
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        return path
+    directory, name = os.path.split(path)
+    base, dot, extensions = name.partition(".")
+    return os.path.join(directory, f"{base}.{alias}{dot}{extensions}")
+
+
+def sqlite_connection(using=DEFAULT_DB_ALIAS):
+    """Returns the open sqlite3 connection behind a Django database"""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        raise NotSupportedError("Backups are only supported for SQLite databases.")
+    connection.ensure_connection()
+    return connection.connection
+
+
+def copy_database(
+    target,
+    using=DEFAULT_DB_ALIAS,
+    pages=BACKUP_STEP_PAGES,
+    sleep=BACKUP_STEP_SLEEP,
+):
+    """
+    Copies the database into the file `target`, which is swapped in
+    atomically. Connections opened on the old file keep reading it until
+    they are closed.
+    """
+    tmp_path = f"{target}.tmp"
+    destination = sqlite3.connect(tmp_path)
+    try:
+        sqlite_connection(using).backup(destination, pages=pages, sleep=sleep)
+    finally:
+        destination.close()
+    os.replace(tmp_path, target)
+
+
+def restore_database(
+    source,
+    using=DEFAULT_DB_ALIAS,
+    pages=BACKUP_STEP_PAGES,
+    sleep=BACKUP_STEP_SLEEP,
+):
+    """Replaces the content of the database with the SQLite file `source`"""
+    origin = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        origin.backup(sqlite_connection(using), pages=pages, sleep=sleep)
+    finally:
+        origin.close()
+
+
+def integrity_check(path):
+    """Returns the problems SQLite finds in the file, empty when it is sound"""
+    try:
+        database = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = database.execute("PRAGMA integrity_check").fetchall()
+        finally:
+            database.close()
+    except sqlite3.DatabaseError as exc:
+        return [str(exc)]
+    problems = [row[0] for row in rows]
+    return [] if problems == ["ok"] else problems
+
+
+def is_gzipped(path):
+    with open(path, "rb") as file:
+        return file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+
+def compress(source, target):
+    with open(source, "rb") as origin, gzip.open(target, "wb") as destination:
+        shutil.copyfileobj(origin, destination)
+
+
+def decompress(source, target):
+    with gzip.open(source, "rb") as origin, open(target, "wb") as destination:
+        shutil.copyfileobj(origin, destination)
@@ -0,0 +1,51 @@
+"""
+Request-scoped catalog of the current user. CatalogGroupMiddleware resolves
+it once per request, which also checks that the user owns it, so catalog
+data can then be filtered by `catalog_group_id` alone instead of joining the
+owners table on every query.
+"""
+
+from django.db.models import Q
+
+from .auth_cache import get_user_catalog_group
+from .routers import set_current_shard, shard_for
+
+# (user id, catalog group) stored on the HttpRequest
+SCOPE_ATTRIBUTE = "_catalog_scope"
+
+
+def set_catalog_group(request, user, catalog_group):
+    setattr(request, SCOPE_ATTRIBUTE, (user.pk, catalog_group))
+    # Catalog queries of the rest of the request go to its shard
+    set_current_shard(shard_for(catalog_group))
+
+
+def get_catalog_group(request):
+    """
+    Returns the catalog group of request.user, or None. Works with DRF
+    requests, whose user may be authenticated differently than the one the
+    middleware saw, and with requests that didn't go through the middleware.
+    """
+    http_request = getattr(request, "_request", request)
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    scope = getattr(http_request, SCOPE_ATTRIBUTE, None)
+    if scope is not None and scope[0] == user.pk:
+        return scope[1]
+
+    catalog_group = get_user_catalog_group(user)
+    set_catalog_group(http_request, user, catalog_group)
+    return catalog_group
+
+
+def catalog_filter(request, lookup="catalog_group_id"):
+    """
+    Q object limiting a query to the current catalog, `lookup` is the path
+    to the catalog group id. Matches nothing for users without a catalog.
+    """
+    catalog_group = get_catalog_group(request)
+    if catalog_group is None:
+        return Q(pk__in=[])
+    return Q(**{lookup: catalog_group.pk})
@@ -0,0 +1,53 @@
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Logging handler that only puts records on a queue. A listener thread
+    formats them and writes them to the stream, so request threads never
+    block on log output. When the queue is full records are dropped instead
+    of waiting.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        self.target = logging.StreamHandler(stream)
+        super().__init__(queue.Queue(maxsize))
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        # The formatter is used by the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Records stay in this process, so they are formatted later by the
+        # listener instead of on the logging thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, `data` holds the fields"""
+
+    def format(self, record):
+        fields = {
+            "time": self.formatTime(record, self.datefmt),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        fields.update(getattr(record, "data", {}))
+        return json.dumps(fields, default=str)
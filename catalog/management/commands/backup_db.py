@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from catalog.backup import (
+    BACKUP_STEP_PAGES,
+    BACKUP_STEP_SLEEP,
+    backup_path,
+    compress,
+    copy_database,
+    integrity_check,
+)
+from catalog.sharding import entry_databases
+
+
+class Command(BaseCommand):
+    help = "Back up the SQLite databases online, without blocking the server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Backup file, gzipped when it ends in .gz")
+        parser.add_argument(
+            "--database",
+            help="Database to back up into path, by default the default "
+            "database and every shard, each in its own file",
+        )
+        parser.add_argument(
+            "--gzip", action="store_true", help="Compress the backup with gzip"
+        )
+        parser.add_argument(
+            "--no-verify",
+            action="store_false",
+            dest="verify",
+            help="Skip the integrity check of the backup",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=BACKUP_STEP_PAGES,
+            help="Pages copied per step",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=BACKUP_STEP_SLEEP,
+            help="Seconds the database is left alone between steps",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if options["database"]:
+            targets = [(options["database"], path)]
+        else:
+            targets = [(alias, backup_path(path, alias)) for alias in entry_databases()]
+        for alias, target in targets:
+            self.back_up(alias, target, options)
+
+    def back_up(self, alias, path, options):
+        started = time.monotonic()
+        copy_path = f"{path}.copy"
+        try:
+            copy_database(
+                copy_path,
+                using=alias,
+                pages=options["pages"],
+                sleep=options["sleep"],
+            )
+        except NotSupportedError as exc:
+            raise CommandError(exc)
+
+        try:
+            if options["verify"]:
+                problems = integrity_check(copy_path)
+                if problems:
+                    raise CommandError(
+                        "Backup failed the integrity check: " + "; ".join(problems)
+                    )
+            if options["gzip"] or path.endswith(".gz"):
+                compress(copy_path, f"{path}.tmp")
+                os.replace(f"{path}.tmp", path)
+            else:
+                os.replace(copy_path, path)
+        finally:
+            if os.path.exists(copy_path):
+                os.remove(copy_path)
+
+        self.stdout.write(
+            f"Backed up {alias} to {path} ({os.path.getsize(path)} bytes) "
+            f"in {time.monotonic() - started:.2f}s"
+        )
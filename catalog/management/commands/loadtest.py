@@ -0,0 +1,320 @@
+import asyncio
+import http.client
+import logging
+import math
+import random
+import statistics
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from catalog.models import CatalogEntry, CatalogGroup, ItemDefinition
+from catalog.routers import shard_for, use_shard
+from catalog.transports import AsgiTransport, HttpTransport
+
+DEFAULT_MIX = "index=50,search=30,toggle=15,create=5"
+OPERATIONS = ("index", "search", "toggle", "create")
+USERNAME = "loadtest-{}"
+ENTRIES_PER_USER = 20
+# Matches "database is locked" and "database table is locked"
+LOCKED_MESSAGE = "is locked"
+
+
+def parse_mix(value):
+    """Parses "index=50,search=30" into {"index": 50, "search": 30}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation {name!r}, use {OPERATIONS}")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise CommandError(f"Weight of {name} must be a number")
+    if not any(mix.values()):
+        raise CommandError("At least one operation needs a positive weight")
+    return mix
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize(results, elapsed):
+    """
+    Aggregates (operation, status, seconds, locked) tuples into overall and
+    per-operation rows. A status of 0 means the request didn't complete.
+    """
+    groups = defaultdict(list)
+    for result in results:
+        groups["all"].append(result)
+        groups[result[0]].append(result)
+
+    rows = {}
+    for name, group in groups.items():
+        latencies = sorted(seconds * 1000 for _, _, seconds, _ in group)
+        statuses = [status for _, status, _, _ in group]
+        rows[name] = {
+            "requests": len(group),
+            "throughput": len(group) / elapsed if elapsed else 0.0,
+            "errors": sum(1 for s in statuses if s == 0 or s >= 500),
+            "rejected": sum(1 for s in statuses if 400 <= s < 500 and s != 429),
+            "throttled": statuses.count(429),
+            "locked": sum(1 for *_, locked in group if locked),
+            "mean": statistics.fmean(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+    return rows
+
+
+class LockedErrorCounter(logging.Handler):
+    """Counts SQLite lock errors logged by django.request"""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record):
+        error = record.exc_info[1] if record.exc_info else None
+        if isinstance(error, OperationalError) and LOCKED_MESSAGE in str(error):
+            self.count += 1
+
+
+class VirtualUser:
+    """A logged in user sending a random mix of catalog requests"""
+
+    def __init__(self, transport, session_key, entry_ids, mix, rng):
+        self.transport = transport
+        self.entry_ids = entry_ids
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.rng = rng
+        self.csrf_token = get_random_string(32)
+        self.headers = {
+            "Host": "localhost",
+            "Cookie": (
+                f"{settings.SESSION_COOKIE_NAME}={session_key}; "
+                f"{settings.CSRF_COOKIE_NAME}={self.csrf_token}"
+            ),
+        }
+
+    def get(self, path):
+        return self.transport.request("GET", path, self.headers)
+
+    def post(self, path, data):
+        headers = dict(
+            self.headers,
+            **{
+                "Content-Type": "application/x-www-form-urlencoded",
+                "X-CSRFToken": self.csrf_token,
+            },
+        )
+        return self.transport.request("POST", path, headers, urlencode(data).encode())
+
+    def index(self):
+        return self.get(reverse("catalog:index"))
+
+    def search(self):
+        term = self.rng.choice(["loadtest", "item", "milk", "1", "bread"])
+        return self.get(f"{reverse('catalog:catalog-resource-list')}?search={term}")
+
+    def toggle(self):
+        entry_id = self.rng.choice(self.entry_ids)
+        return self.post(reverse("catalog:update", args=[entry_id]), {})
+
+    def create(self):
+        name = f"loadtest {uuid.uuid4().hex[:12]}"
+        return self.post(reverse("catalog:create"), {"name": name})
+
+    async def run(self, deadline, results):
+        while time.monotonic() < deadline:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status, body = await getattr(self, operation)()
+            except (OSError, http.client.HTTPException):
+                status, body = 0, b""
+            seconds = time.perf_counter() - started
+            locked = LOCKED_MESSAGE.encode() in body
+            results.append((operation, status, seconds, locked))
+
+
+def prepare_users(count):
+    """
+    Creates (or reuses) the load test users, each with its own catalog and
+    entries to toggle. Returns (session_key, entry_ids) for every user.
+    """
+    users = []
+    for index in range(count):
+        user, created = User.objects.get_or_create(username=USERNAME.format(index))
+        if created:
+            user.set_unusable_password()
+            user.save()
+        catalog_group, _ = CatalogGroup.objects.get_or_create(name=f"Load test {index}")
+        catalog_group.owners.add(user)
+        # Outside a request nothing routes the entries to the catalog's shard
+        with use_shard(shard_for(catalog_group)):
+            for number in range(ENTRIES_PER_USER):
+                item_definition, _ = ItemDefinition.objects.get_or_create(
+                    name=f"loadtest item {number}"
+                )
+                CatalogEntry.objects.get_or_create(
+                    item_definition=item_definition, catalog_group=catalog_group
+                )
+            entry_ids = list(
+                CatalogEntry.objects.filter(catalog_group=catalog_group).values_list(
+                    "id", flat=True
+                )
+            )
+
+        client = Client()
+        client.force_login(user)
+        users.append((client.session.session_key, entry_ids))
+    return users
+
+
+async def run_load(make_transport, users, mix, duration, seed):
+    rng = random.Random(seed)
+    results = []
+    deadline = time.monotonic() + duration
+    virtual_users = [
+        VirtualUser(
+            make_transport(), session_key, entry_ids, mix, random.Random(rng.random())
+        )
+        for session_key, entry_ids in users
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(user.run(deadline, results) for user in virtual_users))
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a concurrent mixed workload of logged in users and report "
+        "throughput, latency percentiles, errors and database lock errors. "
+        "Writes load test users and items to the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=20, help="Number of concurrent users"
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds to run the load"
+        )
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"Relative weights of the operations (default {DEFAULT_MIX})",
+        )
+        parser.add_argument(
+            "--url",
+            help=(
+                "Base URL of a running server, e.g. http://localhost:8000 "
+                "started with `manage.py serve`. By default requests go to "
+                "the ASGI application in this process."
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("--users must be at least 1")
+        mix = parse_mix(options["mix"])
+
+        if settings.DEBUG:
+            self.stderr.write(
+                "DEBUG is on, query logging makes the numbers much worse than "
+                "in production. Set IS_LIVE=1 for realistic results."
+            )
+        self.stdout.write(f"Preparing {options['users']} users...")
+        users = prepare_users(options["users"])
+
+        locked_counter = LockedErrorCounter()
+        request_logger = logging.getLogger("django.request")
+        if options["url"]:
+            executor = ThreadPoolExecutor(max_workers=options["users"])
+
+            def make_transport():
+                return HttpTransport(options["url"], executor)
+
+        else:
+            # The application is shared, "database is locked" errors are
+            # counted from its request log
+            application = AsgiTransport()
+
+            def make_transport():
+                return application
+
+            request_logger.addHandler(locked_counter)
+
+        self.stdout.write(
+            f"Running {options['duration']:g}s against "
+            f"{options['url'] or 'the in-process ASGI application'}..."
+        )
+        try:
+            results, elapsed = asyncio.run(
+                run_load(
+                    make_transport,
+                    users,
+                    mix,
+                    options["duration"],
+                    options["seed"],
+                )
+            )
+        finally:
+            request_logger.removeHandler(locked_counter)
+
+        if not results:
+            raise CommandError("No request completed")
+        rows = summarize(results, elapsed)
+        # Tracebacks of in-process requests are more reliable than 500 pages
+        rows["all"]["locked"] = max(rows["all"]["locked"], locked_counter.count)
+        self.print_report(rows, Counter(status for _, status, _, _ in results))
+
+    def print_report(self, rows, statuses):
+        header = (
+            f"{'operation':<10}{'requests':>9}{'req/s':>9}{'errors':>8}"
+            f"{'4xx':>6}{'429':>6}{'locked':>8}"
+            f"{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+        )
+        self.stdout.write(header)
+        for name in ["all", *OPERATIONS]:
+            if name not in rows:
+                continue
+            row = rows[name]
+            self.stdout.write(
+                f"{name:<10}{row['requests']:>9}{row['throughput']:>9.1f}"
+                f"{row['errors']:>8}{row['rejected']:>6}{row['throttled']:>6}"
+                f"{row['locked']:>8}{row['mean']:>9.1f}{row['p50']:>9.1f}"
+                f"{row['p95']:>9.1f}{row['p99']:>9.1f}"
+            )
+
+        total = rows["all"]
+        self.stdout.write(
+            "Latencies in ms, status codes: "
+            + ", ".join(
+                f"{status}: {count}" for status, count in sorted(statuses.items())
+            )
+        )
+        self.stdout.write(
+            f"Error rate {total['errors'] / total['requests']:.2%}, "
+            f"database is locked rate {total['locked'] / total['requests']:.2%}"
+        )
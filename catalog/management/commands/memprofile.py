@@ -0,0 +1,269 @@
+import asyncio
+import gc
+import logging
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import NoReverseMatch, URLResolver, reverse
+
+from catalog import urls as catalog_urls
+from catalog.models import (
+    CatalogEntry,
+    CatalogGroup,
+    CatalogGroupInvitation,
+    ItemDefinition,
+)
+from catalog.routers import shard_for, use_shard
+from catalog.transports import AsgiTransport
+
+USERNAME = "memprofile"
+# Namespaces and views that leave the site or end the session
+SKIPPED_NAMESPACES = {"social"}
+SKIPPED_NAMES = {"logout"}
+CHECKPOINTS = 10
+TRACEBACK_FRAMES = 10
+
+
+def collect_url_names(patterns=None):
+    """Returns the names of all catalog URL patterns in URLconf order"""
+    if patterns is None:
+        patterns = catalog_urls.urlpatterns
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in SKIPPED_NAMESPACES:
+                continue
+            names.extend(collect_url_names(pattern.url_patterns))
+        elif pattern.name and pattern.name not in SKIPPED_NAMES:
+            if pattern.name not in names:
+                names.append(pattern.name)
+    return names
+
+
+def linear_fit(points):
+    """
+    Least squares fit of (x, y) points, returns (slope, r_squared). A slope
+    with an r_squared close to 1 means y grows steadily with x.
+    """
+    count = len(points)
+    if count < 2:
+        return 0.0, 0.0
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    if not sxx:
+        return 0.0, 0.0
+    slope = sxy / sxx
+    r_squared = sxy * sxy / (sxx * syy) if syy else 0.0
+    return slope, r_squared
+
+
+def prepare_user(username):
+    """
+    Returns the user to send the requests as, with a catalog, an entry and
+    an invitation so that detail URLs can be resolved.
+    """
+    try:
+        user = User.objects.get(username=username)
+    except User.DoesNotExist:
+        if username != USERNAME:
+            raise CommandError(f"User {username} does not exist")
+        user = User.objects.create_user(username=username)
+
+    catalog_group = CatalogGroup.objects.filter(owners=user).first()
+    if catalog_group is None:
+        catalog_group = CatalogGroup.objects.create(name=f"{username} catalog")
+        catalog_group.owners.add(user)
+    item_definition, _ = ItemDefinition.objects.get_or_create(name=f"{username} item")
+    with use_shard(shard_for(catalog_group)):
+        entry, _ = CatalogEntry.objects.get_or_create(
+            item_definition=item_definition, catalog_group=catalog_group
+        )
+    invitation = CatalogGroupInvitation.objects.filter(
+        catalog_group=catalog_group, accepted_by=None
+    ).first() or CatalogGroupInvitation.objects.create(
+        catalog_group=catalog_group, invited_by=user
+    )
+    url_kwargs = {
+        "catalog-resource-detail": {"pk": item_definition.pk},
+        "cataloggroup-detail": {"pk": catalog_group.pk},
+        "cataloggroup-create-invitation": {"pk": catalog_group.pk},
+        "invitation-detail": {"pk": invitation.pk},
+        "invitation-accept": {"pk": invitation.pk},
+        "update": {"entry_id": entry.pk},
+    }
+    return user, url_kwargs
+
+
+async def replay(transport, path, headers, requests, warmup):
+    """
+    Sends GET requests to path through the ASGI application while tracing.
+    Retained memory is measured after a garbage collection at evenly spaced
+    checkpoints.
+    """
+    for _ in range(warmup):
+        await transport.request("GET", path, headers)
+
+    gc.collect()
+    tracemalloc.start(TRACEBACK_FRAMES)
+    try:
+        baseline = tracemalloc.take_snapshot()
+        baseline_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        every = max(1, requests // CHECKPOINTS)
+        points = []
+        statuses = set()
+        for iteration in range(1, requests + 1):
+            status, _ = await transport.request("GET", path, headers)
+            statuses.add(status)
+            if iteration % every == 0:
+                gc.collect()
+                size, _ = tracemalloc.get_traced_memory()
+                points.append((iteration, size - baseline_size))
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    return baseline, snapshot, baseline_size, peak, points, statuses
+
+
+def profile_endpoint(transport, path, headers, requests, warmup, limit):
+    baseline, snapshot, baseline_size, peak, points, statuses = asyncio.run(
+        replay(transport, path, headers, requests, warmup)
+    )
+    ignored = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, asyncio.__file__.rsplit("/", 1)[0] + "/*"),
+    ]
+    differences = snapshot.filter_traces(ignored).compare_to(
+        baseline.filter_traces(ignored), "lineno"
+    )
+    # Bounded caches fill up during the first requests, only growth that
+    # continues through the second half of the run is a leak candidate
+    slope, r_squared = linear_fit(points[len(points) // 2 :])
+    return {
+        "statuses": sorted(statuses),
+        "peak": peak - baseline_size,
+        "retained": points[-1][1] if points else 0,
+        "slope": slope,
+        "r_squared": r_squared,
+        "top": [d for d in differences if d.size_diff > 0][:limit],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay GET requests against every catalog URL pattern under "
+        "tracemalloc and report peak and retained allocations per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per endpoint"
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=3,
+            help="Requests sent before tracing, to fill lazy caches",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=5, help="Retaining lines shown per endpoint"
+        )
+        parser.add_argument(
+            "--pattern",
+            action="append",
+            help="Only profile these URL names (can be repeated)",
+        )
+        parser.add_argument(
+            "--username",
+            default=USERNAME,
+            help=f"User sending the requests (default: a {USERNAME} user)",
+        )
+        parser.add_argument(
+            "--growth-threshold",
+            type=float,
+            default=256,
+            help="Bytes retained per request above which an endpoint is flagged",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < CHECKPOINTS:
+            raise CommandError(f"--requests must be at least {CHECKPOINTS}")
+        if settings.DEBUG:
+            self.stderr.write(
+                "DEBUG is on, query logging adds allocations that production "
+                "doesn't have. Set IS_LIVE=1 for realistic results."
+            )
+
+        user, url_kwargs = prepare_user(options["username"])
+        client = Client()
+        client.force_login(user)
+        headers = {
+            "Host": "localhost",
+            "Cookie": f"{settings.SESSION_COOKIE_NAME}={client.session.session_key}",
+        }
+        transport = AsgiTransport()
+
+        # Replayed requests must reach the views instead of the throttle, and
+        # the expected 4xx responses of POST-only endpoints aren't logged
+        unthrottled = {
+            scope: {"burst": options["requests"] * 2, "rate": 1}
+            for scope in settings.CATALOG_THROTTLE_RATES
+        }
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(CATALOG_THROTTLE_RATES=unthrottled):
+                self.profile(transport, headers, url_kwargs, options)
+        finally:
+            request_logger.setLevel(level)
+
+    def profile(self, transport, headers, url_kwargs, options):
+        names = collect_url_names()
+        if options["pattern"]:
+            names = [name for name in names if name in options["pattern"]]
+        flagged = []
+        for name in names:
+            try:
+                path = reverse(f"catalog:{name}", kwargs=url_kwargs.get(name))
+            except NoReverseMatch:
+                self.stdout.write(f"{name}: skipped, no sample arguments")
+                continue
+
+            result = profile_endpoint(
+                transport,
+                path,
+                headers,
+                options["requests"],
+                options["warmup"],
+                options["limit"],
+            )
+            growing = (
+                result["slope"] > options["growth_threshold"]
+                and result["r_squared"] >= 0.8
+            )
+            if growing:
+                flagged.append(name)
+            self.stdout.write(
+                f"{name} {path} {result['statuses']}: "
+                f"peak {result['peak'] / 1024:.1f} KiB, "
+                f"retained {result['retained'] / 1024:.1f} KiB, "
+                f"{result['slope']:.0f} B/request (r2 {result['r_squared']:.2f})"
+                + (" GROWING" if growing else "")
+            )
+            for difference in result["top"]:
+                self.stdout.write(f"    {difference}")
+
+        if flagged:
+            self.stdout.write(
+                f"Retained memory grows linearly for: {', '.join(flagged)}"
+            )
+        else:
+            self.stdout.write("No endpoint retains memory linearly")
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.models import CatalogGroup
+from catalog.sharding import entry_counts, move_catalog, plan_rebalance
+
+
+class Command(BaseCommand):
+    help = "Spread the catalogs evenly over the SHARDS databases"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--catalog", type=int, help="Move only the catalog with this id"
+        )
+        parser.add_argument(
+            "--to",
+            help="Database to move --catalog to, e.g. default before turning "
+            "sharding off",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only print the planned moves"
+        )
+
+    def handle(self, *args, **options):
+        if not settings.SHARDS:
+            raise CommandError("Set SHARDS to use shards.")
+        catalog_groups = CatalogGroup.objects.using(DEFAULT_DB_ALIAS).order_by("pk")
+
+        if options["catalog"] is not None:
+            target = options["to"]
+            if target not in (DEFAULT_DB_ALIAS, *settings.SHARDS):
+                raise CommandError("Pass --to with default or one of the shards.")
+            try:
+                moves = [(catalog_groups.get(pk=options["catalog"]), target)]
+            except CatalogGroup.DoesNotExist:
+                raise CommandError(f"Catalog {options['catalog']} does not exist.")
+        else:
+            moves = plan_rebalance(catalog_groups, entry_counts(), settings.SHARDS)
+
+        for catalog_group, target in moves:
+            source = catalog_group.shard or DEFAULT_DB_ALIAS
+            if options["dry_run"]:
+                self.stdout.write(f"Would move {catalog_group} {source} -> {target}")
+                continue
+            count = move_catalog(catalog_group, target)
+            self.stdout.write(
+                f"Moved {catalog_group} {source} -> {target} ({count} entries)"
+            )
+        if not moves:
+            self.stdout.write("Shards are balanced")
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from catalog.backup import copy_database
+
+
+class Command(BaseCommand):
+    help = "Refresh the read-only replica snapshot of the default database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=settings.DATABASE_REPLICA,
+            help="Snapshot file (defaults to the DATABASE_REPLICA setting)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Refresh every N seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        target = options["path"]
+        if not target:
+            raise CommandError("Set DATABASE_REPLICA or pass --path.")
+
+        while True:
+            started = time.monotonic()
+            try:
+                copy_database(target)
+            except NotSupportedError as exc:
+                raise CommandError(exc)
+            self.stdout.write(f"Replica refreshed in {time.monotonic() - started:.2f}s")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from catalog.backup import (
+    BACKUP_STEP_PAGES,
+    BACKUP_STEP_SLEEP,
+    backup_path,
+    decompress,
+    integrity_check,
+    is_gzipped,
+    restore_database,
+)
+from catalog.sharding import entry_databases
+
+
+class Command(BaseCommand):
+    help = "Replace the SQLite databases with a backup made by backup_db"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Backup file, plain or gzipped")
+        parser.add_argument(
+            "--database",
+            help="Database to restore from path, by default the default "
+            "database and every shard from the files backup_db wrote",
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Do not ask for confirmation",
+        )
+        parser.add_argument(
+            "--no-verify",
+            action="store_false",
+            dest="verify",
+            help="Skip the integrity check of the backup",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=BACKUP_STEP_PAGES,
+            help="Pages copied per step",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=BACKUP_STEP_SLEEP,
+            help="Seconds the database is left alone between steps",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if options["database"]:
+            sources = [(options["database"], path)]
+        else:
+            sources = [(alias, backup_path(path, alias)) for alias in entry_databases()]
+        for _, source in sources:
+            if not os.path.exists(source):
+                raise CommandError(f"{source} does not exist.")
+        if options["interactive"]:
+            aliases = ", ".join(alias for alias, _ in sources)
+            answer = input(
+                f"This replaces all data of {aliases} with {path}. "
+                "Type 'yes' to continue: "
+            )
+            if answer != "yes":
+                raise CommandError("Restore cancelled.")
+
+        # Next to the backup, /tmp may be too small for a large database
+        with tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(path))
+        ) as tmp_dir:
+            # Every file is checked before any database is replaced
+            restores = [
+                (alias, source, self.prepare(alias, source, tmp_dir, options))
+                for alias, source in sources
+            ]
+            for alias, source, database_file in restores:
+                try:
+                    restore_database(
+                        database_file,
+                        using=alias,
+                        pages=options["pages"],
+                        sleep=options["sleep"],
+                    )
+                except NotSupportedError as exc:
+                    raise CommandError(exc)
+                self.stdout.write(f"Restored {alias} from {source}")
+
+        # Cached users, catalogs and pages describe the replaced data
+        cache.clear()
+
+    def prepare(self, alias, source, tmp_dir, options):
+        """Returns the plain SQLite file to restore, after its integrity check"""
+        if is_gzipped(source):
+            database_file = os.path.join(tmp_dir, f"{alias}.sqlite3")
+            decompress(source, database_file)
+        else:
+            database_file = source
+        if options["verify"]:
+            problems = integrity_check(database_file)
+            if problems:
+                raise CommandError(
+                    f"Backup of {alias} failed the integrity check: "
+                    + "; ".join(problems)
+                )
+        return database_file
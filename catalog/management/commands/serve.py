@@ -0,0 +1,297 @@
+import argparse
+import http.client
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+LISTEN_BACKLOG = 1024
+# A worker that exits sooner than this after being started is considered to be
+# crashing on boot and is restarted with a delay instead of immediately.
+MIN_WORKER_UPTIME = 5
+RESTART_DELAY = 2
+
+
+def resolve_worker_count(workers=None):
+    """
+    Returns the number of worker processes to start: the explicit value, the
+    SERVE_WORKERS setting or one per CPU core.
+    """
+    count = workers or settings.SERVE_WORKERS or os.cpu_count() or 1
+    if count < 1:
+        raise CommandError("The number of workers must be positive.")
+    return count
+
+
+def create_listener(host, port):
+    """
+    Creates the listening socket shared by all workers. The supervisor keeps
+    it open, so replacing a worker never drops queued connections, and
+    SO_REUSEPORT lets a new supervisor bind while the old one is draining.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def probe(host, port, path, timeout):
+    """
+    Returns True if the server answers an HTTP request, whatever the status.
+    """
+    if host in ("0.0.0.0", ""):
+        host = "127.0.0.1"
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request("GET", path, headers={"Host": "localhost"})
+        connection.getresponse().read()
+        return True
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        connection.close()
+
+
+class Worker:
+    def __init__(self, process, ready_fd):
+        self.process = process
+        self.ready_fd = ready_fd
+        self.started = time.monotonic()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def wait_ready(self, timeout):
+        """Blocks until the worker reports it is serving or the timeout ends."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.process.poll() is None:
+            remaining = max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self.ready_fd], [], [], min(remaining, 0.5))
+            if readable:
+                return os.read(self.ready_fd, 1) == b"1"
+        return False
+
+    def terminate(self):
+        """Asks the worker to stop accepting connections and drain."""
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+
+    def join(self, deadline):
+        """Waits for the worker to exit and kills it past the deadline."""
+        try:
+            self.process.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.close()
+
+    def stop(self, timeout):
+        self.terminate()
+        self.join(time.monotonic() + timeout)
+
+    def close(self):
+        if self.ready_fd is not None:
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+
+class Command(BaseCommand):
+    help = "Serve the ASGI application with several supervised daphne workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="127.0.0.1", help="Address to bind")
+        parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of worker processes (defaults to SERVE_WORKERS)",
+        )
+        parser.add_argument(
+            "--graceful-timeout",
+            type=float,
+            default=8,
+            help="Seconds a worker has to finish in-flight requests on stop",
+        )
+        parser.add_argument(
+            "--boot-timeout",
+            type=float,
+            default=30,
+            help="Seconds a new worker has to start serving",
+        )
+        parser.add_argument(
+            "--health-path",
+            default=settings.LOGIN_URL,
+            help="Path requested to check that the workers are responsive",
+        )
+        parser.add_argument(
+            "--health-interval",
+            type=float,
+            default=10,
+            help="Seconds between health checks, 0 disables them",
+        )
+        parser.add_argument(
+            "--health-failures",
+            type=int,
+            default=3,
+            help="Consecutive failed health checks before a rolling reload",
+        )
+        # Internal options used by the supervisor to start its workers.
+        parser.add_argument("--worker-fd", type=int, help=argparse.SUPPRESS)
+        parser.add_argument("--ready-fd", type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker_fd"] is not None:
+            return self.run_worker(options)
+        return self.run_supervisor(options)
+
+    # Supervisor
+
+    def run_supervisor(self, options):
+        self.options = options
+        self.stopping = False
+        self.reload_requested = False
+        self.listener = create_listener(options["bind"], options["port"])
+        count = resolve_worker_count(options["workers"])
+
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGHUP, self.request_reload)
+
+        self.stdout.write(
+            f"Serving on {options['bind']}:{options['port']} with {count} workers"
+        )
+        self.workers = [self.spawn() for _ in range(count)]
+        health_failures = 0
+        next_health_check = time.monotonic() + options["boot_timeout"]
+
+        while not self.stopping:
+            self.restart_exited()
+
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_reload()
+                next_health_check = time.monotonic() + options["health_interval"]
+
+            interval = options["health_interval"]
+            if interval and time.monotonic() >= next_health_check:
+                next_health_check = time.monotonic() + interval
+                if probe(options["bind"], options["port"], options["health_path"], 5):
+                    health_failures = 0
+                else:
+                    health_failures += 1
+                    self.stderr.write(f"Health check failed ({health_failures})")
+                if health_failures >= options["health_failures"]:
+                    health_failures = 0
+                    self.rolling_reload()
+            time.sleep(0.5)
+
+        self.stdout.write("Stopping workers...")
+        deadline = time.monotonic() + options["graceful_timeout"]
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join(deadline)
+        self.listener.close()
+        self.stdout.write(self.style.SUCCESS("Stopped"))
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def request_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def spawn(self):
+        ready_read, ready_write = os.pipe()
+        fd = self.listener.fileno()
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "serve",
+                f"--worker-fd={fd}",
+                f"--ready-fd={ready_write}",
+                f"--graceful-timeout={self.options['graceful_timeout']}",
+                f"--verbosity={self.options['verbosity']}",
+            ],
+            pass_fds=[fd, ready_write],
+        )
+        os.close(ready_write)
+        return Worker(process, ready_read)
+
+    def restart_exited(self):
+        for index, worker in enumerate(self.workers):
+            code = worker.process.poll()
+            if code is None or self.stopping:
+                continue
+            self.stderr.write(f"Worker {worker.pid} exited with {code}, restarting")
+            worker.close()
+            if time.monotonic() - worker.started < MIN_WORKER_UPTIME:
+                time.sleep(RESTART_DELAY)
+            self.workers[index] = self.spawn()
+
+    def rolling_reload(self):
+        """
+        Replaces the workers one by one, starting the new worker before the
+        old one drains, so the capacity never drops below N - 1.
+        """
+        self.stdout.write("Reloading workers...")
+        for index, old in enumerate(list(self.workers)):
+            if self.stopping:
+                return
+            new = self.spawn()
+            if not new.wait_ready(self.options["boot_timeout"]):
+                self.stderr.write(
+                    f"Worker {new.pid} failed to start, keeping {old.pid}"
+                )
+                new.stop(0)
+                return
+            self.workers[index] = new
+            old.stop(self.options["graceful_timeout"])
+        self.stdout.write(self.style.SUCCESS("Workers reloaded"))
+
+    # Worker
+
+    def run_worker(self, options):
+        from daphne.access import AccessLogGenerator
+        from twisted.internet import reactor
+
+        from catalog.server import DrainingServer
+
+        application = import_string(settings.ASGI_APPLICATION)
+        ready_fd = options["ready_fd"]
+
+        def ready():
+            if ready_fd is not None:
+                os.write(ready_fd, b"1")
+                os.close(ready_fd)
+
+        server = DrainingServer(
+            application=application,
+            endpoints=[f"fd:fileno={options['worker_fd']}"],
+            signal_handlers=False,
+            action_logger=(
+                AccessLogGenerator(sys.stdout) if options["verbosity"] >= 1 else None
+            ),
+            verbosity=options["verbosity"],
+            drain_timeout=options["graceful_timeout"],
+            ready_callable=ready,
+        )
+
+        def drain(signum, frame):
+            reactor.callFromThread(server.drain)
+
+        signal.signal(signal.SIGTERM, drain)
+        signal.signal(signal.SIGINT, drain)
+        server.run()
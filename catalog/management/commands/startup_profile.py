@@ -0,0 +1,105 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+# The URLconf is loaded lazily on the first request, so it is imported as well
+# to account for the whole cost paid before the first response is sent.
+STARTUP_CODE = (
+    "import {module}; "
+    "from django.urls import get_resolver; "
+    "get_resolver().url_patterns"
+)
+
+
+def parse_importtime(lines):
+    """
+    Parses `python -X importtime` output into (module, self_us, cumulative_us)
+    tuples. Lines that are not import timings are ignored.
+    """
+    records = []
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line.rstrip())
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            records.append((module, int(self_us), int(cumulative_us)))
+    return records
+
+
+def aggregate_imports(records, group_by="package"):
+    """
+    Sums the self import time per top-level package (or per module) and
+    returns (name, self_us, modules_count) rows sorted from the slowest.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for module, self_us, _ in records:
+        key = module.split(".")[0] if group_by == "package" else module
+        totals[key][0] += self_us
+        totals[key][1] += 1
+    rows = [(name, self_us, count) for name, (self_us, count) in totals.items()]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+class Command(BaseCommand):
+    help = "Report aggregated import time of the application startup"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--module",
+            default=settings.ASGI_APPLICATION.rsplit(".", 1)[0],
+            help="Entry module to import (defaults to the ASGI application module)",
+        )
+        parser.add_argument(
+            "--group-by",
+            choices=["package", "module"],
+            default="package",
+            help="Aggregate timings per top-level package or per module",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Number of rows to show",
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                STARTUP_CODE.format(module=options["module"]),
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            self.stdout.write(result.stderr)
+            raise CommandError(f"Importing {options['module']} failed.")
+
+        records = parse_importtime(result.stderr.splitlines())
+        rows = aggregate_imports(records, options["group_by"])
+        total_us = sum(self_us for _, self_us, _ in records) or 1
+
+        self.stdout.write(f"{'name':<40} {'self ms':>10} {'share':>7} {'modules':>8}")
+        for name, self_us, count in rows[: options["limit"]]:
+            self.stdout.write(
+                f"{name:<40} {self_us / 1000:>10.1f} "
+                f"{self_us / total_us:>7.1%} {count:>8}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(records)} modules in {total_us / 1000:.1f} ms"
+            )
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.warmup import migrations_applied, warmup
+
+
+class Command(BaseCommand):
+    help = "Load the database pages, templates and caches hit by the first requests"
+
+    def handle(self, *args, **options):
+        if not migrations_applied():
+            raise CommandError("Apply the migrations before warming up.")
+        summary = warmup()
+        self.stdout.write(
+            f"Read {summary['bytes']} bytes, primed {summary['users']} users "
+            f"in {summary['seconds']}s"
+        )
@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from catalog.tasks import Worker, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run background tasks of the task queue until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when no task is due",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run the due tasks and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            count = run_pending()
+            self.stdout.write(f"Ran {count} tasks")
+            return
+
+        worker = Worker(poll_interval=options["poll_interval"])
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        self.stdout.write("Worker started, press CTRL-C to stop")
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
@@ -1,7 +1,274 @@
-from .models import CatalogGroup
+from .auth_cache import get_user, get_user_catalog_group
+from . import profiling
+from .catalog_context import set_catalog_group
+from .nplusone import NPlusOneDetector
+from .routers import read_from_replica, replica_configured, use_shard
+from .slow_queries import SlowQueryRecorder
+from .timing import (
+    QueryCounter,
+    RequestTimer,
+    format_server_timing,
+    timing_request,
+)
+from .negotiation import wants_json
+from .writes import WriteTimeout
+import logging
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.functional import SimpleLazyObject
 from django.shortcuts import redirect
 from django.urls import reverse
 
+access_logger = logging.getLogger("catalog.access")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PRIMARY_COOKIE = "use_primary"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe-method requests read catalog data from the read-only replica.
+    After a write the client gets a short-lived cookie that pins its reads to
+    the primary database, so users always see their own changes even though
+    the replica lags behind.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replica = (
+            request.method in SAFE_METHODS and PRIMARY_COOKIE not in request.COOKIES
+        )
+        with read_from_replica(use_replica):
+            response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ShardRoutingMiddleware:
+    """
+    Scopes the shard of the current catalog to the request when SHARDS is
+    set. The shard is chosen once the catalog is known, see
+    catalog_context.set_catalog_group, and must not leak into the next
+    request handled by the same thread.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SHARDS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with use_shard(None):
+            return self.get_response(request)
+
+
+class AccessLogMiddleware:
+    """
+    Logs one structured record per request to the "catalog.access" logger,
+    enabled by the ACCESS_LOG setting. The logger writes through a
+    background handler, so requests don't wait for the log output. Has to be
+    the first middleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.ACCESS_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        queries = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+
+        user = getattr(request, "user", None)
+        catalog_group = getattr(request, "catalog_group", None)
+        resolver_match = getattr(request, "resolver_match", None)
+        data = {
+            "method": request.method,
+            "path": request.path,
+            "route": getattr(resolver_match, "view_name", None),
+            "user_id": user.pk if user is not None and user.is_authenticated else None,
+            "catalog_group_id": getattr(catalog_group, "pk", None),
+            "status": response.status_code,
+            "bytes": None if response.streaming else len(response.content),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "queries": queries.count,
+            "cache": getattr(request, "cache_status", None),
+        }
+        access_logger.info(
+            "%s %s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={"data": data},
+        )
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Measures the middleware, view, API serialization, rendering and database
+    phases of every request, enabled by the SERVER_TIMING setting. The timings are
+    stored on `request.timings` and sent in the Server-Timing header, so they
+    show up in the browser devtools. Has to come right after the access log.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.timer = RequestTimer()
+        with ExitStack() as stack:
+            stack.enter_context(timing_request(request.timer))
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(request.timer))
+            response = self.get_response(request)
+
+        request.timings = request.timer.finish()
+        response["Server-Timing"] = format_server_timing(request.timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timer.start_view()
+
+    def process_template_response(self, request, response):
+        # Called last of all middleware, right before the response is rendered
+        request.timer.start_render()
+        response.add_post_render_callback(request.timer.finish_render)
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Records sampled slow queries of every request on all database
+    connections, see catalog.slow_queries. Disabled when
+    SLOW_QUERY_SAMPLE_RATE is 0.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(
+            request, settings.SLOW_QUERY_THRESHOLD_MS, settings.SLOW_QUERY_SAMPLE_RATE
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """
+    Lets superusers profile a single request by adding `?_profile=cprofile`
+    or `?_profile=alloc` to its URL. The profiler report is returned instead
+    of the response, `_sort` and `_limit` change the order and length of the
+    report and `_download=1` returns the cProfile stats as a .prof file. Has
+    to come after the authentication middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profiler = request.GET.get("_profile")
+        if profiler not in profiling.PROFILERS or not request.user.is_superuser:
+            return self.get_response(request)
+
+        try:
+            limit = int(request.GET.get("_limit", 50))
+        except ValueError:
+            return HttpResponseBadRequest("_limit must be a number")
+
+        if profiler == profiling.CPROFILE:
+            sort = request.GET.get("_sort", "cumulative")
+            if sort not in profiling.CPROFILE_SORTS:
+                return HttpResponseBadRequest(f"Unknown _sort {sort}")
+            response, stats = profiling.cprofile_request(self.get_response, request)
+            if request.GET.get("_download"):
+                report = HttpResponse(
+                    profiling.cprofile_dump(stats),
+                    content_type="application/octet-stream",
+                )
+                report["Content-Disposition"] = 'attachment; filename="request.prof"'
+                return report
+            report = profiling.cprofile_report(stats, sort, limit)
+        else:
+            sort = request.GET.get("_sort", "lineno")
+            if sort not in profiling.ALLOC_SORTS:
+                return HttpResponseBadRequest(f"Unknown _sort {sort}")
+            response, before, after, peak = profiling.alloc_request(
+                self.get_response, request
+            )
+            report = profiling.alloc_report(before, after, peak, sort, limit)
+
+        header = f"{request.method} {request.get_full_path()} -> {response.status_code}"
+        return HttpResponse(
+            f"{header}\n\n{report}", content_type="text/plain; charset=utf-8"
+        )
+
+
+class NPlusOneMiddleware:
+    """
+    Logs (or raises, in the test suite) N+1 queries of every request, see
+    catalog.nplusone. Enabled by the NPLUSONE_DETECTION setting.
+    """
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_DETECTION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        detector = NPlusOneDetector(
+            request, settings.NPLUSONE_THRESHOLD, settings.NPLUSONE_DETECTION
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(detector))
+            return self.get_response(request)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Drop-in replacement for Django's AuthenticationMiddleware that loads the
+    user through the shared cache, enabled by the CACHED_AUTH setting.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: self.get_user(request))
+
+    @staticmethod
+    def get_user(request):
+        if not hasattr(request, "_cached_user"):
+            request._cached_user = get_user(request)
+        return request._cached_user
+
 
 class CatalogGroupMiddleware:
     """
@@ -15,9 +282,8 @@ class CatalogGroupMiddleware:
     def __call__(self, request):
         request.catalog_group = None
         if request.user.is_authenticated:
-            request.catalog_group = CatalogGroup.objects.filter(
-                owners=request.user
-            ).first()
+            request.catalog_group = get_user_catalog_group(request.user)
+            set_catalog_group(request, request.user, request.catalog_group)
 
         response = self.get_response(request)
         return response
@@ -48,3 +314,28 @@ class RedirectToCreateCatalogMiddleware:
 
         response = self.get_response(request)
         return response
+
+
+class WriteTimeoutMiddleware:
+    """
+    Answers 503 when the write coordinator didn't get to the write of a
+    request within WRITE_TIMEOUT. The write stays queued and may still be
+    committed, so the response doesn't say it failed.
+    """
+
+    MESSAGE = "Your change is taking longer than usual, reload to see if it was saved."
+
+    def __init__(self, get_response):
+        if not settings.WRITE_COORDINATOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, WriteTimeout):
+            return None
+        if wants_json(request) or request.path.startswith(reverse("catalog:api-root")):
+            return JsonResponse({"error": self.MESSAGE}, status=503)
+        return HttpResponse(self.MESSAGE, status=503, content_type="text/plain")
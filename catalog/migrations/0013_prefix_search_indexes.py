@@ -0,0 +1,27 @@
+import catalog.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0012_alter_itemgroup_slug_alter_itemgroup_title"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="itemdefinition",
+            index=catalog.models.PrefixIndex("name", name="item_definition_prefix_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="itemgroup",
+            index=catalog.models.PrefixIndex(
+                "title", name="item_group_title_prefix_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cataloggroup",
+            index=catalog.models.PrefixIndex(
+                "name", name="catalog_group_name_prefix_idx"
+            ),
+        ),
+    ]
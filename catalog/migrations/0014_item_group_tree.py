@@ -0,0 +1,77 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_closure_rows(apps, schema_editor):
+    """Existing groups are all roots, they are only linked to themselves"""
+    ItemGroup = apps.get_model("catalog", "ItemGroup")
+    ItemGroupClosure = apps.get_model("catalog", "ItemGroupClosure")
+    ItemGroupClosure.objects.bulk_create(
+        ItemGroupClosure(ancestor_id=pk, descendant_id=pk, depth=0)
+        for pk in ItemGroup.objects.values_list("pk", flat=True).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0013_prefix_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itemgroup",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="children",
+                to="catalog.itemgroup",
+                verbose_name="Parent Group",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ItemGroupClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField(verbose_name="Depth")),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="catalog.itemgroup",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="catalog.itemgroup",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Item Group Closures",
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"],
+                        name="item_group_closure_path_idx",
+                    )
+                ],
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(create_closure_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class ShardDatabaseOperations(migrations.SeparateDatabaseAndState):
+    """
+    Database operations run on the shard databases only, the state and the
+    default database are left alone
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias in settings.SHARDS:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias in settings.SHARDS:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0015_task"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cataloggroup",
+            name="shard",
+            field=models.CharField(
+                blank=True, editable=False, max_length=100, verbose_name="Shard"
+            ),
+        ),
+        # The entries table of a shard can't reference items and catalogs,
+        # they stay in the default database
+        ShardDatabaseOperations(
+            database_operations=[
+                migrations.AlterField(
+                    model_name="catalogentry",
+                    name="catalog_group",
+                    field=models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="catalog.cataloggroup",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="catalogentry",
+                    name="item_definition",
+                    field=models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="catalog.itemdefinition",
+                    ),
+                ),
+            ],
+        ),
+    ]
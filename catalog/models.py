@@ -1,39 +1,200 @@
-from slugify import slugify
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Collate, Greatest, Upper
+from django.db.models.sql import UpdateQuery
+from django.dispatch import Signal
 from django.utils import timezone
 import uuid
 
 
+class PrefixIndex(models.Index):
+    """
+    Index for case-insensitive prefix lookups (istartswith) on a field. They
+    can only use an index that matches how the backend compares: SQLite's LIKE
+    needs a NOCASE index, PostgreSQL compares UPPER() values with pattern
+    operators.
+    """
+
+    def __init__(self, field, *, name):
+        self.field = field
+        super().__init__(Upper(field), name=name)
+
+    def deconstruct(self):
+        path, _, _ = super().deconstruct()
+        return path, (self.field,), {"name": self.name}
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        vendor = schema_editor.connection.vendor
+        if vendor == "sqlite":
+            expression = Collate(self.field, "NOCASE")
+        elif vendor == "postgresql":
+            from django.contrib.postgres.indexes import OpClass
+
+            expression = OpClass(Upper(self.field), name="text_pattern_ops")
+        else:
+            expression = Upper(self.field)
+        index = models.Index(expression, name=self.name)
+        return index.create_sql(model, schema_editor, using=using, **kwargs)
+
+
 class CatalogGroup(models.Model):
     name = models.CharField("Catalog Name", unique=True, max_length=200)
     owners = models.ManyToManyField(User, blank=True)
+    # Database holding the entries when SHARDS is set, empty for default.
+    # Changed by the rebalance_shards command, which moves the entries.
+    shard = models.CharField("Shard", max_length=100, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ["name"]
+        indexes = [PrefixIndex("name", name="catalog_group_name_prefix_idx")]
         verbose_name_plural = "Catalogs"
 
 
+class ItemGroupQuerySet(models.QuerySet):
+    def path_to(self, group):
+        """The group and its ancestors, from the root down"""
+        return self.filter(descendant_links__descendant=group).order_by(
+            "-descendant_links__depth"
+        )
+
+    def subtree_of(self, group):
+        """The group and all groups below it"""
+        return self.filter(ancestor_links__ancestor=group)
+
+
 class ItemGroup(models.Model):
+    """
+    Category of items. Groups nest through `parent`, every ancestor/descendant
+    pair is kept in ItemGroupClosure by save(), so subtrees and paths are a
+    single query. Change `parent` through save() only, queryset updates
+    bypass the closure table.
+    """
+
     title = models.CharField("Group Name", max_length=200, unique=True)
     slug = models.SlugField("slug", default="-", unique=True)
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="children",
+        verbose_name="Parent Group",
+    )
+
+    objects = ItemGroupQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Read without loading a deferred field
+        self._saved_parent_id = self.__dict__.get("parent_id")
 
     def __str__(self):
         return f"{self.title}"
 
+    def clean(self):
+        super().clean()
+        if self.creates_cycle():
+            raise ValidationError(
+                {"parent": "A group can't be moved below itself or its subgroups."}
+            )
+
+    def creates_cycle(self):
+        if self.pk is None or self.parent_id is None:
+            return False
+        return (
+            ItemGroupClosure.objects.using(self._state.db)
+            .filter(ancestor_id=self.pk, descendant_id=self.parent_id)
+            .exists()
+        )
+
     def save(self, *args, **kwargs):
         self.slug = slugify_function(self.title)
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        moved = not adding and self.parent_id != self._saved_parent_id
+        if moved and self.creates_cycle():
+            raise ValueError("A group can't be moved below itself or its subgroups.")
+
+        # The closure queries below run where the group was saved
+        using = kwargs.get("using") or router.db_for_write(ItemGroup, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if adding:
+                ItemGroupClosure.objects.using(using).create(
+                    ancestor_id=self.pk, descendant_id=self.pk, depth=0
+                )
+            elif moved:
+                self.detach_subtree()
+            if (adding or moved) and self.parent_id is not None:
+                self.attach_subtree()
+        self._saved_parent_id = self.parent_id
+
+    def detach_subtree(self):
+        """Drops the links from the old ancestors into the subtree"""
+        closures = ItemGroupClosure.objects.using(self._state.db)
+        subtree = closures.filter(ancestor_id=self.pk).values("descendant_id")
+        closures.filter(descendant_id__in=subtree).exclude(
+            ancestor_id__in=subtree
+        ).delete()
+
+    def attach_subtree(self):
+        """Links every ancestor of the parent to every group of the subtree"""
+        closures = ItemGroupClosure.objects.using(self._state.db)
+        above = closures.filter(descendant_id=self.parent_id).values_list(
+            "ancestor_id", "depth"
+        )
+        below = closures.filter(ancestor_id=self.pk).values_list(
+            "descendant_id", "depth"
+        )
+        closures.bulk_create(
+            ItemGroupClosure(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + descendant_depth + 1,
+            )
+            for ancestor_id, ancestor_depth in above
+            for descendant_id, descendant_depth in below
+        )
 
     class Meta:
         ordering = ["title"]
+        indexes = [PrefixIndex("title", name="item_group_title_prefix_idx")]
         verbose_name_plural = "Item Groups"
 
 
+class ItemGroupClosure(models.Model):
+    """
+    One row per ancestor/descendant pair of item groups, including every
+    group with itself at depth 0. Maintained by ItemGroup.save().
+    """
+
+    ancestor = models.ForeignKey(
+        ItemGroup, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        ItemGroup, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField("Depth")
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+        indexes = [
+            models.Index(
+                fields=["descendant", "depth"], name="item_group_closure_path_idx"
+            )
+        ]
+        verbose_name_plural = "Item Group Closures"
+
+
 def slugify_function(content):
+    # Imported lazily: python-slugify is only needed on writes and searches,
+    # not to start serving requests.
+    from slugify import slugify
+
     return slugify(content)
 
 
@@ -74,7 +235,10 @@ class ItemDefinition(models.Model):
 
     class Meta:
         ordering = [models.F("group__title"), "name"]
-        indexes = [models.Index(fields=["name"], name="item_definition_name_idx")]
+        indexes = [
+            models.Index(fields=["name"], name="item_definition_name_idx"),
+            PrefixIndex("name", name="item_definition_prefix_idx"),
+        ]
         verbose_name_plural = "Item Definitions"
 
     def __str__(self):
@@ -82,7 +246,117 @@ class ItemDefinition(models.Model):
         return f"{grops} {self.name}"
 
 
+# Sent after CatalogEntryQuerySet updates entries without saving them, with
+# the ids of the catalog groups the entries belong to
+entries_updated = Signal()
+
+
+class CatalogEntryQuerySet(models.QuerySet):
+    INCREMENT = "increment"
+    DECREMENT = "decrement"
+    SET = "set"
+    OPERATIONS = (INCREMENT, DECREMENT, SET)
+    # SQLite supports UPDATE ... RETURNING from this version on
+    SQLITE_RETURNING_VERSION = (3, 35)
+
+    def adjust_count(self, op, amount, clamp=False, key="pk"):
+        """
+        Increments, decrements or sets `count` of all entries of the queryset
+        in a single UPDATE, so concurrent adjustments are never lost. With
+        `clamp` counts don't go below zero. Returns {entry key: new count}.
+        """
+        if op == self.INCREMENT:
+            count = F("count") + Value(amount)
+        elif op == self.DECREMENT:
+            count = F("count") - Value(amount)
+        elif op == self.SET:
+            count = Value(amount)
+        else:
+            raise ValueError(f"Unknown operation {op}")
+        if clamp:
+            count_field = self.model._meta.get_field("count")
+            count = Greatest(count, Value(0), output_field=count_field)
+        return self._update_returning("count", count, key)
+
+    def toggle_to_buy(self, key="pk"):
+        """
+        Flips `to_buy` of all entries of the queryset in a single UPDATE.
+        Returns {entry key: new to_buy}.
+        """
+        return self._update_returning("to_buy", ~F("to_buy"), key)
+
+    def _update_returning(self, field_name, value, key):
+        """
+        Sets `field_name` to `value` and returns {entry key: new value}. Uses
+        UPDATE ... RETURNING where the backend has it, elsewhere the rows are
+        locked, updated and read again in a transaction.
+        """
+        if self.query.is_sliced:
+            raise TypeError("Cannot update a query once a slice has been taken.")
+        opts = self.model._meta
+        field = opts.get_field(field_name)
+        key_column = (opts.pk if key == "pk" else opts.get_field(key)).column
+        connection = connections[self.db]
+        if not self._has_update_returning(connection):
+            with transaction.atomic(using=self.db):
+                pks = list(self.select_for_update().values_list("pk", flat=True))
+                entries = self.model._default_manager.using(self.db).filter(pk__in=pks)
+                entries.update(**{field_name: value})
+                rows = list(entries.values_list(key, field_name, "catalog_group_id"))
+            self._send_updated(rows)
+            return {key_value: value for key_value, value, _ in rows}
+
+        query = self.query.chain(UpdateQuery)
+        query.clear_ordering(force=True)
+        query.add_update_values({field_name: value})
+        # The compiler emits UPDATE ... SET ... WHERE ... and nothing after
+        # it: slices are rejected above, the ordering is cleared and filters
+        # on other tables become a pk IN (subquery) inside the WHERE. Only
+        # columns of the entries table are set, so there are no related
+        # updates run as separate queries, and RETURNING goes last.
+        sql, params = query.get_compiler(self.db).as_sql()
+        quote = connection.ops.quote_name
+        sql += (
+            f" RETURNING {quote(key_column)}, {quote(field.column)}, "
+            f"{quote(opts.get_field('catalog_group').column)}"
+        )
+        with transaction.mark_for_rollback_on_error(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        self._result_cache = None
+        self._send_updated(rows)
+
+        column = field.get_col(opts.db_table)
+        converters = connection.ops.get_db_converters(column) + field.get_db_converters(
+            connection
+        )
+        result = {}
+        for key_value, value, _ in rows:
+            for converter in converters:
+                value = converter(value, column, connection)
+            result[key_value] = value
+        return result
+
+    def _has_update_returning(self, connection):
+        if connection.vendor == "sqlite":
+            return connection.Database.sqlite_version_info >= (
+                self.SQLITE_RETURNING_VERSION
+            )
+        return connection.vendor == "postgresql"
+
+    def _send_updated(self, rows):
+        entries_updated.send(
+            sender=self.model,
+            catalog_group_ids={catalog_group_id for *_, catalog_group_id in rows},
+            using=self.db,
+        )
+
+
 class CatalogEntry(models.Model):
+    # The copies of the table in the shards have no foreign key constraints
+    # (migration 0016). Migrations that rebuild the table add them back
+    # there and need a ShardDatabaseOperations step like 0016's.
     item_definition = models.ForeignKey(ItemDefinition, on_delete=models.CASCADE)
     catalog_group = models.ForeignKey(
         CatalogGroup, on_delete=models.CASCADE, null=True, blank=True
@@ -91,6 +365,8 @@ class CatalogEntry(models.Model):
     pub_date = models.DateTimeField("Publication Date", default=timezone.now)
     to_buy = models.BooleanField("To Buy", default=False)
 
+    objects = CatalogEntryQuerySet.as_manager()
+
     class Meta:
         ordering = ["item_definition__name"]
         verbose_name_plural = "Catalog Entries"
@@ -119,3 +395,47 @@ class CatalogGroupInvitation(models.Model):
 
     def __str__(self):
         return f"Invitation to {self.catalog_group.name} by {self.invited_by.username}"
+
+
+class Task(models.Model):
+    """
+    Deferred call of a function registered in catalog.tasks, run by a worker
+    thread of the server or `manage.py worker`
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField("Task", max_length=200)
+    kwargs = models.JSONField("Arguments", default=dict, blank=True)
+    status = models.CharField(
+        "Status", max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    run_at = models.DateTimeField("Run At", default=timezone.now)
+    attempts = models.PositiveIntegerField("Attempts", default=0)
+    max_attempts = models.PositiveIntegerField("Max Attempts", default=3)
+    # Enqueueing the same key again returns the existing task
+    idempotency_key = models.CharField(
+        "Idempotency Key", max_length=200, unique=True, null=True, blank=True
+    )
+    # A running task whose worker died is picked up again after this time
+    locked_until = models.DateTimeField("Locked Until", null=True, blank=True)
+    last_error = models.TextField("Last Error", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField("Finished At", null=True, blank=True)
+
+    class Meta:
+        ordering = ["run_at", "pk"]
+        indexes = [models.Index(fields=["status", "run_at"], name="task_due_idx")]
+        verbose_name_plural = "Tasks"
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,12 @@
+"""Helpers choosing the format of a response from the request"""
+
+
+def wants_json(request):
+    """
+    True when the client explicitly accepts JSON. Browsers submitting a form
+    only send wildcards for it.
+    """
+    return any(
+        media_type.main_type == "application" and media_type.sub_type == "json"
+        for media_type in request.accepted_types
+    )
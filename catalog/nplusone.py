@@ -0,0 +1,59 @@
+"""
+N+1 query detection for development and tests. NPlusOneDetector counts the
+SELECT queries of a request by their shape (the SQL without parameters) and
+call site, a query repeated NPLUSONE_THRESHOLD times from the same place is
+usually a lazy relation accessed in a loop.
+"""
+
+import logging
+import re
+import sys
+
+from .slow_queries import find_call_site
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_LIST = re.compile(r"%s(?:,\s*%s)+")
+RAISE = "raise"
+LOG = "log"
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def query_shape(sql):
+    """Returns sql with `IN (%s, %s, ...)` lists of any length made equal"""
+    return PLACEHOLDER_LIST.sub("%s, ...", sql)
+
+
+class NPlusOneDetector:
+    def __init__(self, request, threshold, mode):
+        self.request = request
+        self.threshold = threshold
+        self.mode = mode
+        self.counts = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == "SELECT":
+            self.check(sql)
+        return execute(sql, params, many, context)
+
+    def check(self, sql):
+        call_site, line = find_call_site(sys._getframe(2))
+        key = (query_shape(sql), call_site, line)
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if count != self.threshold:
+            return
+
+        resolver_match = getattr(self.request, "resolver_match", None)
+        message = (
+            f"N+1 query in {getattr(resolver_match, 'view_name', self.request.path)}:"
+            f" the same query ran {count} times from {call_site}"
+            f"{f' line {line}' if line else ''}, use select_related() or"
+            f" prefetch_related(): {sql}"
+        )
+        if self.mode == RAISE:
+            raise NPlusOneError(message)
+        logger.warning(message)
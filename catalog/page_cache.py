@@ -0,0 +1,162 @@
+"""
+Full page cache of the catalog list, enabled by the PAGE_CACHE setting.
+Pages are stored per template, user, catalog and normalized query state,
+with a placeholder instead of the CSRF token that is filled in for every
+response. Keys embed version tokens of the catalog, the user and the shared
+item definitions; writes replace the tokens so that old pages are never read
+again, see the receivers below.
+"""
+
+import hashlib
+import uuid
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .catalog_context import get_catalog_group
+from .models import (
+    CatalogEntry,
+    CatalogGroup,
+    ItemDefinition,
+    ItemGroup,
+    entries_updated,
+)
+
+PAGE_KEY = "catalog:page:{}"
+VERSION_KEY = "catalog:page-version:{}"
+# Item definitions and groups are shared by all catalogs
+ITEMS_SCOPE = "items"
+CATALOG_SCOPE = "catalog-{}"
+USER_SCOPE = "user-{}"
+# Rendered instead of the CSRF token, survives autoescaping unchanged
+CSRF_PLACEHOLDER = "csrf-token-placeholder-7c1f0a52"
+
+HIT = "hit"
+MISS = "miss"
+
+
+def get_versions(scopes):
+    """Returns the current version tokens of the scopes"""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # add() so that concurrent requests agree on the same token
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def bump(scopes):
+    """Replaces the version tokens, pages cached under the old ones expire"""
+    cache.set_many(
+        {VERSION_KEY.format(scope): uuid.uuid4().hex for scope in scopes}, None
+    )
+
+
+def bump_on_commit(scopes, using=None):
+    # A page rendered before the commit would be cached under the new tokens
+    if settings.PAGE_CACHE:
+        transaction.on_commit(partial(bump, scopes), using=using)
+
+
+def page_key(request, template_name, query_state):
+    """
+    Returns the cache key of the page, None when it can't be cached: the
+    cache is disabled or the user has no catalog.
+    """
+    if not settings.PAGE_CACHE or not request.user.is_authenticated:
+        return None
+    catalog_group = get_catalog_group(request)
+    if catalog_group is None:
+        return None
+
+    versions = get_versions(
+        [
+            ITEMS_SCOPE,
+            CATALOG_SCOPE.format(catalog_group.pk),
+            USER_SCOPE.format(request.user.pk),
+        ]
+    )
+    parts = [
+        template_name,
+        str(catalog_group.pk),
+        str(request.user.pk),
+        *map(str, versions),
+        urlencode(sorted(query_state.items())),
+    ]
+    digest = hashlib.md5("|".join(parts).encode(), usedforsecurity=False)
+    return PAGE_KEY.format(digest.hexdigest())
+
+
+def fill_csrf_token(request, content):
+    return content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+def cached_response(request, key):
+    """Returns the cached page as a response, None on a miss"""
+    content = cache.get(key)
+    if content is None:
+        return None
+    return HttpResponse(fill_csrf_token(request, content))
+
+
+def store(request, key, response):
+    """
+    Post render callback caching the page before the token is filled in,
+    the page is only filled in when `key` is None
+    """
+    if key is not None and response.status_code == 200:
+        cache.set(key, response.content, settings.PAGE_CACHE_TIMEOUT)
+    response.content = fill_csrf_token(request, response.content)
+
+
+@receiver([post_save, post_delete], sender=CatalogEntry)
+def entry_changed(sender, instance, using, **kwargs):
+    bump_on_commit([CATALOG_SCOPE.format(instance.catalog_group_id)], using)
+
+
+@receiver(entries_updated, sender=CatalogEntry)
+def entries_changed(sender, catalog_group_ids, using, **kwargs):
+    bump_on_commit([CATALOG_SCOPE.format(pk) for pk in catalog_group_ids], using)
+
+
+@receiver([post_save, post_delete], sender=CatalogGroup)
+def catalog_group_changed(sender, instance, using, **kwargs):
+    bump_on_commit([CATALOG_SCOPE.format(instance.pk)], using)
+
+
+@receiver(m2m_changed, sender=CatalogGroup.owners.through)
+def catalog_group_owners_changed(
+    sender, instance, action, reverse, pk_set, using, **kwargs
+):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        scopes = [USER_SCOPE.format(instance.pk)]
+    else:
+        scopes = [CATALOG_SCOPE.format(instance.pk)]
+        scopes += [USER_SCOPE.format(pk) for pk in pk_set or ()]
+    bump_on_commit(scopes, using)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, using, **kwargs):
+    bump_on_commit([USER_SCOPE.format(instance.pk)], using)
+
+
+@receiver([post_save, post_delete], sender=ItemDefinition)
+@receiver([post_save, post_delete], sender=ItemGroup)
+@receiver(m2m_changed, sender=ItemDefinition.group.through)
+def items_changed(sender, using, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        bump_on_commit([ITEMS_SCOPE], using)
@@ -0,0 +1,80 @@
+"""
+Runs a single request under cProfile or tracemalloc, see
+catalog.middleware.ProfilerMiddleware.
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import tracemalloc
+
+CPROFILE = "cprofile"
+ALLOC = "alloc"
+PROFILERS = (CPROFILE, ALLOC)
+TRACEBACK_FRAMES = 25
+CPROFILE_SORTS = pstats.Stats.sort_arg_dict_default
+ALLOC_SORTS = ("lineno", "filename", "traceback")
+
+
+def cprofile_request(get_response, request):
+    """Returns the response and the finished profiler"""
+    profiler = cProfile.Profile()
+    response = profiler.runcall(get_response, request)
+    profiler.create_stats()
+    return response, profiler
+
+
+def cprofile_report(profiler, sort="cumulative", limit=50):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def cprofile_dump(profiler):
+    """Returns the stats in the format of pstats.Stats.dump_stats"""
+    return marshal.dumps(profiler.stats)
+
+
+def alloc_request(get_response, request):
+    """
+    Returns the response, the allocation snapshots taken before and after it
+    and the peak of traced memory. tracemalloc traces every thread, so
+    requests running concurrently in this process show up too.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEBACK_FRAMES)
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        response = get_response(request)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    return response, before, after, peak
+
+
+def alloc_report(before, after, peak, sort="lineno", limit=50):
+    ignored = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    before = before.filter_traces(ignored)
+    after = after.filter_traces(ignored)
+    differences = after.compare_to(before, sort)
+    retained = sum(difference.size_diff for difference in differences)
+
+    lines = [
+        f"Peak traced memory: {peak / 1024:.1f} KiB",
+        f"Retained after the request: {retained / 1024:.1f} KiB",
+        "",
+    ]
+    for difference in differences[:limit]:
+        lines.append(str(difference))
+        if sort == "traceback":
+            lines.extend(f"    {line}" for line in difference.traceback.format())
+    return "\n".join(lines) + "\n"
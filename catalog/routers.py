@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB = "replica"
+REPLICATED_APPS = {"catalog"}
+# Models stored in the shard of their catalog, "app_label.model_name"
+SHARDED_MODELS = {"catalog.catalogentry"}
+
+_use_replica = ContextVar("use_replica", default=False)
+_current_shard = ContextVar("current_shard", default=None)
+
+
+def replica_configured():
+    return REPLICA_DB in settings.DATABASES
+
+
+def reads_from_replica():
+    """True while reads of catalog models go to the replica"""
+    return _use_replica.get() and replica_configured()
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """
+    Lets reads of catalog models inside the block go to the replica.
+    """
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def shard_for(catalog_group):
+    """Database of the catalog's entries, None when sharding is off"""
+    if not settings.SHARDS or catalog_group is None:
+        return None
+    return catalog_group.shard or DEFAULT_DB_ALIAS
+
+
+def current_shard():
+    return _current_shard.get()
+
+
+def set_current_shard(alias):
+    """Routes catalog queries to `alias` until the enclosing use_shard ends"""
+    _current_shard.set(alias)
+
+
+@contextmanager
+def use_shard(alias):
+    """Routes catalog queries inside the block to the shard `alias`"""
+    token = _current_shard.set(alias)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+class ShardRouter:
+    """
+    Stores the entries of every catalog in its shard database while SHARDS
+    is set. Shard connections attach the default database, so once the
+    current catalog is known (see set_current_shard) catalog reads go
+    through its shard, where entries can be joined with the shared items
+    and groups. Writes of shared models always go to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        shard = _current_shard.get()
+        if shard is None or model._meta.app_label not in REPLICATED_APPS:
+            return None
+        if model._meta.label_lower in SHARDED_MODELS:
+            return shard
+        # The shard only sees what the default database committed, reads of
+        # shared models inside its transactions must see their own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return shard
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in settings.SHARDS:
+            return instance._state.db
+        return _current_shard.get()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Entries reference items and catalogs of the default database
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB, *settings.SHARDS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.SHARDS:
+            label = f"{app_label}.{model_name}"
+            return label in SHARDED_MODELS
+        return None
+
+
+class ReplicaRouter:
+    """
+    Sends reads of catalog models to the read-only replica while the current
+    request allows it (see ReplicaRoutingMiddleware). Sessions and users are
+    always read from the primary database, so logins are never lost to a
+    stale snapshot, and every write goes to the primary database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICATED_APPS and reads_from_replica():
+            return REPLICA_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects loaded from the replica must still be saved to the primary.
+        if model._meta.app_label in REPLICATED_APPS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary database.
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB:
+            return False
+        return None
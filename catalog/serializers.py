@@ -1,44 +1,85 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
+from .timing import measure_serialize
 from .models import (
     ItemGroup,
     CatalogGroup,
     CatalogGroupInvitation,
     ItemDefinition,
     CatalogEntry,
+    CatalogEntryQuerySet,
 )
 
 
+class TimedDataMixin:
+    """Counts building `.data` as the serialize phase of Server-Timing"""
+
+    @property
+    def data(self):
+        with measure_serialize():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
 class ItemGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = ItemGroup
         fields = ["title"]
 
 
-class CatalogGroupSerializer(serializers.ModelSerializer):
+class CatalogGroupSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = CatalogGroup
         fields = ["name", "owners"]
+        list_serializer_class = TimedListSerializer
 
 
-class ItemDefinitionSerializer(serializers.ModelSerializer):
+class ItemDefinitionSerializer(TimedDataMixin, serializers.ModelSerializer):
     group = ItemGroupSerializer(many=True, read_only=True)
 
     class Meta:
         model = ItemDefinition
         fields = ["name", "group", "pk"]
+        list_serializer_class = TimedListSerializer
 
 
-class CatalogEntrySerializer(serializers.ModelSerializer):
+class CatalogEntrySerializer(TimedDataMixin, serializers.ModelSerializer):
     item_definition = ItemDefinitionSerializer(read_only=True)
 
     class Meta:
         model = CatalogEntry
         fields = ["item_definition", "to_buy", "pk", "catalog_group"]
+        list_serializer_class = TimedListSerializer
 
 
-class CatalogGroupInvitationSerializer(serializers.ModelSerializer):
+class CatalogGroupInvitationSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = CatalogGroupInvitation
         fields = ["id", "catalog_group", "invited_by", "created_at"]
         read_only_fields = ["id", "catalog_group", "invited_by", "created_at"]
+
+
+class QuantityAdjustmentSerializer(serializers.Serializer):
+    """Input of the quantity actions of the catalog resources API"""
+
+    op = serializers.ChoiceField(choices=CatalogEntryQuerySet.OPERATIONS)
+    amount = serializers.DecimalField(
+        max_digits=100, decimal_places=5, min_value=Decimal(0)
+    )
+    clamp = serializers.BooleanField(default=True)
+    items = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, required=False
+    )
+
+
+class QuantitySerializer(TimedDataMixin, serializers.Serializer):
+    pk = serializers.IntegerField()
+    count = serializers.DecimalField(max_digits=100, decimal_places=5)
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
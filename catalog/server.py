@@ -0,0 +1,43 @@
+import time
+
+from daphne.server import Server
+from twisted.internet import reactor
+
+
+class DrainingServer(Server):
+    """
+    Daphne server that stops gracefully: on drain() it stops accepting new
+    connections, lets in-flight requests finish and only then stops the
+    reactor. Requests still running after drain_timeout are cancelled.
+    """
+
+    def __init__(self, *args, drain_timeout=10, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+        self.ports = []
+        self.drain_deadline = None
+
+    def listen_success(self, port):
+        super().listen_success(port)
+        self.ports.append(port)
+
+    def drain(self):
+        if self.drain_deadline is not None:
+            return
+        self.drain_deadline = time.monotonic() + self.drain_timeout
+        for port in self.ports:
+            port.stopListening()
+        self.check_drained()
+
+    def busy(self):
+        return any(
+            not details["application_instance"].done()
+            for details in self.connections.values()
+            if "application_instance" in details
+        )
+
+    def check_drained(self):
+        if not self.busy() or time.monotonic() >= self.drain_deadline:
+            self.stop()
+        else:
+            reactor.callLater(0.1, self.check_drained)
@@ -0,0 +1,204 @@
+"""
+Per-catalog shards, enabled by the SHARDS setting. A shard is a SQLite file
+holding the catalog_catalogentry table only; its connections attach the
+default database, where users, catalogs, items and groups stay, so queries
+joining entries with them run unchanged. Every catalog records its shard,
+new catalogs go to the shard with the fewest catalogs and the
+rebalance_shards command moves them around.
+"""
+
+import math
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import CatalogEntry, CatalogGroup, ItemDefinition
+from .routers import shard_for, use_shard
+from .tasks import enqueue, task
+
+# Schema name of the default database on shard connections
+SHARED_SCHEMA = "shared"
+MOVE_BATCH_SIZE = 500
+
+
+def entry_databases():
+    """Every database that may hold entries"""
+    return [DEFAULT_DB_ALIAS, *settings.SHARDS]
+
+
+def pick_shard():
+    """The shard with the fewest catalogs"""
+    counts = dict(
+        CatalogGroup.objects.using(DEFAULT_DB_ALIAS)
+        .filter(shard__in=settings.SHARDS)
+        .values_list("shard")
+        .annotate(Count("pk"))
+    )
+    return min(settings.SHARDS, key=lambda alias: counts.get(alias, 0))
+
+
+def entry_counts():
+    """Number of entries per catalog id, over all databases"""
+    counts = {}
+    for alias in entry_databases():
+        rows = (
+            CatalogEntry.objects.using(alias)
+            .order_by()
+            .values_list("catalog_group_id")
+            .annotate(Count("pk"))
+        )
+        for catalog_group_id, count in rows:
+            counts[catalog_group_id] = counts.get(catalog_group_id, 0) + count
+    return counts
+
+
+def plan_rebalance(catalog_groups, counts, shards):
+    """
+    Returns (catalog group, target shard) moves spreading the entries evenly
+    over the shards. Catalogs stay where they are while their shard has room,
+    the rest go to the least loaded shard, largest first.
+    """
+    limit = math.ceil(sum(counts.values()) / len(shards))
+    loads = dict.fromkeys(shards, 0)
+    moves = []
+    for catalog_group in sorted(
+        catalog_groups, key=lambda group: (-counts.get(group.pk, 0), group.pk)
+    ):
+        count = counts.get(catalog_group.pk, 0)
+        current = catalog_group.shard
+        if current in loads and (not loads[current] or loads[current] + count <= limit):
+            loads[current] += count
+            continue
+        target = min(shards, key=lambda alias: (loads[alias], alias))
+        loads[target] += count
+        if target != current:
+            moves.append((catalog_group, target))
+    return moves
+
+
+def lock_entries(alias):
+    """
+    Takes the write lock of the entries database `alias` inside its open
+    transaction, with a write that changes nothing
+    """
+    CatalogEntry.objects.using(alias).filter(pk=0).update(to_buy=F("to_buy"))
+
+
+@contextmanager
+def locked_shard(catalog_group):
+    """
+    Runs the block in a transaction of the database holding the catalog's
+    entries, which is the current shard inside it. The catalog's shard is
+    read again once the lock is held: move_catalog holds it until the
+    catalog points to its new shard, so entries written in the block never
+    end up in a shard the catalog just left. Does nothing without SHARDS.
+    """
+    alias = shard_for(catalog_group)
+    if alias is None:
+        yield
+        return
+    while True:
+        with transaction.atomic(using=alias):
+            lock_entries(alias)
+            shard = (
+                CatalogGroup.objects.using(DEFAULT_DB_ALIAS)
+                .values_list("shard", flat=True)
+                .get(pk=catalog_group.pk)
+            )
+            if (shard or DEFAULT_DB_ALIAS) == alias:
+                with use_shard(alias):
+                    yield
+                return
+        catalog_group.shard = shard
+        alias = shard_for(catalog_group)
+
+
+def move_catalog(catalog_group, target):
+    """
+    Moves the entries of the catalog into the database `target` and returns
+    their number. Writes to the catalog inside locked_shard() wait until the
+    move is done, then go to the new shard; moved entries get new ids.
+    """
+    source = catalog_group.shard or DEFAULT_DB_ALIAS
+    if source == target:
+        return 0
+    entries = CatalogEntry.objects.using(source).filter(catalog_group=catalog_group)
+    with transaction.atomic(using=source):
+        lock_entries(source)
+        with transaction.atomic(using=target):
+            # Left over by an interrupted move
+            CatalogEntry.objects.using(target).filter(
+                catalog_group=catalog_group
+            ).delete()
+            moved = CatalogEntry.objects.using(target).bulk_create(
+                (
+                    CatalogEntry(
+                        item_definition_id=entry.item_definition_id,
+                        catalog_group_id=entry.catalog_group_id,
+                        count=entry.count,
+                        pub_date=entry.pub_date,
+                        to_buy=entry.to_buy,
+                    )
+                    for entry in entries.iterator()
+                ),
+                batch_size=MOVE_BATCH_SIZE,
+            )
+            catalog_group.shard = "" if target == DEFAULT_DB_ALIAS else target
+            catalog_group.save(using=DEFAULT_DB_ALIAS, update_fields=["shard"])
+        entries.delete()
+    return len(moved)
+
+
+@receiver(connection_created)
+def attach_shared_database(sender, connection, **kwargs):
+    if connection.alias in settings.SHARDS:
+        name = connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]
+        connection.connection.execute(
+            f"ATTACH DATABASE ? AS {SHARED_SCHEMA}", [str(name)]
+        )
+
+
+@receiver(pre_save, sender=CatalogGroup)
+def assign_shard(sender, instance, raw, **kwargs):
+    if settings.SHARDS and not raw and instance.pk is None and not instance.shard:
+        instance.shard = pick_shard()
+
+
+@task(name="catalog.delete_shard_entries")
+def delete_shard_entries(aliases, catalog_group_id=None, item_definition_id=None):
+    """
+    Deletes the entries a deleted catalog or item left in the shards, where
+    its cascade doesn't reach. Until then they belong to nothing that still
+    exists and ids aren't reused, so no list shows them.
+    """
+    filters = {
+        "catalog_group_id": catalog_group_id,
+        "item_definition_id": item_definition_id,
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
+    for alias in aliases:
+        CatalogEntry.objects.using(alias).filter(**filters).delete()
+
+
+@receiver(post_delete, sender=CatalogGroup)
+def delete_catalog_entries(sender, instance, **kwargs):
+    # Cascades only reach the database the catalog is deleted from
+    alias = shard_for(instance)
+    if alias not in (None, DEFAULT_DB_ALIAS):
+        enqueue(
+            delete_shard_entries, {"aliases": [alias], "catalog_group_id": instance.pk}
+        )
+
+
+@receiver(post_delete, sender=ItemDefinition)
+def delete_item_entries(sender, instance, **kwargs):
+    if settings.SHARDS:
+        enqueue(
+            delete_shard_entries,
+            {"aliases": settings.SHARDS, "item_definition_id": instance.pk},
+        )
@@ -0,0 +1,156 @@
+"""
+Sampled slow query log. catalog.middleware.SlowQueryMiddleware wraps every database call of a
+request with a SlowQueryRecorder, queries slower than
+SLOW_QUERY_THRESHOLD_MS are sampled at SLOW_QUERY_SAMPLE_RATE, logged to the
+"catalog.slow_queries" logger and kept in an in-memory top-N list.
+"""
+
+import heapq
+import logging
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template.base import Node
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+COMPREHENSIONS = {"<listcomp>", "<dictcomp>", "<setcomp>"}
+
+
+class SlowQueryLog:
+    """Thread-safe list of the slowest recorded queries of this process."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.heap = []
+        self.counter = 0
+
+    def add(self, record):
+        with self.lock:
+            # The counter breaks ties, records themselves aren't comparable.
+            self.counter += 1
+            entry = (record["duration_ms"], self.counter, record)
+            if len(self.heap) < self.size:
+                heapq.heappush(self.heap, entry)
+            else:
+                heapq.heappushpop(self.heap, entry)
+
+    def top(self):
+        with self.lock:
+            return [record for _, _, record in sorted(self.heap, reverse=True)]
+
+    def clear(self):
+        with self.lock:
+            self.heap = []
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_TOP_N)
+
+
+def frame_qualname(frame):
+    """
+    Returns Class.method for methods. Python 3.10 has no co_qualname, so the
+    class defining the method is looked up in the MRO of `self`.
+    """
+    code = frame.f_code
+    qualname = getattr(code, "co_qualname", None)
+    if qualname:
+        return qualname
+    if code.co_name in COMPREHENSIONS and frame.f_back is not None:
+        # Comprehensions run right away in the function defining them
+        return f"{frame_qualname(frame.f_back)}.{code.co_name}"
+    owner = frame.f_locals.get("self", frame.f_locals.get("cls"))
+    if owner is not None:
+        owner_class = owner if isinstance(owner, type) else type(owner)
+        for base in owner_class.__mro__:
+            function = base.__dict__.get(code.co_name)
+            if getattr(function, "__code__", None) is code:
+                return f"{base.__name__}.{code.co_name}"
+    return code.co_name
+
+
+def find_call_site(frame):
+    """
+    Returns the first project frame as "views.py:Class.method" and its line.
+    Querysets evaluated while rendering a template are attributed to the
+    template tag evaluating them, otherwise they would show up as the
+    middleware calling the view.
+    """
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(PROJECT_DIR)
+            and "site-packages" not in filename
+            and filename != __file__
+        ):
+            return f"{Path(filename).name}:{frame_qualname(frame)}", frame.f_lineno
+        node = frame.f_locals.get("self")
+        # type() rather than isinstance(), which would evaluate lazy objects
+        if issubclass(type(node), Node) and getattr(node, "origin", None):
+            return node.origin.template_name, node.token.lineno
+        frame = frame.f_back
+    return None, None
+
+
+def params_shape(params, many):
+    if many:
+        params = next(iter(params), ())
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params or ()]
+
+
+class SlowQueryRecorder:
+    def __init__(self, request, threshold_ms, sample_rate):
+        self.request = request
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold and random.random() < self.sample_rate:
+                self.record(sql, params, many, duration, context)
+
+    def get_view_name(self):
+        # Queries of the session and auth middleware run before URL resolving
+        resolver_match = getattr(self.request, "resolver_match", None)
+        if resolver_match is None:
+            try:
+                resolver_match = resolve(self.request.path_info)
+            except Resolver404:
+                return None
+        return resolver_match.view_name
+
+    def record(self, sql, params, many, duration, context):
+        call_site, line = find_call_site(sys._getframe(2))
+        view_name = self.get_view_name()
+        record = {
+            "sql": sql,
+            "params": params_shape(params, many),
+            "many": many,
+            "duration_ms": round(duration * 1000, 3),
+            "database": context["connection"].alias,
+            "view": view_name,
+            "call_site": call_site,
+            "line": line,
+        }
+        slow_query_log.add(record)
+        logger.warning(
+            "Slow query %.1fms in %s at %s: %s",
+            record["duration_ms"],
+            view_name,
+            call_site,
+            sql,
+            extra={"slow_query": record},
+        )
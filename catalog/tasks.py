@@ -0,0 +1,228 @@
+"""
+Durable background tasks. Functions registered with @task are enqueued as
+rows of the Task table and run later by a worker: a thread of the server
+process (TASK_WORKER_THREAD) or `manage.py worker`. Workers claim a task
+with a conditional UPDATE, so any number of them can share the table.
+
+Tasks are retried with exponential backoff and may run more than once, when
+a worker dies mid-task for example, so they have to be idempotent. With
+TASKS_EAGER tasks run inside enqueue(), retries included, which is what the
+tests use.
+"""
+
+import logging
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger("catalog.tasks")
+
+TaskDefinition = namedtuple("TaskDefinition", "func max_attempts retry_delay")
+registry = {}
+
+# Due tasks looked at per claim, others may be claimed concurrently
+CLAIM_CANDIDATES = 5
+# Seconds between checks that the daily purge task is scheduled
+SCHEDULE_INTERVAL = 3600
+
+
+def task(func=None, *, name=None, max_attempts=3, retry_delay=30):
+    """
+    Registers a function as a task. Retries wait retry_delay seconds, then
+    twice as long after every further failure.
+    """
+
+    def register(func):
+        task_name = name or f"{func.__module__}.{func.__qualname__}"
+        registry[task_name] = TaskDefinition(func, max_attempts, retry_delay)
+        func.task_name = task_name
+        return func
+
+    return register(func) if func is not None else register
+
+
+def enqueue(
+    func,
+    kwargs=None,
+    *,
+    run_at=None,
+    delay=0,
+    idempotency_key=None,
+    max_attempts=None,
+):
+    """
+    Stores a call of the task `func` (the function or its name). The task
+    runs at `run_at`, or `delay` seconds from now. With an idempotency_key
+    only the first enqueue creates a task, later ones return it. Enqueued
+    inside a transaction, the task is only visible to workers after commit.
+    """
+    name = getattr(func, "task_name", func)
+    if name not in registry:
+        raise ValueError(f"Unknown task {name}")
+    fields = {
+        "name": name,
+        "kwargs": kwargs or {},
+        "run_at": run_at or timezone.now() + timedelta(seconds=delay),
+        "max_attempts": max_attempts or registry[name].max_attempts,
+    }
+    if idempotency_key is None:
+        queued, created = Task.objects.create(**fields), True
+    else:
+        queued, created = Task.objects.get_or_create(
+            idempotency_key=idempotency_key, defaults=fields
+        )
+    if created and settings.TASKS_EAGER:
+        return run_now(queued)
+    return queued
+
+
+def claim(now=None, pk=None):
+    """
+    Marks the next due task as running and returns it, None when nothing is
+    due. Tasks whose lease ran out are due again.
+    """
+    now = now or timezone.now()
+    due = Task.objects.filter(
+        Q(status=Task.PENDING) | Q(status=Task.RUNNING, locked_until__lt=now),
+        run_at__lte=now,
+    )
+    if pk is not None:
+        due = due.filter(pk=pk)
+    candidates = due.order_by("run_at", "pk").values_list("pk", flat=True)
+    for candidate in candidates[:CLAIM_CANDIDATES]:
+        # Only one worker's UPDATE still matches the due conditions
+        claimed = due.filter(pk=candidate).update(
+            status=Task.RUNNING,
+            locked_until=now + timedelta(seconds=settings.TASK_LEASE_SECONDS),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=candidate)
+    return None
+
+
+def execute(claimed):
+    """Runs a claimed task and records the outcome"""
+    definition = registry.get(claimed.name)
+    try:
+        if definition is None:
+            raise LookupError(f"Unknown task {claimed.name}")
+        definition.func(**claimed.kwargs)
+    except Exception:
+        claimed.last_error = traceback.format_exc()
+        # A task no worker knows, removed or renamed, fails on every retry
+        if definition is not None and claimed.attempts < claimed.max_attempts:
+            backoff = definition.retry_delay * 2 ** (claimed.attempts - 1)
+            claimed.status = Task.PENDING
+            claimed.run_at = timezone.now() + timedelta(seconds=backoff)
+            logger.warning(
+                "Task %s failed, retrying in %ss", claimed.name, backoff, exc_info=True
+            )
+        else:
+            claimed.status = Task.FAILED
+            claimed.finished_at = timezone.now()
+            logger.error(
+                "Task %s failed %s times, giving up",
+                claimed.name,
+                claimed.attempts,
+                exc_info=True,
+            )
+    else:
+        claimed.status = Task.DONE
+        claimed.finished_at = timezone.now()
+    claimed.locked_until = None
+    claimed.save(
+        update_fields=["status", "run_at", "last_error", "finished_at", "locked_until"]
+    )
+    return claimed
+
+
+def run_now(queued):
+    """Runs a task right away, retries included, without waiting for them"""
+    while True:
+        claimed = claim(now=max(timezone.now(), queued.run_at), pk=queued.pk)
+        if claimed is None:
+            return queued
+        queued = execute(claimed)
+
+
+def run_pending(limit=None):
+    """Runs due tasks until there are none left, returns how many ran"""
+    count = 0
+    while limit is None or count < limit:
+        claimed = claim()
+        if claimed is None:
+            break
+        execute(claimed)
+        count += 1
+    return count
+
+
+@task(name="catalog.purge_tasks")
+def purge_tasks(days=None):
+    """Deletes finished tasks older than TASK_RETENTION_DAYS"""
+    days = settings.TASK_RETENTION_DAYS if days is None else days
+    Task.objects.filter(
+        status__in=[Task.DONE, Task.FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+
+
+def schedule_purge():
+    """Schedules one purge per day, however many workers call this"""
+    today = timezone.localdate()
+    enqueue(purge_tasks, idempotency_key=f"catalog.purge_tasks:{today}")
+
+
+class Worker(threading.Thread):
+    """Runs due tasks every poll_interval seconds until stopped"""
+
+    def __init__(self, poll_interval=1.0):
+        super().__init__(name="catalog-task-worker", daemon=True)
+        self.poll_interval = poll_interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_schedule = 0
+        try:
+            while not self.stopped.is_set():
+                ran = 0
+                try:
+                    if time.monotonic() >= next_schedule:
+                        schedule_purge()
+                        next_schedule = time.monotonic() + SCHEDULE_INTERVAL
+                    ran = run_pending(limit=settings.TASK_BATCH_SIZE)
+                except Exception:
+                    logger.exception("Task worker failed")
+                finally:
+                    close_old_connections()
+                if not ran:
+                    self.stopped.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Starts the worker thread of this process, once"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = Worker(poll_interval=settings.TASK_POLL_INTERVAL)
+            _worker.start()
+        return _worker
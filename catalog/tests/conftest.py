@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def raise_on_nplusone(settings):
+    """New N+1 queries fail the tests that trigger them"""
+    settings.NPLUSONE_DETECTION = "raise"
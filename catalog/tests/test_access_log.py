@@ -0,0 +1,67 @@
+import io
+import json
+import logging
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..log_handlers import BackgroundHandler, JsonFormatter
+from .test_factories import create_catalog_group, create_user
+
+
+class BackgroundHandlerTests(SimpleTestCase):
+    def test_records_are_written_by_listener(self):
+        """Test that records are formatted and written off the logging thread"""
+        stream = io.StringIO()
+        handler = BackgroundHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        logger = logging.getLogger("catalog.tests.background")
+        logger.addHandler(handler)
+        try:
+            logger.warning("hello %s", "world", extra={"data": {"status": 200}})
+        finally:
+            logger.removeHandler(handler)
+            # Stops the listener after the queue is drained
+            handler.close()
+
+        line = json.loads(stream.getvalue())
+        self.assertEqual(line["message"], "hello world")
+        self.assertEqual(line["status"], 200)
+
+    def test_full_queue_drops_records(self):
+        """Test that a full queue doesn't block the caller"""
+        handler = BackgroundHandler(io.StringIO(), maxsize=1)
+        handler.listener.stop()
+        record = logging.makeLogRecord({"msg": "dropped"})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+
+@override_settings(ACCESS_LOG=True)
+class AccessLogMiddlewareTests(TestCase):
+    def test_access_record(self):
+        """Test the fields of an authenticated request"""
+        user = create_user()
+        catalog_group = create_catalog_group(owner=user)
+        self.client.force_login(user)
+
+        with self.assertLogs("catalog.access", logging.INFO) as logs:
+            response = self.client.get(reverse("catalog:index"))
+
+        data = logs.records[0].data
+        self.assertEqual(data["route"], "catalog:index")
+        self.assertEqual(data["user_id"], user.pk)
+        self.assertEqual(data["catalog_group_id"], catalog_group.pk)
+        self.assertEqual(data["status"], 200)
+        self.assertEqual(data["bytes"], len(response.content))
+        self.assertGreater(data["queries"], 0)
+        self.assertGreater(data["latency_ms"], 0)
+        self.assertIsNone(data["cache"])
+
+    def test_anonymous_request(self):
+        """Test that anonymous requests are logged without a user"""
+        with self.assertLogs("catalog.access", logging.INFO) as logs:
+            self.client.get(reverse("catalog:login"))
+        self.assertIsNone(logs.records[0].data["user_id"])
+        self.assertEqual(logs.records[0].data["route"], "catalog:login")
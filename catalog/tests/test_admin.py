@@ -0,0 +1,128 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..admin import EstimatedCountPaginator
+from ..models import CatalogEntry, CatalogGroup, ItemDefinition, ItemGroup
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_item_group,
+)
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="12345")
+        self.client.force_login(self.admin)
+        self.catalog_group = create_catalog_group()
+        self.group = create_item_group()
+
+    def create_entries(self, count, offset=0):
+        for number in range(offset, offset + count):
+            item_definition = create_item_definition(
+                name=f"Item {number}", group=self.group
+            )
+            create_catalog_entry(item_definition, self.catalog_group)
+
+    def count_changelist_queries(self):
+        url = reverse("admin:catalog_catalogentry_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_dont_grow_with_rows(self):
+        """Test that listed entries don't cost a query each"""
+        self.create_entries(2)
+        few = self.count_changelist_queries()
+        self.create_entries(8, offset=2)
+        self.assertEqual(self.count_changelist_queries(), few)
+
+    def test_prefix_search(self):
+        """Test that the admin search matches name prefixes, any case"""
+        self.create_entries(3)
+        create_catalog_entry(create_item_definition(name="Milk"), self.catalog_group)
+        response = self.client.get(
+            reverse("admin:catalog_catalogentry_changelist"), {"q": "mil"}
+        )
+        self.assertEqual(response.context["cl"].result_count, 1)
+        response = self.client.get(
+            reverse("admin:catalog_itemdefinition_changelist"), {"q": "item"}
+        )
+        self.assertEqual(response.context["cl"].result_count, 3)
+
+    def test_prefix_search_uses_index(self):
+        """Test that the prefix lookups are answered from the NOCASE indexes"""
+        for queryset, index in [
+            (
+                ItemDefinition.objects.filter(name__istartswith="mil"),
+                "item_definition_prefix_idx",
+            ),
+            (
+                ItemGroup.objects.filter(title__istartswith="dai"),
+                "item_group_title_prefix_idx",
+            ),
+            (
+                CatalogGroup.objects.filter(name__istartswith="hom"),
+                "catalog_group_name_prefix_idx",
+            ),
+        ]:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = " ".join(str(row) for row in cursor.fetchall())
+            self.assertIn(index, plan)
+
+    def test_autocomplete(self):
+        """Test that related items are looked up instead of listed"""
+        self.create_entries(3)
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {
+                "app_label": "catalog",
+                "model_name": "catalogentry",
+                "field_name": "item_definition",
+                "term": "Item 1",
+            },
+        )
+        self.assertEqual(
+            [result["text"] for result in response.json()["results"]],
+            ["[Test Group] Item 1"],
+        )
+
+    @override_settings(SHARDS=["shard_a"])
+    def test_entries_hidden_with_shards(self):
+        """Test that entries spread over shards aren't listed from one of them"""
+        response = self.client.get(reverse("admin:catalog_catalogentry_changelist"))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse("admin:index"))
+        self.assertNotContains(response, "Catalog Entries")
+        self.assertContains(response, "Item Definitions")
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        catalog_group = create_catalog_group()
+        for number in range(5):
+            create_catalog_entry(
+                create_item_definition(name=f"Item {number}"), catalog_group
+            )
+
+    def test_unfiltered_count_is_estimated(self):
+        """Test that the whole table isn't counted"""
+        paginator = EstimatedCountPaginator(CatalogEntry.objects.all(), 2)
+        with self.assertNumQueries(1) as context:
+            self.assertEqual(paginator.count, 5)
+        self.assertNotIn("COUNT", context.captured_queries[0]["sql"])
+
+    def test_filtered_count_is_capped(self):
+        """Test that filtered counts stop at COUNT_LIMIT"""
+        queryset = CatalogEntry.objects.filter(to_buy=False)
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+        paginator = EstimatedCountPaginator(queryset, 2)
+        paginator.COUNT_LIMIT = 3
+        self.assertEqual(paginator.count, 3)
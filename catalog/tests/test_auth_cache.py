@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..auth_cache import CATALOG_GROUP_KEY, USER_KEY
+from ..models import CatalogGroup
+
+CACHED_AUTH_MIDDLEWARE = [
+    (
+        "catalog.middleware.CachedAuthenticationMiddleware"
+        if path == "django.contrib.auth.middleware.AuthenticationMiddleware"
+        else path
+    )
+    for path in settings.MIDDLEWARE
+]
+
+
+@override_settings(
+    CACHED_AUTH=True,
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    MIDDLEWARE=CACHED_AUTH_MIDDLEWARE,
+)
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.catalog_group = CatalogGroup.objects.create(name="Test Catalog")
+        self.catalog_group.owners.add(self.user)
+        self.client.login(username="testuser", password="12345")
+
+    def test_warm_request_makes_no_queries(self):
+        """Test that session, user and catalog group come from the cache"""
+        self.client.get(reverse("catalog:login"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("catalog:login"))
+        self.assertRedirects(response, reverse("catalog:index"))
+
+    def test_password_change_logs_user_out(self):
+        """Test that a cached user with an outdated session hash is rejected"""
+        self.client.get(reverse("catalog:login"))
+        self.user.set_password("new-password")
+        self.user.save()
+
+        response = self.client.get(reverse("catalog:login"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "catalog/auth.html")
+
+    def test_logout_drops_cached_user(self):
+        """Test that logging out removes the cached user"""
+        self.client.get(reverse("catalog:login"))
+        self.assertIsNotNone(cache.get(USER_KEY.format(self.user.pk)))
+
+        self.client.post(reverse("catalog:logout"))
+        self.assertIsNone(cache.get(USER_KEY.format(self.user.pk)))
+
+    def test_leaving_catalog_group_drops_cached_group(self):
+        """Test that catalog membership changes invalidate the cached group"""
+        self.client.get(reverse("catalog:login"))
+        self.assertEqual(
+            cache.get(CATALOG_GROUP_KEY.format(self.user.pk)), self.catalog_group
+        )
+
+        self.catalog_group.owners.remove(self.user)
+        self.assertIsNone(cache.get(CATALOG_GROUP_KEY.format(self.user.pk)))
+        response = self.client.get(reverse("catalog:index"))
+        self.assertRedirects(response, reverse("catalog:create-catalog-group"))
@@ -0,0 +1,104 @@
+import gzip
+import sqlite3
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase
+
+from ..backup import integrity_check
+from ..models import CatalogEntry, CatalogGroup
+from ..routers import use_shard
+from .test_factories import create_catalog_entry, create_item_definition
+from .test_sharding import SHARD, ShardDatabaseMixin
+
+
+class BackupRestoreTests(TransactionTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = Path(tmp_dir.name)
+        self.catalog_group = CatalogGroup.objects.create(name="Test Catalog")
+        create_catalog_entry(create_item_definition(name="Milk"), self.catalog_group)
+
+    def count_entries(self, path):
+        database = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return database.execute(
+                "SELECT COUNT(*) FROM catalog_catalogentry"
+            ).fetchone()[0]
+        finally:
+            database.close()
+
+    def test_backup(self):
+        """Test that the backup is a verified copy of the database"""
+        path = self.tmp_dir / "backup.sqlite3"
+        call_command("backup_db", str(path), pages=1, sleep=0, stdout=StringIO())
+        self.assertEqual(integrity_check(path), [])
+        self.assertEqual(self.count_entries(path), 1)
+        self.assertEqual(sorted(p.name for p in self.tmp_dir.iterdir()), [path.name])
+
+    def test_gzipped_backup_and_restore(self):
+        """Test that a compressed backup restores the data it was made from"""
+        path = self.tmp_dir / "backup.sqlite3.gz"
+        call_command("backup_db", str(path), stdout=StringIO())
+        with gzip.open(path) as backup:
+            self.assertTrue(backup.read(16).startswith(b"SQLite format 3"))
+
+        CatalogEntry.objects.all().delete()
+        create_catalog_entry(create_item_definition(name="Bread"), self.catalog_group)
+        call_command("restore_db", str(path), interactive=False, stdout=StringIO())
+        self.assertEqual(
+            list(CatalogEntry.objects.values_list("item_definition__name", flat=True)),
+            ["Milk"],
+        )
+
+    def test_restore_rejects_corrupt_backup(self):
+        """Test that a file that isn't a sound database is never restored"""
+        path = self.tmp_dir / "backup.sqlite3"
+        path.write_bytes(b"not a database" * 100)
+        with self.assertRaisesMessage(CommandError, "integrity check"):
+            call_command("restore_db", str(path), interactive=False)
+        self.assertEqual(CatalogEntry.objects.count(), 1)
+
+    def test_restore_asks_for_confirmation(self):
+        """Test that restoring interactively needs an explicit yes"""
+        path = self.tmp_dir / "backup.sqlite3"
+        call_command("backup_db", str(path), stdout=StringIO())
+        with mock.patch("builtins.input", return_value="no"):
+            with self.assertRaisesMessage(CommandError, "cancelled"):
+                call_command("restore_db", str(path))
+
+
+class ShardBackupTests(ShardDatabaseMixin, TransactionTestCase):
+    def setUp(self):
+        self.add_shard()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "backup.sqlite3.gz"
+        self.catalog_group = CatalogGroup.objects.create(name="Test Catalog")
+        with use_shard(SHARD):
+            create_catalog_entry(
+                create_item_definition(name="Milk"), self.catalog_group
+            )
+
+    def test_backup_and_restore_every_shard(self):
+        """Test that the default database and every shard are backed up"""
+        call_command("backup_db", str(self.path), stdout=StringIO())
+        shard_path = self.path.with_name(f"backup.{SHARD}.sqlite3.gz")
+        self.assertTrue(shard_path.exists())
+
+        CatalogEntry.objects.using(SHARD).all().delete()
+        call_command("restore_db", str(self.path), interactive=False, stdout=StringIO())
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 1)
+
+    def test_restore_needs_every_file(self):
+        """Test that nothing is restored while a shard's backup is missing"""
+        call_command("backup_db", str(self.path), database="default", stdout=StringIO())
+        CatalogGroup.objects.create(name="Other")
+        with self.assertRaisesMessage(CommandError, "does not exist"):
+            call_command("restore_db", str(self.path), interactive=False)
+        self.assertEqual(CatalogGroup.objects.count(), 2)
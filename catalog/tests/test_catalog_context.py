@@ -0,0 +1,74 @@
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..catalog_context import catalog_filter, get_catalog_group, set_catalog_group
+from ..models import CatalogEntry
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+
+class CatalogContextTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.catalog_group = create_catalog_group(owner=self.user)
+        self.request = RequestFactory().get("/")
+        self.request.user = self.user
+
+    def test_resolved_once_per_request(self):
+        """Test that the catalog group is looked up only once"""
+        with self.assertNumQueries(1):
+            self.assertEqual(get_catalog_group(self.request), self.catalog_group)
+            self.assertEqual(get_catalog_group(self.request), self.catalog_group)
+
+    def test_scope_of_another_user_is_not_reused(self):
+        """Test that a DRF user differing from the middleware's is resolved"""
+        set_catalog_group(self.request, create_user(username="other"), None)
+        self.assertEqual(get_catalog_group(self.request), self.catalog_group)
+
+    def test_no_catalog_matches_nothing(self):
+        """Test that users without a catalog see no entries at all"""
+        create_catalog_entry(create_item_definition(), None)
+        self.request.user = create_user(username="other")
+        self.assertFalse(CatalogEntry.objects.filter(catalog_filter(self.request)))
+
+
+class CatalogScopedQueriesTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.catalog_group = create_catalog_group(owner=self.user)
+        self.entry = create_catalog_entry(create_item_definition(), self.catalog_group)
+        self.client.force_login(self.user)
+
+    def assert_no_owners_join(self, queries):
+        catalog_queries = [
+            q["sql"] for q in queries if "catalog_catalogentry" in q["sql"]
+        ]
+        self.assertTrue(catalog_queries)
+        for sql in catalog_queries:
+            self.assertNotIn("catalog_cataloggroup_owners", sql)
+
+    def test_index(self):
+        """Test that the index filters entries and groups by catalog id"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("catalog:index"), {"flat_view": "1"})
+        self.assert_no_owners_join(queries)
+
+    def test_update(self):
+        """Test that toggling looks the entry up by its catalog id"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("catalog:update", args=[self.entry.pk]))
+        self.assert_no_owners_join(queries)
+        self.entry.refresh_from_db()
+        self.assertTrue(self.entry.to_buy)
+
+    def test_catalog_resource_list(self):
+        """Test that the to_buy annotation filters by catalog id"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("catalog:catalog-resource-list"))
+        self.assert_no_owners_join(queries)
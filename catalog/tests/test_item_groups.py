@@ -0,0 +1,144 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import ItemGroup, ItemGroupClosure
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+
+class ItemGroupTreeTests(TestCase):
+    def setUp(self):
+        self.kitchen = ItemGroup.objects.create(title="Kitchen")
+        self.spices = ItemGroup.objects.create(title="Spices", parent=self.kitchen)
+        self.pepper = ItemGroup.objects.create(title="Pepper", parent=self.spices)
+        self.bathroom = ItemGroup.objects.create(title="Bathroom")
+
+    def assertPath(self, group, titles):
+        with self.assertNumQueries(1):
+            path = [g.title for g in ItemGroup.objects.path_to(group)]
+        self.assertEqual(path, titles)
+
+    def test_path_and_subtree(self):
+        """Test that paths and subtrees are read from the closure table"""
+        self.assertPath(self.pepper, ["Kitchen", "Spices", "Pepper"])
+        self.assertQuerySetEqual(
+            ItemGroup.objects.subtree_of(self.kitchen),
+            ["Kitchen", "Pepper", "Spices"],
+            transform=str,
+        )
+        self.assertEqual(
+            ItemGroupClosure.objects.get(
+                ancestor=self.kitchen, descendant=self.pepper
+            ).depth,
+            2,
+        )
+
+    def test_move_subtree(self):
+        """Test that moving a group moves its subgroups along"""
+        self.spices.parent = self.bathroom
+        self.spices.save()
+        self.assertPath(self.pepper, ["Bathroom", "Spices", "Pepper"])
+        self.assertQuerySetEqual(
+            ItemGroup.objects.subtree_of(self.kitchen), ["Kitchen"], transform=str
+        )
+
+        self.spices.parent = None
+        self.spices.save()
+        self.assertPath(self.pepper, ["Spices", "Pepper"])
+
+    def test_cycles_are_rejected(self):
+        """Test that a group can't be moved below its own subgroup"""
+        self.kitchen.parent = self.pepper
+        with self.assertRaises(ValidationError):
+            self.kitchen.full_clean()
+        with self.assertRaises(ValueError):
+            self.kitchen.save()
+
+    def test_delete_subtree(self):
+        """Test that deleting a group deletes its subgroups and their links"""
+        self.spices.delete()
+        self.assertFalse(ItemGroup.objects.filter(title="Pepper").exists())
+        self.assertEqual(
+            set(ItemGroupClosure.objects.values_list("descendant__title", flat=True)),
+            {"Kitchen", "Bathroom"},
+        )
+
+
+class NestedGroupViewTests(TestCase):
+    def setUp(self):
+        user = create_user()
+        self.catalog_group = create_catalog_group(owner=user)
+        self.kitchen = ItemGroup.objects.create(title="Kitchen")
+        self.spices = ItemGroup.objects.create(title="Spices", parent=self.kitchen)
+        self.pepper = ItemGroup.objects.create(title="Pepper", parent=self.spices)
+        for name, group in [
+            ("Pan", self.kitchen),
+            ("Salt", self.spices),
+            ("Black pepper", self.pepper),
+            ("White pepper", self.pepper),
+        ]:
+            create_catalog_entry(
+                create_item_definition(name, group), self.catalog_group
+            )
+        self.client.force_login(user)
+
+    def test_top_level_counts_subtree(self):
+        """Test that only top level groups show, counting their subtree"""
+        response = self.client.get(reverse("catalog:index"))
+        groups = response.context["groups"]
+        self.assertEqual([(g.title, g.entry_count) for g in groups], [("Kitchen", 4)])
+
+    def test_counts_follow_to_buy_filter(self):
+        """Test that groups count the same entries their list shows"""
+        create_catalog_entry(
+            create_item_definition("Pot", self.kitchen),
+            self.catalog_group,
+            to_buy=True,
+        )
+        response = self.client.get(reverse("catalog:index"))
+        groups = response.context["groups"]
+        self.assertEqual([(g.title, g.entry_count) for g in groups], [("Kitchen", 4)])
+
+        response = self.client.get(reverse("catalog:index"), {"only_to_by": "1"})
+        groups = response.context["groups"]
+        self.assertEqual([(g.title, g.entry_count) for g in groups], [("Kitchen", 1)])
+
+    def test_other_catalogs_not_counted(self):
+        """Test that groups only count and list entries of the user's catalog"""
+        other = create_catalog_group(name="Other")
+        bathroom = ItemGroup.objects.create(title="Bathroom")
+        create_catalog_entry(create_item_definition("Soap", bathroom), other)
+        create_catalog_entry(create_item_definition("Pot", self.kitchen), other)
+        response = self.client.get(reverse("catalog:index"))
+        groups = response.context["groups"]
+        self.assertEqual([(g.title, g.entry_count) for g in groups], [("Kitchen", 4)])
+        # The catalog narrows the joined entries instead of the count
+        self.assertNotIn("LEFT OUTER JOIN", str(groups.query))
+
+    def test_drill_down(self):
+        """Test that a group lists its own entries and its subgroups"""
+        response = self.client.get(reverse("catalog:index"), {"group": self.spices.pk})
+        self.assertEqual(
+            [str(e) for e in response.context["latest_catalog_list"]], ["Salt"]
+        )
+        self.assertEqual(
+            [(g.title, g.entry_count) for g in response.context["groups"]],
+            [("Pepper", 2)],
+        )
+        self.assertEqual(response.context["breadcrumbs"], [self.kitchen])
+        self.assertContains(response, f"group={self.kitchen.pk}")
+
+    def test_flat_subtree(self):
+        """Test that the flat view of a group lists its whole subtree"""
+        response = self.client.get(
+            reverse("catalog:index"), {"group": self.kitchen.pk, "flat_view": "1"}
+        )
+        self.assertEqual(
+            [str(e) for e in response.context["latest_catalog_list"]],
+            ["Black pepper", "Pan", "Salt", "White pepper"],
+        )
@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.urls import reverse
+
+from ..views import CatalogListView
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+NAMES = ["Apples", "Bread", "Cheese", "Dates", "Eggs"]
+
+
+@mock.patch.object(CatalogListView, "page_size", 2)
+@mock.patch.object(CatalogListView, "stream_chunk_size", 2)
+class LargeListTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        catalog_group = create_catalog_group(owner=self.user)
+        for name in NAMES:
+            create_catalog_entry(create_item_definition(name=name), catalog_group)
+        self.client.force_login(self.user)
+
+    def get_names(self, response):
+        return [str(entry) for entry in response.context["latest_catalog_list"]]
+
+    def test_keyset_pages(self):
+        """Test that the pages follow each other by item name"""
+        url = reverse("catalog:index")
+        response = self.client.get(url, {"flat_view": "1"})
+        self.assertEqual(self.get_names(response), ["Apples", "Bread"])
+        self.assertEqual(response.context["next_after"], "Bread")
+
+        response = self.client.get(url, {"flat_view": "1", "after": "Bread"})
+        self.assertEqual(self.get_names(response), ["Cheese", "Dates"])
+        self.assertContains(response, "after=Dates")
+        # Links that change the list start from the first page again
+        self.assertEqual(response.context["query"], "flat_view=1")
+        self.assertEqual(response.context["page_query"], "flat_view=1&after=Bread")
+
+        response = self.client.get(url, {"flat_view": "1", "after": "Dates"})
+        self.assertEqual(self.get_names(response), ["Eggs"])
+        self.assertIsNone(response.context["next_after"])
+        self.assertNotContains(response, "Next page")
+
+    def test_stream(self):
+        """Test that the flat view streams every entry in name order"""
+        response = self.client.get(
+            reverse("catalog:index"), {"flat_view": "1", "stream": "1"}
+        )
+        self.assertIsInstance(response, StreamingHttpResponse)
+        content = b"".join(response.streaming_content).decode()
+        positions = [content.index(name) for name in NAMES]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(content.count('name="csrfmiddlewaretoken"'), 6)
+        self.assertIn("</html>", content)
+        self.assertNotIn("Next page", content)
+
+    async def test_stream_asgi(self):
+        """Test that ASGI responses stream from an async iterator"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse("catalog:index"), {"flat_view": "1", "stream": "1"}
+        )
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        for name in NAMES:
+            self.assertIn(name.encode(), content)
@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ..management.commands.loadtest import parse_mix, percentile, summarize
+from ..models import ItemDefinition
+
+
+class LoadtestHelpersTests(SimpleTestCase):
+    def test_parse_mix(self):
+        """Test that the workload mix is parsed into weights"""
+        self.assertEqual(
+            parse_mix("index=3, search=1,toggle=0"),
+            {"index": 3, "search": 1, "toggle": 0},
+        )
+        with self.assertRaises(CommandError):
+            parse_mix("index=1,delete=2")
+        with self.assertRaises(CommandError):
+            parse_mix("index=0")
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_summarize(self):
+        """Test that errors, throttling and lock errors are counted apart"""
+        results = [
+            ("index", 200, 0.01, False),
+            ("index", 500, 0.02, True),
+            ("search", 429, 0.001, False),
+            ("toggle", 0, 0.5, False),
+        ]
+        rows = summarize(results, elapsed=2)
+        self.assertEqual(rows["all"]["requests"], 4)
+        self.assertEqual(rows["all"]["throughput"], 2)
+        self.assertEqual(rows["all"]["errors"], 2)
+        self.assertEqual(rows["all"]["throttled"], 1)
+        self.assertEqual(rows["all"]["locked"], 1)
+        self.assertEqual(rows["index"]["p99"], 20)
+
+
+class LoadtestCommandTests(TransactionTestCase):
+    def test_in_process_run(self):
+        """Test a short run against the in-process ASGI application"""
+        out = StringIO()
+        # A single user: concurrent writes to the shared in-memory test
+        # database fail with "database table is locked" right away.
+        call_command(
+            "loadtest",
+            users=1,
+            duration=0.5,
+            mix="index=1,toggle=1,create=1",
+            stdout=out,
+            stderr=StringIO(),
+        )
+        report = out.getvalue()
+        self.assertIn("Error rate 0.00%", report)
+        self.assertRegex(report, r"200: \d+, 302: \d+")
+        self.assertEqual(
+            User.objects.filter(username__startswith="loadtest").count(), 1
+        )
+        self.assertTrue(
+            ItemDefinition.objects.filter(name__startswith="loadtest ").exists()
+        )
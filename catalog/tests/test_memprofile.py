@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ..management.commands.memprofile import collect_url_names, linear_fit
+
+
+class MemprofileHelpersTests(SimpleTestCase):
+    def test_linear_fit(self):
+        """Test the slope and fit of steadily and irregularly growing points"""
+        slope, r_squared = linear_fit([(1, 100), (2, 200), (3, 300), (4, 400)])
+        self.assertAlmostEqual(slope, 100)
+        self.assertAlmostEqual(r_squared, 1)
+
+        slope, r_squared = linear_fit([(1, 100), (2, 0), (3, 100), (4, 0)])
+        self.assertLess(r_squared, 0.8)
+        self.assertEqual(linear_fit([(1, 5)]), (0.0, 0.0))
+
+    def test_collect_url_names(self):
+        """Test that catalog URLs are collected once, without social auth"""
+        names = collect_url_names()
+        self.assertIn("index", names)
+        self.assertIn("catalog-resource-detail", names)
+        self.assertEqual(names.count("catalog-resource-list"), 1)
+        self.assertNotIn("begin", names)
+        self.assertNotIn("logout", names)
+
+
+class MemprofileCommandTests(TransactionTestCase):
+    def test_profile_endpoints(self):
+        """Test that the selected endpoints are replayed and reported"""
+        out = StringIO()
+        call_command(
+            "memprofile",
+            requests=10,
+            warmup=1,
+            pattern=["index", "catalog-resource-detail"],
+            stdout=out,
+            stderr=StringIO(),
+        )
+        report = out.getvalue()
+        self.assertRegex(report, r"index /catalog/ \[200\]: peak [\d.]+ KiB")
+        self.assertRegex(report, r"catalog-resource-detail /catalog/api/\S+ \[200\]")
@@ -0,0 +1,100 @@
+import logging
+
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..models import CatalogEntry
+from ..nplusone import LOG, RAISE, NPlusOneDetector, NPlusOneError, query_shape
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_item_group,
+    create_user,
+)
+
+
+class QueryShapeTests(SimpleTestCase):
+    def test_in_lists_have_one_shape(self):
+        """Test that IN lists of different lengths have the same shape"""
+        self.assertEqual(
+            query_shape('SELECT 1 WHERE "id" IN (%s, %s, %s)'),
+            query_shape('SELECT 1 WHERE "id" IN (%s,%s)'),
+        )
+
+
+class NPlusOneDetectorTests(TestCase):
+    def setUp(self):
+        catalog_group = create_catalog_group()
+        for number in range(3):
+            create_catalog_entry(
+                create_item_definition(name=f"Item {number}"), catalog_group
+            )
+        self.request = RequestFactory().get("/catalog/")
+
+    def load_item_names(self):
+        return [entry.item_definition.name for entry in CatalogEntry.objects.all()]
+
+    def test_raises_on_lazy_relation_in_loop(self):
+        """Test that a lazy foreign key accessed in a loop is detected"""
+        detector = NPlusOneDetector(self.request, 3, RAISE)
+        with connection.execute_wrapper(detector):
+            with self.assertRaisesMessage(NPlusOneError, "load_item_names"):
+                self.load_item_names()
+
+    def test_logs_call_site(self):
+        """Test that the log mode warns once with the call site"""
+        detector = NPlusOneDetector(self.request, 3, LOG)
+        with connection.execute_wrapper(detector):
+            with self.assertLogs("catalog.nplusone", logging.WARNING) as logs:
+                self.load_item_names()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("NPlusOneDetectorTests.load_item_names", logs.output[0])
+
+    def test_select_related_is_not_reported(self):
+        """Test that joined relations don't count as N+1"""
+        detector = NPlusOneDetector(self.request, 3, RAISE)
+        with connection.execute_wrapper(detector):
+            entries = CatalogEntry.objects.select_related("item_definition")
+            self.assertEqual(len([e.item_definition.name for e in entries]), 3)
+
+
+class CatalogViewsQueryTests(APITestCase):
+    """The suite raises on N+1 queries, these pages list several items"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.catalog_group = create_catalog_group(owner=self.user)
+        group = create_item_group()
+        for number in range(4):
+            item_definition = create_item_definition(name=f"Item {number}")
+            item_definition.group.add(group)
+            create_catalog_entry(
+                item_definition, self.catalog_group, to_buy=number % 2 == 0
+            )
+        self.client.force_login(self.user)
+
+    def test_index(self):
+        """Test that the entry list is loaded with its item definitions"""
+        response = self.client.get(reverse("catalog:index"), {"flat_view": "1"})
+        self.assertEqual(len(response.context["latest_catalog_list"]), 2)
+
+    def test_catalog_resource_list(self):
+        """Test that groups and to_buy statuses are loaded with the page"""
+        response = self.client.get(reverse("catalog:catalog-resource-list"))
+        results = response.json()["results"]
+        self.assertEqual(
+            [item["to_buy"] for item in results], [True, False, True, False]
+        )
+        self.assertEqual(results[0]["group"], [{"title": "Test Group"}])
+
+    def test_partial_update_returns_new_status(self):
+        """Test that the response isn't built from the annotated status"""
+        entry = CatalogEntry.objects.filter(to_buy=True).first()
+        url = reverse(
+            "catalog:catalog-resource-detail", args=[entry.item_definition_id]
+        )
+        response = self.client.patch(url, {"to_buy": False}, format="json")
+        self.assertFalse(response.json()["to_buy"])
@@ -0,0 +1,121 @@
+import re
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..page_cache import CSRF_PLACEHOLDER
+from .test_auth_cache import CACHED_AUTH_MIDDLEWARE
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+
+@override_settings(PAGE_CACHE=True)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.catalog_group = create_catalog_group(owner=self.user)
+        self.entry = create_catalog_entry(
+            create_item_definition(name="Milk"), self.catalog_group
+        )
+        self.client.login(username="testuser", password="12345")
+
+    def get_index(self, params=None):
+        return self.client.get(reverse("catalog:index"), params)
+
+    def test_warm_hit_skips_view(self):
+        """Test that a warm hit is served without rendering the templates"""
+        response = self.get_index()
+        self.assertEqual(response.wsgi_request.cache_status, "miss")
+        self.assertTemplateUsed(response, "catalog/index.html")
+
+        response = self.get_index()
+        self.assertEqual(response.wsgi_request.cache_status, "hit")
+        self.assertTemplateNotUsed(response, "catalog/index.html")
+        self.assertContains(response, "Milk")
+
+    @override_settings(
+        CACHED_AUTH=True,
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+        MIDDLEWARE=CACHED_AUTH_MIDDLEWARE,
+    )
+    def test_warm_hit_makes_no_queries(self):
+        """Test that with cached auth a warm hit doesn't touch the database"""
+        self.client.login(username="testuser", password="12345")
+        self.get_index()
+        self.get_index()
+        with self.assertNumQueries(0):
+            self.get_index()
+
+    def test_normalized_query_state(self):
+        """Test that ignored and empty parameters share the cached page"""
+        self.get_index({"flat_view": "1"})
+        response = self.get_index({"flat_view": "1", "only_to_by": "", "x": "1"})
+        self.assertEqual(response.wsgi_request.cache_status, "hit")
+        response = self.get_index({"only_to_by": "1"})
+        self.assertEqual(response.wsgi_request.cache_status, "miss")
+
+    def test_csrf_token_filled_in(self):
+        """Test that every response gets a working CSRF token"""
+        self.client.handler.enforce_csrf_checks = True
+        self.get_index()
+        response = self.get_index()
+        self.assertEqual(response.wsgi_request.cache_status, "hit")
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+        token = re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()
+        ).group(1)
+        response = self.client.post(
+            reverse("catalog:update", args=[self.entry.pk]),
+            {"csrfmiddlewaretoken": token},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_replica_pages_not_stored(self):
+        """Test that pages read from the lagging replica aren't cached"""
+        with mock.patch("catalog.views.reads_from_replica", return_value=True):
+            response = self.get_index()
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+        response = self.get_index()
+        self.assertEqual(response.wsgi_request.cache_status, "miss")
+        response = self.get_index()
+        self.assertEqual(response.wsgi_request.cache_status, "hit")
+
+    def test_toggle_invalidates(self):
+        """Test that a toggle drops the cached pages of the catalog"""
+        self.assertContains(self.get_index(), "Milk")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("catalog:update", args=[self.entry.pk]))
+        response = self.get_index()
+        self.assertEqual(response.wsgi_request.cache_status, "miss")
+        self.assertNotContains(response, "Milk")
+
+    def test_item_rename_invalidates(self):
+        """Test that changes of shared item definitions drop cached pages"""
+        self.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.item_definition.name = "Oat milk"
+            self.entry.item_definition.save()
+        self.assertContains(self.get_index(), "Oat milk")
+
+    def test_other_catalog_keeps_cache(self):
+        """Test that writes to another catalog keep the cached page"""
+        self.get_index()
+        other_catalog = create_catalog_group(name="Other")
+        with self.captureOnCommitCallbacks(execute=True):
+            create_catalog_entry(self.entry.item_definition, other_catalog)
+        self.assertEqual(self.get_index().wsgi_request.cache_status, "hit")
+
+    def test_pages_are_per_user(self):
+        """Test that owners of the same catalog don't share pages"""
+        self.get_index()
+        other_user = create_user(username="other")
+        self.catalog_group.owners.add(other_user)
+        self.client.force_login(other_user)
+        self.assertEqual(self.get_index().wsgi_request.cache_status, "miss")
@@ -0,0 +1,61 @@
+import pstats
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase
+from django.urls import reverse
+
+from .test_factories import create_catalog_group, create_user
+
+
+class ProfilerMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        create_catalog_group(owner=self.user)
+        self.client.force_login(self.user)
+        self.url = reverse("catalog:index")
+
+    def make_superuser(self):
+        self.user.is_superuser = True
+        self.user.save()
+
+    def test_ignored_for_regular_users(self):
+        """Test that regular users get the normal response"""
+        response = self.client.get(self.url, {"_profile": "cprofile"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "catalog/index.html")
+
+    def test_cprofile_report(self):
+        """Test that superusers get a sorted cProfile report"""
+        self.make_superuser()
+        response = self.client.get(self.url, {"_profile": "cprofile", "_limit": 5})
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        content = response.content.decode()
+        self.assertTrue(content.startswith("GET /catalog/?_profile=cprofile"))
+        self.assertIn("Ordered by: cumulative time", content)
+
+    def test_cprofile_download(self):
+        """Test that the .prof download can be loaded by pstats"""
+        self.make_superuser()
+        response = self.client.get(self.url, {"_profile": "cprofile", "_download": "1"})
+        self.assertIn("request.prof", response["Content-Disposition"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "request.prof"
+            path.write_bytes(response.content)
+            self.assertTrue(pstats.Stats(str(path)).total_calls)
+
+    def test_alloc_report(self):
+        """Test that superusers get an allocation report for API views"""
+        self.make_superuser()
+        response = self.client.get(
+            reverse("catalog:catalog-resource-list"), {"_profile": "alloc"}
+        )
+        content = response.content.decode()
+        self.assertIn("-> 200", content)
+        self.assertIn("Peak traced memory", content)
+
+    def test_unknown_sort(self):
+        """Test that an unknown sort key is rejected"""
+        self.make_superuser()
+        response = self.client.get(self.url, {"_profile": "alloc", "_sort": "time"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,180 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import CatalogEntry
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+
+class AdjustCountTests(TestCase):
+    def setUp(self):
+        catalog_group = create_catalog_group()
+        self.first = create_catalog_entry(
+            create_item_definition(name="Milk"), catalog_group, count=2
+        )
+        self.second = create_catalog_entry(
+            create_item_definition(name="Bread"), catalog_group, count=5
+        )
+
+    def test_increment_returns_new_counts(self):
+        """Test that all entries are updated and their new counts returned"""
+        counts = CatalogEntry.objects.all().adjust_count("increment", Decimal("1.5"))
+        self.assertEqual(
+            counts, {self.first.pk: Decimal("3.5"), self.second.pk: Decimal("6.5")}
+        )
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.count, Decimal("3.5"))
+
+    def test_decrement_with_clamp(self):
+        """Test that clamped counts stop at zero"""
+        counts = CatalogEntry.objects.all().adjust_count(
+            "decrement", Decimal(3), clamp=True
+        )
+        self.assertEqual(counts, {self.first.pk: 0, self.second.pk: 2})
+
+    def test_decrement_without_clamp(self):
+        """Test that counts can go negative when not clamped"""
+        counts = CatalogEntry.objects.filter(pk=self.first.pk).adjust_count(
+            "decrement", Decimal(3)
+        )
+        self.assertEqual(counts, {self.first.pk: -1})
+
+    def test_set_keyed_by_item_definition(self):
+        """Test setting counts, keyed by another field"""
+        counts = CatalogEntry.objects.filter(pk=self.second.pk).adjust_count(
+            "set", Decimal(7), key="item_definition_id"
+        )
+        self.assertEqual(counts, {self.second.item_definition_id: 7})
+
+    def test_single_query(self):
+        """Test that the update and the new values take one query"""
+        with self.assertNumQueries(1):
+            CatalogEntry.objects.all().adjust_count("increment", Decimal(1))
+
+    @mock.patch("sqlite3.dbapi2.sqlite_version_info", (3, 34, 1))
+    def test_without_returning(self):
+        """Test the fallback for SQLite versions without UPDATE ... RETURNING"""
+        with CaptureQueriesContext(connection) as queries:
+            counts = CatalogEntry.objects.all().adjust_count("increment", Decimal(1))
+        self.assertFalse(any("RETURNING" in query["sql"] for query in queries))
+        self.assertEqual(counts, {self.first.pk: 3, self.second.pk: 6})
+
+    def test_unknown_operation(self):
+        """Test that unknown operations are rejected"""
+        with self.assertRaises(ValueError):
+            CatalogEntry.objects.all().adjust_count("multiply", Decimal(2))
+
+
+class QuantityAPITests(APITestCase):
+    def setUp(self):
+        self.user = create_user()
+        catalog_group = create_catalog_group(owner=self.user)
+        self.milk = create_item_definition(name="Milk")
+        self.bread = create_item_definition(name="Bread")
+        self.entry = create_catalog_entry(self.milk, catalog_group, count=1)
+        create_catalog_entry(self.bread, catalog_group, count=4)
+        self.other_entry = create_catalog_entry(
+            self.milk, create_catalog_group(name="Other"), count=1
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_adjust_one_item(self):
+        """Test incrementing the quantity of one item"""
+        url = reverse("catalog:catalog-resource-quantity", args=[self.milk.pk])
+        response = self.client.post(url, {"op": "increment", "amount": "2"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"pk": self.milk.pk, "count": "3.00000"})
+        self.other_entry.refresh_from_db()
+        self.assertEqual(self.other_entry.count, 1)
+
+    def test_adjust_many_items(self):
+        """Test decrementing several items, clamped at zero by default"""
+        url = reverse("catalog:catalog-resource-quantities")
+        response = self.client.post(
+            url,
+            {"op": "decrement", "amount": "2", "items": [self.milk.pk, self.bread.pk]},
+            format="json",
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"pk": self.milk.pk, "count": "0.00000"},
+                {"pk": self.bread.pk, "count": "2.00000"},
+            ],
+        )
+
+    def test_item_not_in_catalog(self):
+        """Test that items outside the user's catalog are not found"""
+        url = reverse(
+            "catalog:catalog-resource-quantity",
+            args=[create_item_definition(name="Eggs").pk],
+        )
+        response = self.client.post(url, {"op": "set", "amount": "1"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_item_pk(self):
+        """Test that a pk that isn't a number is not found instead of an error"""
+        url = reverse("catalog:catalog-resource-quantity", args=["milk"])
+        response = self.client.post(url, {"op": "set", "amount": "1"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_input(self):
+        """Test that unknown operations and missing items are rejected"""
+        url = reverse("catalog:catalog-resource-quantities")
+        response = self.client.post(url, {"op": "double", "amount": "1"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {"op": "set", "amount": "1"})
+        self.assertIn("items", response.json())
+
+
+class ConcurrentAdjustCountTests(TransactionTestCase):
+    THREADS = 4
+    INCREMENTS = 25
+
+    def test_no_lost_updates(self):
+        """Test that concurrent increments from several threads all count"""
+        entry = create_catalog_entry(create_item_definition(), create_catalog_group())
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def increment():
+            start.wait()
+            try:
+                for _ in range(self.INCREMENTS):
+                    # The in-memory test database refuses concurrent writes
+                    # instead of waiting, a refused UPDATE changed nothing.
+                    while True:
+                        try:
+                            CatalogEntry.objects.filter(pk=entry.pk).adjust_count(
+                                "increment", Decimal(1)
+                            )
+                            break
+                        except OperationalError as error:
+                            if "locked" not in str(error):
+                                raise
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=increment) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        entry.refresh_from_db()
+        self.assertEqual(entry.count, self.THREADS * self.INCREMENTS)
@@ -0,0 +1,96 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+
+from ..middleware import PRIMARY_COOKIE, ReplicaRoutingMiddleware
+from ..models import CatalogEntry, CatalogGroup
+from ..routers import REPLICA_DB, ReplicaRouter, _use_replica, read_from_replica
+from .test_factories import create_catalog_entry, create_item_definition
+
+
+@mock.patch("catalog.routers.replica_configured", return_value=True)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_by_default(self, _):
+        """Test that reads outside of a replica block are not routed"""
+        self.assertIsNone(self.router.db_for_read(CatalogEntry))
+
+    def test_catalog_reads_use_replica_when_allowed(self, _):
+        """Test that catalog models are read from the replica"""
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(CatalogEntry), REPLICA_DB)
+
+    def test_auth_reads_never_use_replica(self, _):
+        """Test that users (and sessions) are always read from the primary"""
+        with read_from_replica():
+            self.assertIsNone(self.router.db_for_read(User))
+
+    def test_writes_use_primary(self, _):
+        """Test that objects read from the replica are saved to the primary"""
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_write(CatalogGroup), "default")
+
+    def test_replica_is_not_migrated(self, _):
+        """Test that migrations never run against the read-only replica"""
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB, "catalog"))
+        self.assertIsNone(self.router.allow_migrate("default", "catalog"))
+
+
+@mock.patch("catalog.middleware.replica_configured", return_value=True)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+    def get_response(self, request):
+        self.seen.append(_use_replica.get())
+        return HttpResponse()
+
+    def test_safe_requests_read_from_replica(self, _):
+        """Test that GET requests are served from the replica"""
+        middleware = ReplicaRoutingMiddleware(self.get_response)
+        response = middleware(self.factory.get("/"))
+        self.assertEqual(self.seen, [True])
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_writes_pin_client_to_primary(self, _):
+        """Test that a write sets the cookie keeping reads on the primary"""
+        middleware = ReplicaRoutingMiddleware(self.get_response)
+        response = middleware(self.factory.post("/"))
+        self.assertEqual(self.seen, [False])
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        request = self.factory.get("/")
+        request.COOKIES[PRIMARY_COOKIE] = "1"
+        middleware(request)
+        self.assertEqual(self.seen, [False, False])
+
+
+class RefreshReplicaCommandTests(TransactionTestCase):
+    def test_snapshot_contains_committed_data(self):
+        """Test that the snapshot is a readable copy of the default database"""
+        catalog_group = CatalogGroup.objects.create(name="Test Catalog")
+        create_catalog_entry(create_item_definition(), catalog_group)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "replica.sqlite3"
+            call_command("refresh_replica", path=str(path), stdout=mock.Mock())
+
+            replica = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                (count,) = replica.execute(
+                    "SELECT COUNT(*) FROM catalog_catalogentry"
+                ).fetchone()
+                self.assertEqual(count, 1)
+                with self.assertRaises(sqlite3.OperationalError):
+                    replica.execute("DELETE FROM catalog_catalogentry")
+            finally:
+                replica.close()
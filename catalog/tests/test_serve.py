@@ -0,0 +1,40 @@
+import socket
+
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from ..management.commands.serve import create_listener, probe, resolve_worker_count
+
+
+class ServeCommandTests(SimpleTestCase):
+    @override_settings(SERVE_WORKERS=3)
+    def test_worker_count_from_settings(self):
+        """Test that SERVE_WORKERS is used when no explicit count is given"""
+        self.assertEqual(resolve_worker_count(), 3)
+        self.assertEqual(resolve_worker_count(5), 5)
+
+    @override_settings(SERVE_WORKERS=0)
+    def test_worker_count_defaults_to_cpu_count(self):
+        """Test that one worker per CPU core is started by default"""
+        self.assertGreaterEqual(resolve_worker_count(), 1)
+
+    def test_negative_worker_count_is_rejected(self):
+        """Test that a negative worker count raises a CommandError"""
+        with self.assertRaises(CommandError):
+            resolve_worker_count(-1)
+
+    def test_listener_is_shared_and_reusable(self):
+        """Test that the listener can be inherited and rebound"""
+        sock = create_listener("127.0.0.1", 0)
+        self.addCleanup(sock.close)
+        self.assertTrue(sock.get_inheritable())
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR))
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT))
+
+    def test_probe_fails_without_http_response(self):
+        """Test that a socket that never answers fails the health check"""
+        sock = create_listener("127.0.0.1", 0)
+        self.addCleanup(sock.close)
+        port = sock.getsockname()[1]
+        self.assertFalse(probe("127.0.0.1", port, "/", timeout=0.2))
@@ -0,0 +1,91 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..middleware import ServerTimingMiddleware
+from ..timing import RequestTimer, format_server_timing
+from .test_factories import (
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+
+class RequestTimerTests(SimpleTestCase):
+    def test_phases_add_up_to_total(self):
+        """Test that middleware time is what the view and render didn't use"""
+        timer = RequestTimer()
+        timer.start_view()
+        timer.start_render()
+        timer.finish_render(None)
+        timings = timer.finish()
+        self.assertAlmostEqual(
+            timings["middleware"]
+            + timings["view"]
+            + timings["serialize"]
+            + timings["render"],
+            timings["total"],
+        )
+
+    def test_format(self):
+        """Test the Server-Timing header value"""
+        header = format_server_timing(
+            {
+                "middleware": 1,
+                "view": 2.5,
+                "serialize": 0.5,
+                "render": 3,
+                "db": 0.25,
+                "queries": 4,
+                "total": 6.5,
+            }
+        )
+        self.assertEqual(
+            header,
+            "middleware;dur=1.00, view;dur=2.50, serialize;dur=0.50, render;dur=3.00, "
+            'db;dur=0.25;desc="4 queries", total;dur=6.50',
+        )
+
+
+class ServerTimingMiddlewareTests(TestCase):
+    def test_disabled_by_default(self):
+        """Test that no header is sent unless SERVER_TIMING is set"""
+        response = self.client.get(reverse("catalog:login"))
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_header_and_request_timings(self):
+        """Test that a rendered page reports all phases"""
+        user = create_user()
+        create_catalog_group(owner=user)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("catalog:index"))
+
+        timings = response.wsgi_request.timings
+        self.assertGreater(timings["render"], 0)
+        self.assertGreater(timings["queries"], 0)
+        for name in ("middleware", "view", "render", "db", "total"):
+            self.assertIn(f"{name};dur=", response["Server-Timing"])
+
+    @override_settings(SERVER_TIMING=True)
+    def test_plain_response(self):
+        """Test that responses without rendering have no render time"""
+        middleware = ServerTimingMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get("/")
+        response = middleware(request)
+        self.assertEqual(request.timings["render"], 0)
+        self.assertIn("render;dur=0.00", response["Server-Timing"])
+
+    @override_settings(SERVER_TIMING=True)
+    def test_api_serialization(self):
+        """Test that building serializer data is reported as its own phase"""
+        user = create_user()
+        create_catalog_group(owner=user)
+        create_item_definition()
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("catalog:catalog-resource-list"))
+
+        self.assertGreater(response.wsgi_request.timings["serialize"], 0)
+        self.assertIn("serialize;dur=", response["Server-Timing"])
@@ -0,0 +1,209 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from .. import tasks
+from ..models import CatalogEntry, CatalogGroup, ItemDefinition, ItemGroup
+from ..routers import ShardRouter, use_shard
+from ..sharding import locked_shard, move_catalog, plan_rebalance
+from .test_factories import create_catalog_group, create_item_definition
+
+SHARD = "shard_test"
+
+
+@override_settings(SHARDS=["shard_a", "shard_b"])
+class ShardRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ShardRouter()
+
+    def test_routes_catalog_reads_to_current_shard(self):
+        """Test that catalog reads follow the current shard, others don't"""
+        self.assertIsNone(self.router.db_for_read(CatalogEntry))
+        with use_shard("shard_a"):
+            self.assertEqual(self.router.db_for_read(CatalogEntry), "shard_a")
+            self.assertEqual(self.router.db_for_read(ItemDefinition), "shard_a")
+            self.assertIsNone(self.router.db_for_read(User))
+
+    def test_only_entries_are_written_to_shards(self):
+        """Test that shared models are always written to the default database"""
+        with use_shard("shard_a"):
+            self.assertEqual(self.router.db_for_write(CatalogEntry), "shard_a")
+            self.assertIsNone(self.router.db_for_write(ItemDefinition))
+        entry = CatalogEntry()
+        entry._state.db = "shard_b"
+        self.assertEqual(
+            self.router.db_for_write(CatalogEntry, instance=entry), "shard_b"
+        )
+
+    def test_shards_only_migrate_entries(self):
+        """Test that shard databases only get the entries table"""
+        self.assertTrue(self.router.allow_migrate("shard_a", "catalog", "catalogentry"))
+        self.assertFalse(self.router.allow_migrate("shard_a", "catalog", "itemgroup"))
+        self.assertFalse(self.router.allow_migrate("shard_a", "catalog"))
+        self.assertFalse(self.router.allow_migrate("shard_a", "auth", "user"))
+        self.assertIsNone(self.router.allow_migrate("default", "catalog", "itemgroup"))
+
+    def test_plan_rebalance(self):
+        """Test that catalogs are spread evenly, moving as few as possible"""
+        groups = [
+            CatalogGroup(pk=1, shard="shard_a"),
+            CatalogGroup(pk=2, shard="shard_a"),
+            CatalogGroup(pk=3, shard="shard_b"),
+        ]
+        counts = {1: 50, 2: 30, 3: 20}
+        moves = plan_rebalance(groups, counts, ["shard_a", "shard_b"])
+        self.assertEqual(
+            [(group.pk, target) for group, target in moves], [(2, "shard_b")]
+        )
+
+
+@override_settings(SHARDS=["shard_a", "shard_b"])
+class ShardAssignmentTests(TestCase):
+    def test_reads_in_transaction_stay_on_default(self):
+        """Test that shared reads see the writes of an open transaction"""
+        router = ShardRouter()
+        with use_shard("shard_a"):
+            self.assertEqual(router.db_for_read(ItemDefinition), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(CatalogEntry), "shard_a")
+
+    def test_new_catalogs_go_to_least_used_shard(self):
+        """Test that new catalogs are spread over the shards"""
+        shards = [create_catalog_group(name=f"Catalog {n}").shard for n in range(3)]
+        self.assertEqual(shards, ["shard_a", "shard_b", "shard_a"])
+
+
+class ShardDatabaseMixin:
+    """Adds a real, migrated shard file next to the test database"""
+
+    def add_shard(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        connections.settings[SHARD] = connections.configure_settings(
+            {
+                DEFAULT_DB_ALIAS: {},
+                SHARD: {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": Path(tmp_dir.name) / "shard.sqlite3",
+                },
+            }
+        )[SHARD]
+        self.addCleanup(self.remove_shard)
+        settings_override = override_settings(SHARDS=[SHARD])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command("migrate", database=SHARD, verbosity=0)
+
+    def remove_shard(self):
+        connections[SHARD].close()
+        del connections[SHARD]
+        del connections.settings[SHARD]
+
+
+class ShardDatabaseTests(ShardDatabaseMixin, TransactionTestCase):
+    def setUp(self):
+        self.add_shard()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.catalog_group = create_catalog_group(owner=self.user)
+        self.client.force_login(self.user)
+
+    def test_entries_live_in_the_catalog_shard(self):
+        """Test that entries are written to the shard and joined with items"""
+        self.assertEqual(self.catalog_group.shard, SHARD)
+        self.client.post(reverse("catalog:create"), {"name": "Milk"})
+
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 1)
+        self.assertEqual(CatalogEntry.objects.using(DEFAULT_DB_ALIAS).count(), 0)
+        response = self.client.get(
+            reverse("catalog:index"), {"flat_view": "1", "only_to_by": "1"}
+        )
+        self.assertContains(response, "Milk")
+
+    def test_only_shards_drop_constraints(self):
+        """Test that the default entries table keeps its foreign keys"""
+
+        def foreign_keys(alias):
+            with connections[alias].cursor() as cursor:
+                constraints = connections[alias].introspection.get_constraints(
+                    cursor, CatalogEntry._meta.db_table
+                )
+            return sorted(
+                constraint["columns"][0]
+                for constraint in constraints.values()
+                if constraint["foreign_key"]
+            )
+
+        self.assertEqual(
+            foreign_keys(DEFAULT_DB_ALIAS), ["catalog_group_id", "item_definition_id"]
+        )
+        self.assertEqual(foreign_keys(SHARD), [])
+
+    def test_create_child_group(self):
+        """Test that groups created while a shard is current keep their links"""
+        with use_shard(SHARD):
+            kitchen = ItemGroup.objects.create(title="Kitchen")
+            spices = ItemGroup.objects.create(title="Spices", parent=kitchen)
+            pepper = ItemGroup.objects.create(title="Pepper", parent=spices)
+        self.assertQuerySetEqual(
+            ItemGroup.objects.path_to(pepper),
+            ["Kitchen", "Spices", "Pepper"],
+            transform=str,
+        )
+
+    def test_rebalance_moves_entries(self):
+        """Test that moving a catalog moves its entries and keeps it working"""
+        with use_shard(SHARD):
+            CatalogEntry.objects.create(
+                item_definition=create_item_definition(name="Milk"),
+                catalog_group=self.catalog_group,
+                to_buy=True,
+            )
+        call_command(
+            "rebalance_shards",
+            catalog=self.catalog_group.pk,
+            to=DEFAULT_DB_ALIAS,
+            stdout=StringIO(),
+        )
+        self.catalog_group.refresh_from_db()
+        self.assertEqual(self.catalog_group.shard, "")
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 0)
+        self.assertEqual(CatalogEntry.objects.using(DEFAULT_DB_ALIAS).count(), 1)
+
+        response = self.client.get(
+            reverse("catalog:index"), {"flat_view": "1", "only_to_by": "1"}
+        )
+        self.assertContains(response, "Milk")
+
+    def test_deleted_catalog_entries_are_purged_later(self):
+        """Test that a task deletes the entries a deleted catalog left behind"""
+        with use_shard(SHARD):
+            CatalogEntry.objects.create(
+                item_definition=create_item_definition(name="Milk"),
+                catalog_group=self.catalog_group,
+            )
+        self.catalog_group.delete()
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 1)
+
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 0)
+
+    def test_writes_follow_a_moved_catalog(self):
+        """Test that a write routed to a stale shard goes where the catalog moved"""
+        stale = CatalogGroup.objects.get(pk=self.catalog_group.pk)
+        move_catalog(self.catalog_group, DEFAULT_DB_ALIAS)
+        self.assertEqual(stale.shard, SHARD)
+
+        with use_shard(SHARD), locked_shard(stale):
+            CatalogEntry.objects.create(
+                item_definition=create_item_definition(name="Milk"),
+                catalog_group=stale,
+            )
+        self.assertEqual(stale.shard, "")
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 0)
+        self.assertEqual(CatalogEntry.objects.using(DEFAULT_DB_ALIAS).count(), 1)
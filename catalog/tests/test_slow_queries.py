@@ -0,0 +1,92 @@
+import logging
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..slow_queries import SlowQueryLog, frame_qualname, slow_query_log
+from ..views import QueryParamsMixin
+from .test_factories import create_catalog_group, create_item_group, create_user
+
+
+class SlowQueryLogTests(TestCase):
+    def test_keeps_slowest_records(self):
+        """Test that only the N slowest records are kept, slowest first"""
+        log = SlowQueryLog(2)
+        for duration in (5, 1, 9, 3):
+            log.add({"duration_ms": duration})
+        self.assertEqual([r["duration_ms"] for r in log.top()], [9, 5])
+
+    def test_qualname_of_inherited_method(self):
+        """Test that methods are attributed to the class defining them"""
+
+        class View(QueryParamsMixin):
+            def frame(self):
+                return self.get_frame()
+
+            def get_frame(self):
+                import sys
+
+                return sys._getframe()
+
+        self.assertEqual(frame_qualname(View().frame()), "View.get_frame")
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=1)
+class SlowQueryMiddlewareTests(TestCase):
+    def setUp(self):
+        slow_query_log.clear()
+        self.user = create_user()
+        create_catalog_group(owner=self.user)
+        self.client.force_login(self.user)
+
+    def test_records_view_and_call_site(self):
+        """Test that records carry the view name and the project call site"""
+        group = create_item_group()
+        with self.assertLogs("catalog.slow_queries", logging.WARNING):
+            self.client.get(reverse("catalog:index"), {"group": group.pk})
+
+        records = slow_query_log.top()
+        self.assertTrue(records)
+        self.assertEqual({r["view"] for r in records}, {"catalog:index"})
+        call_sites = {r["call_site"] for r in records}
+        self.assertIn("views.py:CatalogListView.get_breadcrumbs", call_sites)
+        self.assertIn("auth_cache.py:get_user_catalog_group", call_sites)
+        self.assertIn("views.py:CatalogListView.paginate_entries", call_sites)
+
+        slow_query_log.clear()
+        with self.assertLogs("catalog.slow_queries", logging.WARNING):
+            self.client.get(reverse("catalog:index"))
+        # The groups are only fetched while the template renders
+        call_sites = {r["call_site"] for r in slow_query_log.top()}
+        self.assertIn("catalog/_catalog_section.html", call_sites)
+
+    def test_queries_below_threshold_are_ignored(self):
+        """Test that fast queries are not recorded"""
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=10_000):
+            self.client.get(reverse("catalog:index"))
+        self.assertEqual(slow_query_log.top(), [])
+
+    def test_sampling(self):
+        """Test that slow queries are skipped when they aren't sampled"""
+        with mock.patch("catalog.slow_queries.random.random", return_value=0.5):
+            with override_settings(SLOW_QUERY_SAMPLE_RATE=0.1):
+                self.client.get(reverse("catalog:index"))
+        self.assertEqual(slow_query_log.top(), [])
+
+
+class SlowQueriesViewTests(TestCase):
+    def test_superuser_only(self):
+        """Test that only superusers can see the recorded queries"""
+        url = reverse("catalog:slow-queries")
+        user = create_user()
+        create_catalog_group(owner=user)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        user.is_superuser = True
+        user.save()
+        slow_query_log.clear()
+        slow_query_log.add({"duration_ms": 120, "sql": "SELECT 1"})
+        response = self.client.get(url)
+        self.assertEqual(response.json()["queries"][0]["sql"], "SELECT 1")
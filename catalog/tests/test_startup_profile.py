@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase
+
+from ..management.commands.startup_profile import aggregate_imports, parse_importtime
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |       django.utils.version
+import time:       300 |        420 |     django.utils
+import time:       500 |        920 |   django
+import time:        80 |         80 |   rest_framework.settings
+import time:        20 |        100 | rest_framework
+some unrelated warning
+"""
+
+
+class StartupProfileTests(SimpleTestCase):
+    def test_parse_importtime_skips_header_and_noise(self):
+        """Test that only timing lines are parsed, keeping module names"""
+        records = parse_importtime(IMPORTTIME_OUTPUT.splitlines())
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0], ("django.utils.version", 120, 120))
+        self.assertEqual(records[-1], ("rest_framework", 20, 100))
+
+    def test_aggregate_by_package(self):
+        """Test that self times are summed per top-level package"""
+        records = parse_importtime(IMPORTTIME_OUTPUT.splitlines())
+        rows = aggregate_imports(records)
+        self.assertEqual(rows, [("django", 920, 3), ("rest_framework", 100, 2)])
+
+    def test_aggregate_by_module(self):
+        """Test that module grouping keeps every module separate"""
+        records = parse_importtime(IMPORTTIME_OUTPUT.splitlines())
+        rows = aggregate_imports(records, group_by="module")
+        self.assertEqual(rows[0], ("django", 500, 1))
+        self.assertEqual(len(rows), 5)
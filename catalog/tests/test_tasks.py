@@ -0,0 +1,184 @@
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .. import tasks
+from ..models import Task
+
+calls = []
+
+
+@tasks.task(name="tests.record")
+def record(value):
+    calls.append(value)
+
+
+@tasks.task(name="tests.flaky", max_attempts=3, retry_delay=10)
+def flaky(failures):
+    calls.append("attempt")
+    if len(calls) <= failures:
+        raise RuntimeError("flaky")
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        """Test that enqueued tasks run once with their arguments"""
+        queued = tasks.enqueue(record, {"value": 1})
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(calls, [1])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.DONE)
+        self.assertIsNotNone(queued.finished_at)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_unknown_task(self):
+        """Test that only registered tasks can be enqueued"""
+        with self.assertRaises(ValueError):
+            tasks.enqueue("tests.missing")
+
+    def test_unregistered_task_fails(self):
+        """Test that a stored task nobody registered fails without a retry"""
+        missing = Task.objects.create(
+            name="tests.missing", kwargs={}, run_at=timezone.now(), max_attempts=3
+        )
+        tasks.enqueue(record, {"value": 1})
+        with self.assertLogs("catalog.tasks", "ERROR"):
+            self.assertEqual(tasks.run_pending(), 2)
+        missing.refresh_from_db()
+        self.assertEqual(missing.status, Task.FAILED)
+        self.assertIn("Unknown task tests.missing", missing.last_error)
+        self.assertEqual(calls, [1])
+
+    def test_scheduled_task_waits(self):
+        """Test that tasks don't run before run_at"""
+        tasks.enqueue(record, {"value": 1}, delay=60)
+        self.assertEqual(tasks.run_pending(), 0)
+        self.assertIsNotNone(tasks.claim(now=timezone.now() + timedelta(minutes=2)))
+
+    def test_retry_with_backoff(self):
+        """Test that failed tasks are retried later, twice as late each time"""
+        queued = tasks.enqueue(flaky, {"failures": 2})
+        with self.assertLogs("catalog.tasks", "WARNING"):
+            tasks.run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn("RuntimeError: flaky", queued.last_error)
+        first_delay = queued.run_at - timezone.now()
+        self.assertGreater(first_delay, timedelta(seconds=5))
+
+        with self.assertLogs("catalog.tasks", "WARNING"):
+            tasks.execute(tasks.claim(now=queued.run_at))
+        queued.refresh_from_db()
+        self.assertGreater(queued.run_at - timezone.now(), first_delay)
+
+        tasks.execute(tasks.claim(now=queued.run_at))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.DONE)
+        self.assertEqual(queued.attempts, 3)
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that a task fails for good once its attempts are used up"""
+        queued = tasks.enqueue(flaky, {"failures": 10}, max_attempts=2)
+        with self.assertLogs("catalog.tasks", "WARNING"):
+            tasks.execute(tasks.claim())
+        queued.refresh_from_db()
+        with self.assertLogs("catalog.tasks", "ERROR"):
+            tasks.execute(tasks.claim(now=queued.run_at))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertIsNone(tasks.claim(now=queued.run_at + timedelta(days=1)))
+
+    def test_idempotency_key(self):
+        """Test that a key only ever creates one task"""
+        first = tasks.enqueue(record, {"value": 1}, idempotency_key="once")
+        second = tasks.enqueue(record, {"value": 2}, idempotency_key="once")
+        self.assertEqual(first.pk, second.pk)
+        tasks.run_pending()
+        tasks.enqueue(record, {"value": 3}, idempotency_key="once")
+        tasks.run_pending()
+        self.assertEqual(calls, [1])
+
+    def test_claim_is_exclusive(self):
+        """Test that a claimed task can't be claimed again while leased"""
+        tasks.enqueue(record, {"value": 1})
+        claimed = tasks.claim()
+        self.assertEqual(claimed.status, Task.RUNNING)
+        self.assertIsNone(tasks.claim())
+
+    @override_settings(TASK_LEASE_SECONDS=60)
+    def test_expired_lease_is_claimed_again(self):
+        """Test that a task of a dead worker runs again after the lease"""
+        tasks.enqueue(record, {"value": 1})
+        tasks.claim()
+        reclaimed = tasks.claim(now=timezone.now() + timedelta(minutes=2))
+        self.assertEqual(reclaimed.attempts, 2)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode(self):
+        """Test that eager tasks run inside enqueue, retries included"""
+        queued = tasks.enqueue(flaky, {"failures": 1})
+        self.assertEqual(queued.status, Task.DONE)
+        self.assertEqual(calls, ["attempt", "attempt"])
+
+    def test_purge_tasks(self):
+        """Test that only old finished tasks are purged"""
+        old = timezone.now() - timedelta(days=30)
+        Task.objects.create(name="tests.record", status=Task.DONE, finished_at=old)
+        Task.objects.create(name="tests.record", status=Task.FAILED, finished_at=old)
+        recent = Task.objects.create(
+            name="tests.record", status=Task.DONE, finished_at=timezone.now()
+        )
+        pending = Task.objects.create(name="tests.record")
+        tasks.purge_tasks()
+        self.assertCountEqual(
+            Task.objects.values_list("pk", flat=True), [recent.pk, pending.pk]
+        )
+
+    def test_schedule_purge_once_a_day(self):
+        """Test that workers schedule a single purge per day"""
+        tasks.schedule_purge()
+        tasks.schedule_purge()
+        self.assertEqual(Task.objects.filter(name="catalog.purge_tasks").count(), 1)
+
+    def test_worker_command_once(self):
+        """Test that the worker command runs the due tasks"""
+        tasks.enqueue(record, {"value": 1})
+        out = StringIO()
+        call_command("worker", "--once", stdout=out)
+        self.assertIn("Ran 1 tasks", out.getvalue())
+        self.assertEqual(calls, [1])
+
+
+class WorkerThreadTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_tasks(self):
+        """Test that the worker thread runs tasks enqueued after it started"""
+        worker = tasks.Worker(poll_interval=0.01)
+        worker.start()
+        try:
+            queued = tasks.enqueue(record, {"value": 1})
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                queued.refresh_from_db()
+                if queued.status == Task.DONE:
+                    break
+                time.sleep(0.01)
+        finally:
+            worker.stop()
+            worker.join(5)
+        self.assertEqual(queued.status, Task.DONE)
+        self.assertEqual(calls, [1])
+        self.assertFalse(worker.is_alive())
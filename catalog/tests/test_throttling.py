@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .test_factories import create_catalog_group, create_user
+
+THROTTLE_RATES = {
+    "search": {"burst": 2, "rate": 0.5},
+    "write": {"burst": 2, "rate": 0.5},
+    "invitation": {"burst": 1, "rate": 0.5},
+}
+
+
+@override_settings(CATALOG_THROTTLE_RATES=THROTTLE_RATES)
+class TokenBucketThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.catalog_group = create_catalog_group(owner=self.user)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("catalog:catalog-resource-list")
+
+    def test_burst_is_allowed_then_throttled(self):
+        """Test that requests over the burst get 429 with Retry-After"""
+        for _ in range(2):
+            response = self.client.get(self.url, {"search": "milk"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.url, {"search": "milk"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "2")
+
+    def test_tokens_refill_over_time(self):
+        """Test that the bucket refills at the configured rate"""
+        with mock.patch("catalog.throttling.time.time", return_value=1000.0):
+            for _ in range(2):
+                self.client.get(self.url)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 429)
+
+        with mock.patch("catalog.throttling.time.time", return_value=1002.0):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_buckets_are_per_user(self):
+        """Test that one user exhausting the bucket doesn't throttle others"""
+        for _ in range(3):
+            self.client.get(self.url)
+
+        self.client.force_authenticate(create_user(username="other"))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invitations_are_throttled(self):
+        """Test that creating invitations has its own bucket"""
+        url = reverse(
+            "catalog:cataloggroup-create-invitation",
+            kwargs={"pk": self.catalog_group.pk},
+        )
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(url).status_code, 429)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
@@ -82,6 +82,36 @@ class CatalogListViewTests(TestCase):
         self.assertEqual(list(response.context["groups"]), [])
 
 
+class CatalogListFragmentViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        catalog_group = CatalogGroup.objects.create(name="Test Catalog")
+        catalog_group.owners.add(self.user)
+        self.group = ItemGroup.objects.create(title="Test Group")
+        item_definition = ItemDefinition.objects.create(name="Grouped Item")
+        item_definition.group.add(self.group)
+        CatalogEntry.objects.create(
+            item_definition=item_definition, catalog_group=catalog_group
+        )
+        self.client.login(username="testuser", password="12345")
+
+    def test_renders_only_the_list_section(self):
+        """Test that the fragment has the list without the page around it"""
+        response = self.client.get(reverse("catalog:list-fragment"))
+        self.assertTemplateUsed(response, "catalog/_catalog_section.html")
+        self.assertTemplateNotUsed(response, "catalog/base.html")
+        self.assertContains(response, "[Test Group]")
+        self.assertNotContains(response, "<html")
+
+    def test_drill_down(self):
+        """Test that the fragment follows the query parameters of the page"""
+        response = self.client.get(
+            reverse("catalog:list-fragment"), {"group": self.group.id}
+        )
+        self.assertContains(response, "Grouped Item")
+        self.assertContains(response, "Exit from group")
+
+
 class UpdateEntryStatusViewTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="12345")
@@ -135,6 +165,30 @@ class UpdateEntryStatusViewTests(TestCase):
         response = self.client.post(reverse("catalog:update", args=[other_entry.id]))
         self.assertEqual(response.status_code, 404)
 
+    def test_post_json(self):
+        """Test that JSON clients get the new status instead of a redirect"""
+        url = reverse("catalog:update", args=[self.entry.id])
+        response = self.client.post(url, headers={"Accept": "application/json"})
+        self.assertEqual(response.json(), {"id": self.entry.id, "to_buy": True})
+        response = self.client.post(url, headers={"Accept": "application/json"})
+        self.assertEqual(response.json(), {"id": self.entry.id, "to_buy": False})
+
+    def test_post_fragment(self):
+        """Test that the frontend gets only the re-rendered list item"""
+        response = self.client.post(
+            reverse("catalog:update", args=[self.entry.id]),
+            headers={"X-Fragment": "1"},
+        )
+        self.assertTemplateUsed(response, "catalog/_entry_item.html")
+        self.assertTemplateNotUsed(response, "catalog/base.html")
+        self.assertContains(response, "catalog_item_moved")
+        self.assertContains(response, "Test Item Definition")
+
+    def test_toggle_is_one_query(self):
+        """Test that the toggle is a single UPDATE"""
+        with self.assertNumQueries(1):
+            CatalogEntry.objects.filter(id=self.entry.id).toggle_to_buy()
+
     def test_update_requires_login(self):
         """Test that update view requires login"""
         self.client.logout()
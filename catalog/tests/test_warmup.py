@@ -0,0 +1,85 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import warmup
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+
+
+class ReadyViewTests(TestCase):
+    def setUp(self):
+        self.addCleanup(warmup.warmup_done.clear)
+
+    def test_ready_without_warmup(self):
+        """Test that only the migrations are required when WARMUP is off"""
+        response = self.client.get(reverse("catalog:ready"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["migrations"])
+
+    @override_settings(WARMUP=True)
+    def test_not_ready_until_warmed_up(self):
+        """Test that the probe fails until the warmup is done"""
+        warmup.warmup_done.clear()
+        response = self.client.get(reverse("catalog:ready"))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()["warmup"])
+
+        warmup.warmup()
+        self.assertEqual(self.client.get(reverse("catalog:ready")).status_code, 200)
+
+    def test_not_ready_before_migrations(self):
+        """Test that the probe fails while migrations are missing"""
+        with mock.patch.object(warmup, "_migrated", set()):
+            with mock.patch(
+                "django.db.migrations.executor.MigrationExecutor.migration_plan",
+                return_value=[("catalog", "0099_missing")],
+            ):
+                response = self.client.get(reverse("catalog:ready"))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()["migrations"])
+
+
+@override_settings(PAGE_CACHE=True)
+class WarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(warmup.warmup_done.clear)
+        self.user = create_user()
+        self.user.last_login = timezone.now()
+        self.user.save()
+        catalog_group = create_catalog_group(owner=self.user)
+        create_catalog_entry(create_item_definition(name="Milk"), catalog_group)
+
+    def test_primes_page_cache(self):
+        """Test that the first request of an active user is a cache hit"""
+        summary = warmup.warmup()
+        self.assertEqual(summary["users"], 1)
+        self.assertTrue(warmup.warmup_done.is_set())
+
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get(reverse("catalog:index"))
+        self.assertEqual(response.wsgi_request.cache_status, "hit")
+        self.assertContains(response, "Milk")
+
+    def test_skips_inactive_users(self):
+        """Test that users who haven't logged in lately are left cold"""
+        self.user.last_login = timezone.now() - timedelta(days=60)
+        self.user.save()
+        self.assertEqual(warmup.warmup()["users"], 0)
+
+    def test_command(self):
+        """Test that the warmup command reports what it loaded"""
+        out = StringIO()
+        call_command("warmup", stdout=out)
+        self.assertIn("primed 1 users", out.getvalue())
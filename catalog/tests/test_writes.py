@@ -0,0 +1,199 @@
+import threading
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, transaction
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from .. import writes
+from ..middleware import WriteTimeoutMiddleware
+from ..models import CatalogEntry, CatalogGroup, ItemDefinition
+from ..writes import WriteCoordinator, WriteOperation, WriteTimeout, write
+from .test_factories import (
+    create_catalog_entry,
+    create_catalog_group,
+    create_item_definition,
+    create_user,
+)
+from .test_sharding import SHARD, ShardDatabaseMixin
+
+
+@override_settings(WRITE_COORDINATOR=True)
+class WriteInTransactionTests(TestCase):
+    def test_runs_inline_inside_transaction(self):
+        """Test that writes inside a transaction don't wait for the writer"""
+        with mock.patch.object(writes, "get_coordinator") as get_coordinator:
+            self.assertEqual(
+                write(threading.current_thread), threading.current_thread()
+            )
+        get_coordinator.assert_not_called()
+
+
+class WriteCoordinatorTests(ShardDatabaseMixin, TransactionTestCase):
+    def setUp(self):
+        self.coordinator = WriteCoordinator(batch_size=10)
+        self.addCleanup(self.coordinator.join, 5)
+        self.addCleanup(self.coordinator.stop)
+
+    def submit(self, func, **kwargs):
+        return self.coordinator.submit(
+            WriteOperation(func, (), kwargs, [DEFAULT_DB_ALIAS])
+        )
+
+    def test_group_commit(self):
+        """Test that waiting writes are committed in a single transaction"""
+        commits = []
+        commit = self.coordinator.commit
+        self.coordinator.commit = lambda databases, operations: (
+            commits.append(len(operations)),
+            commit(databases, operations),
+        )
+        futures = [
+            self.submit(CatalogGroup.objects.create, name=f"Catalog {n}")
+            for n in range(3)
+        ]
+        self.coordinator.start()
+        names = [future.result(5).name for future in futures]
+        self.assertEqual(names, ["Catalog 0", "Catalog 1", "Catalog 2"])
+        self.assertEqual(commits, [3])
+        self.assertEqual(CatalogGroup.objects.count(), 3)
+
+    def test_failed_write_is_isolated(self):
+        """Test that a failing write only rolls back its own savepoint"""
+        first = self.submit(CatalogGroup.objects.create, name="Catalog")
+        duplicate = self.submit(CatalogGroup.objects.create, name="Catalog")
+        other = self.submit(CatalogGroup.objects.create, name="Other")
+        self.coordinator.start()
+        first.result(5)
+        other.result(5)
+        with self.assertRaises(IntegrityError):
+            duplicate.result(5)
+        self.assertEqual(CatalogGroup.objects.count(), 2)
+
+    def test_retries_locked_batch(self):
+        """Test that a batch finding the database locked is retried"""
+        attempts = []
+
+        def create():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+            return CatalogGroup.objects.create(name="Catalog")
+
+        future = self.submit(create)
+        self.coordinator.start()
+        self.assertEqual(future.result(5).name, "Catalog")
+        self.assertEqual(len(attempts), 2)
+
+    def test_retry_rolls_back_every_database(self):
+        """Test that a retried batch leaves nothing behind in any database"""
+        self.add_shard()
+        catalog_group = create_catalog_group()
+        attempts = []
+
+        def create():
+            item_definition = ItemDefinition.objects.create(name="Milk")
+            CatalogEntry.objects.using(SHARD).create(
+                item_definition=item_definition, catalog_group=catalog_group
+            )
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+            return item_definition
+
+        future = self.coordinator.submit(
+            WriteOperation(create, (), {}, [DEFAULT_DB_ALIAS, SHARD])
+        )
+        self.coordinator.start()
+        future.result(5)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(ItemDefinition.objects.count(), 1)
+        self.assertEqual(CatalogEntry.objects.using(SHARD).count(), 1)
+
+    def test_results_wait_for_commit(self):
+        """Test that results are only handed back once they are committed"""
+
+        def create():
+            catalog_group = CatalogGroup.objects.create(name="Catalog")
+            self.assertTrue(transaction.get_connection().in_atomic_block)
+            return catalog_group
+
+        future = self.submit(create)
+        self.coordinator.start()
+        future.result(5)
+        self.assertTrue(CatalogGroup.objects.filter(name="Catalog").exists())
+
+
+@override_settings(WRITE_COORDINATOR=True)
+class CoordinatedViewTests(TransactionTestCase):
+    def setUp(self):
+        self.addCleanup(self.stop_coordinator)
+        user = create_user()
+        self.catalog_group = create_catalog_group(owner=user)
+        self.client.force_login(user)
+
+    def stop_coordinator(self):
+        for coordinator in list(writes._coordinators.values()):
+            coordinator.stop()
+            coordinator.join(5)
+
+    def test_toggle_and_create(self):
+        """Test that the item views write through the coordinator"""
+        entry = create_catalog_entry(create_item_definition(), self.catalog_group)
+        with mock.patch.object(
+            WriteOperation, "run", autospec=True, side_effect=WriteOperation.run
+        ) as run:
+            response = self.client.post(
+                reverse("catalog:update", args=[entry.pk]),
+                HTTP_ACCEPT="application/json",
+            )
+            self.assertEqual(response.json(), {"id": entry.pk, "to_buy": True})
+
+            self.client.post(reverse("catalog:create"), {"name": "Milk"})
+        self.assertEqual(run.call_count, 2)
+        self.assertTrue(
+            CatalogEntry.objects.filter(
+                item_definition__name="Milk", catalog_group=self.catalog_group
+            ).exists()
+        )
+
+    def test_writer_per_databases(self):
+        """Test that writes to different databases get their own writer"""
+        default = writes.get_coordinator((DEFAULT_DB_ALIAS,))
+        self.assertIs(writes.get_coordinator((DEFAULT_DB_ALIAS,)), default)
+        shard = writes.get_coordinator((DEFAULT_DB_ALIAS, SHARD))
+        self.assertIsNot(shard, default)
+        self.assertTrue(shard.is_alive())
+
+    def test_timeout_response(self):
+        """Test that a write the writer doesn't get to is answered with 503"""
+        entry = create_catalog_entry(create_item_definition(), self.catalog_group)
+        with mock.patch.object(
+            writes, "get_coordinator", return_value=WriteCoordinator()
+        ), self.settings(WRITE_TIMEOUT=0.01):
+            response = self.client.post(
+                reverse("catalog:update", args=[entry.pk]),
+                HTTP_ACCEPT="application/json",
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("reload", response.json()["error"])
+        entry.refresh_from_db()
+        self.assertFalse(entry.to_buy)
+
+    def test_timeout_response_format(self):
+        """Test that only API requests get the 503 as JSON"""
+        middleware = WriteTimeoutMiddleware(lambda request: None)
+        factory = RequestFactory()
+        for path, content_type in [
+            (reverse("catalog:cataloggroup-list"), "application/json"),
+            ("/catalog/update/1/?name=capital", "text/plain"),
+            ("/capital/", "text/plain"),
+        ]:
+            response = middleware.process_exception(factory.post(path), WriteTimeout())
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Content-Type"], content_type)
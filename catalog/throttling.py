@@ -0,0 +1,55 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-user token bucket kept in the shared cache.
+
+    The view maps its actions to scopes with `throttle_scopes`, each scope in
+    settings.CATALOG_THROTTLE_RATES allows a burst of `burst` requests and
+    refills at `rate` requests per second. Actions without a scope are not
+    throttled. The bucket is read and written without a lock, so concurrent
+    requests may occasionally get one token too many, which is fine for
+    protecting the database from bursts.
+    """
+
+    cache = default_cache
+    cache_format = "throttle:%(scope)s:%(ident)s"
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_cache_key(self, request, view, scope):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": scope, "ident": ident}
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scopes", {}).get(getattr(view, "action", None))
+        if scope is None:
+            return True
+
+        burst = settings.CATALOG_THROTTLE_RATES[scope]["burst"]
+        rate = settings.CATALOG_THROTTLE_RATES[scope]["rate"]
+        key = self.get_cache_key(request, view, scope)
+        now = time.time()
+
+        tokens, updated_at = self.cache.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / rate
+            return False
+
+        # The entry can expire once the bucket would be full again anyway.
+        self.cache.set(key, (tokens - 1, now), math.ceil(burst / rate) + 1)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,114 @@
+"""
+Per-request phase timings used by catalog.middleware.ServerTimingMiddleware.
+The finished timings are kept on `request.timings` for logging and metrics.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Timer of the request being handled, read by the API serializers
+_current_timer = ContextVar("request_timer", default=None)
+
+
+@contextmanager
+def timing_request(timer):
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def measure_serialize():
+    """Adds the time spent in the block to the serialize phase, if timed"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.serialize += time.perf_counter() - started
+
+
+class RequestTimer:
+    """
+    Collects the phases of one request. It doubles as a database
+    execute_wrapper adding up the time spent in queries.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.render_started = None
+        self.render_finished = None
+        # Spent in serializer.data, inside the view
+        self.serialize = 0.0
+        self.db = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+
+    def start_render(self):
+        self.render_started = self.view_finished = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render_finished = time.perf_counter()
+
+    def finish(self):
+        """Returns the durations of all phases in milliseconds"""
+        finished = time.perf_counter()
+        if self.view_started is not None and self.view_finished is None:
+            # Responses that aren't rendered later come back from the view
+            # through the inner middleware, that time is counted as view time.
+            self.view_finished = finished
+        view = render = 0.0
+        if self.view_started is not None:
+            view = self.view_finished - self.view_started
+        if self.render_finished is not None:
+            render = self.render_finished - self.render_started
+        total = finished - self.started
+        return {
+            "middleware": (total - view - render) * 1000,
+            "view": (view - self.serialize) * 1000,
+            "serialize": self.serialize * 1000,
+            "render": render * 1000,
+            "db": self.db * 1000,
+            "queries": self.queries,
+            "total": total * 1000,
+        }
+
+
+def format_server_timing(timings):
+    """Formats timings as a Server-Timing header value"""
+    metrics = [
+        f"{name};dur={timings[name]:.2f}"
+        for name in ("middleware", "view", "serialize", "render")
+    ]
+    metrics.append(f'db;dur={timings["db"]:.2f};desc="{timings["queries"]} queries"')
+    metrics.append(f"total;dur={timings['total']:.2f}")
+    return ", ".join(metrics)
+
+
+class QueryCounter:
+    """Database execute_wrapper counting the queries of a request"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,91 @@
+"""
+Transports sending HTTP requests to the application, shared by the
+loadtest and memprofile commands: straight to the ASGI application of this
+process, or over the network to a running server.
+"""
+
+import asyncio
+import http.client
+from urllib.parse import urlsplit
+
+
+class AsgiTransport:
+    """Sends requests straight to the ASGI application of this process"""
+
+    def __init__(self):
+        from home_catalog.asgi import application
+
+        self.application = application
+
+    async def request(self, method, path, headers, body=b""):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        response = {"status": 0, "body": []}
+        finished = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Django listens for a disconnect while the view runs
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                if not message.get("more_body"):
+                    finished.set()
+
+        await self.application(scope, receive, send)
+        finished.set()
+        return response["status"], b"".join(response["body"])
+
+
+class HttpTransport:
+    """Sends the requests of one user to a running server over one connection"""
+
+    def __init__(self, url, executor):
+        parts = urlsplit(url)
+        self.host_header = parts.netloc
+        self.connection = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=30
+        )
+        self.executor = executor
+
+    def send(self, method, path, headers, body):
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnects on the next request
+            self.connection.close()
+            raise
+
+    async def request(self, method, path, headers, body=b""):
+        headers = dict(headers, Host=self.host_header)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self.send, method, path, headers, body
+        )
@@ -17,6 +17,11 @@ router.register(r"invitations", api_views.InvitationViewSet, basename="invitatio
 
 urlpatterns = [
     path("", views.CatalogListView.as_view(), name="index"),
+    path(
+        "fragments/list/",
+        views.CatalogListFragmentView.as_view(),
+        name="list-fragment",
+    ),
     path("create/", views.CatalogResourceCreateView.as_view(), name="create"),
     path(
         "create-catalog-group/",
@@ -37,4 +42,6 @@ urlpatterns = [
         name="logout",
     ),
     path("login/", views.CatalogLoginView.as_view(), name="login"),
+    path("slow-queries/", views.SlowQueriesView.as_view(), name="slow-queries"),
+    path("ready/", views.ReadyView.as_view(), name="ready"),
 ]
@@ -1,19 +1,59 @@
+from functools import partial
+from itertools import chain, islice
 from urllib.parse import urlencode, quote
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView, View, TemplateView
 from django.views.generic.edit import CreateView
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
-from django.db.models import Q
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseBadRequest
+from django.db import router
+from django.db.models import Count, Q
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.core.exceptions import ValidationError
 from .models import ItemDefinition, CatalogEntry, ItemGroup, CatalogGroup
+from . import page_cache
+from .slow_queries import slow_query_log
+from .warmup import is_ready, migrations_applied, warmup_done
+from .routers import reads_from_replica
+from .sharding import locked_shard
+from .writes import write
+from .catalog_context import catalog_filter, get_catalog_group
+from .negotiation import wants_json
+
+# Sent by the frontend when it swaps the response into the current page
+FRAGMENT_HEADER = "X-Fragment"
+
+
+def wants_fragment(request):
+    """True when the frontend asks for an HTML fragment instead of a page"""
+    return request.headers.get(FRAGMENT_HEADER) == "1"
 
 
 class QueryParamsMixin:
     """Mixin to handle query parameter validation and filtering"""
 
-    VALID_PARAMS = {"only_to_by", "group", "flat_view", "error", "name"}
+    VALID_PARAMS = {
+        "only_to_by",
+        "group",
+        "flat_view",
+        "error",
+        "name",
+        "after",
+        "stream",
+    }
+    # Position in the list, dropped from links that change the list
+    PAGE_PARAMS = {"after"}
 
     def get_query_state(self):
         """Get validated query parameters from request"""
@@ -25,22 +65,36 @@ class QueryParamsMixin:
             }
         return self._query_state
 
+    def get_list_query_state(self):
+        """Query parameters without the position in the list"""
+        return {
+            k: v for k, v in self.get_query_state().items() if k not in self.PAGE_PARAMS
+        }
+
     def encode_query(self, params=None):
         """Encode query parameters to URL string"""
         query_dict = params if params is not None else self.get_query_state()
         return urlencode(query_dict, quote_via=quote)
 
+    def lists_to_buy(self):
+        """The list shows the entries to buy, otherwise the ones not to buy"""
+        return bool(self.get_query_state().get("only_to_by"))
+
     def build_entry_query(self):
         """Build query for CatalogEntry filtering"""
-        query = Q(catalog_group__owners=self.request.user)
+        query = catalog_filter(self.request)
         params = self.get_query_state()
-
-        if params.get("only_to_by"):
-            query &= Q(to_buy=True)
-        else:
-            query &= Q(to_buy=False)
-
-        if params.get("group"):
+        query &= Q(to_buy=self.lists_to_buy())
+
+        if params.get("group") and params.get("flat_view"):
+            # Everything in the subtree, IN keeps items of several subgroups
+            # from being listed twice
+            query &= Q(
+                item_definition__in=ItemDefinition.objects.filter(
+                    group__in=ItemGroup.objects.subtree_of(params["group"])
+                ).values("pk")
+            )
+        elif params.get("group"):
             query &= Q(item_definition__group=params["group"])
         elif not params.get("flat_view"):
             query &= Q(item_definition__group=None)
@@ -48,19 +102,25 @@ class QueryParamsMixin:
         return query
 
     def get_groups_query(self):
-        """Build query for ItemGroup filtering"""
+        """
+        Build query for ItemGroup filtering: the subgroups of the selected
+        group (top level groups without one) that have entries anywhere in
+        their subtree, with the number of those entries as `entry_count`
+        """
         params = self.get_query_state()
-        groups = ItemGroup.objects.filter(
-            itemdefinition__catalogentry__catalog_group__owners=self.request.user
-        ).distinct()
-
-        if params.get("only_to_by"):
-            groups = groups.filter(itemdefinition__catalogentry__to_buy=True)
-
-        if params.get("group") or params.get("flat_view"):
-            groups = ItemGroup.objects.none()
-
-        return groups
+        if params.get("flat_view"):
+            return ItemGroup.objects.none()
+
+        entries = "descendant_links__descendant__itemdefinition__catalogentry"
+        # The entries the group would list, filtered before the annotation
+        # so the count joins only them and groups without any drop out
+        query = catalog_filter(self.request, f"{entries}__catalog_group_id")
+        query &= Q(**{f"{entries}__to_buy": self.lists_to_buy()})
+        return (
+            ItemGroup.objects.filter(parent=params.get("group"))
+            .filter(query)
+            .annotate(entry_count=Count(f"{entries}__pk", distinct=True))
+        )
 
 
 class CatalogResourceCreateView(LoginRequiredMixin, QueryParamsMixin, CreateView):
@@ -99,47 +159,190 @@ class CatalogResourceCreateView(LoginRequiredMixin, QueryParamsMixin, CreateView
             raise ValidationError({"name": "An item with this name already exists."})
 
         # Get the user's CatalogGroup
-        user = self.request.user
-        catalog_group = CatalogGroup.objects.filter(owners=user).first()
+        catalog_group = get_catalog_group(self.request)
         if not catalog_group:
             raise ValidationError("You must create a catalog group first.")
 
+        self.object = write(
+            self.save_item,
+            form,
+            catalog_group,
+            using=[
+                router.db_for_write(ItemDefinition),
+                router.db_for_write(CatalogEntry),
+            ],
+        )
+        return redirect(self.get_success_url())
+
+    def save_item(self, form, catalog_group):
         # Create ItemDefinition
         item_def = form.save()
 
         # Create CatalogEntry for the user
-        CatalogEntry.objects.create(
-            item_definition=item_def,
-            catalog_group=catalog_group,
-            to_buy=True,  # Default to true for new items
-        )
-
-        return super().form_valid(form)
+        with locked_shard(catalog_group):
+            CatalogEntry.objects.create(
+                item_definition=item_def,
+                catalog_group=catalog_group,
+                to_buy=True,  # Default to true for new items
+            )
+        return item_def
 
 
 class CatalogListView(LoginRequiredMixin, QueryParamsMixin, ListView):
+    """
+    Entries of the catalog, page_size at a time in name order. Pages are
+    addressed by the name of the last entry of the previous page (`after`),
+    so deep pages cost as much as the first one. `flat_view` with `stream`
+    sends all entries in one response, rendered in chunks while they are
+    read from the database.
+    """
+
     model = CatalogEntry
     template_name = "catalog/index.html"
     context_object_name = "latest_catalog_list"
+    page_key = None
+    page_size = 100
+    stream_chunk_size = 200
+    # Rendered where the streamed entries go, inside the list
+    STREAM_MARKER = "<!-- catalog entries -->"
+
+    def get(self, request, *args, **kwargs):
+        """Serves the page from the page cache when PAGE_CACHE is on"""
+        if not self.is_streamed():
+            self.page_key = page_cache.page_key(
+                request, self.template_name, self.get_query_state()
+            )
+        if self.page_key is None:
+            return super().get(request, *args, **kwargs)
+
+        response = page_cache.cached_response(request, self.page_key)
+        if response is not None:
+            request.cache_status = page_cache.HIT
+            return response
+        request.cache_status = page_cache.MISS
+        response = super().get(request, *args, **kwargs)
+        # The replica lags behind the version tokens, its pages aren't stored
+        key = None if reads_from_replica() else self.page_key
+        response.add_post_render_callback(partial(page_cache.store, request, key))
+        return response
+
+    def is_streamed(self):
+        params = self.get_query_state()
+        return bool(params.get("flat_view") and params.get("stream"))
 
     def get_queryset(self):
-        return self.model.objects.filter(self.build_entry_query())
+        queryset = self.model.objects.filter(self.build_entry_query()).select_related(
+            "item_definition"
+        )
+        after = self.get_query_state().get("after")
+        if after:
+            # Item names are unique, so they identify the position in the list
+            queryset = queryset.filter(item_definition__name__gt=after)
+        return queryset
+
+    def paginate_entries(self, queryset):
+        """
+        Returns the entries of the page and the `after` value of the next
+        page, None on the last one
+        """
+        entries = list(queryset[: self.page_size + 1])
+        if len(entries) <= self.page_size:
+            return entries, None
+        entries = entries[: self.page_size]
+        return entries, entries[-1].item_definition.name
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+        if self.is_streamed():
+            entries, next_after = [], None
+        else:
+            entries, next_after = self.paginate_entries(self.object_list)
+        context = super().get_context_data(object_list=entries, **kwargs)
         context.update(
             {
-                "query_dict": self.get_query_state(),
-                "query": self.encode_query(),
+                "query_dict": self.get_list_query_state(),
+                "query": self.encode_query(self.get_list_query_state()),
+                "page_query": self.encode_query(),
+                "after": self.get_query_state().get("after"),
+                "next_after": next_after,
                 "groups": self.get_groups_query(),
                 "selected_group": self.get_selected_group(),
+                "breadcrumbs": self.get_breadcrumbs()[:-1],
             }
         )
+        if self.is_streamed():
+            context["stream_marker"] = mark_safe(self.STREAM_MARKER)
+        if self.page_key is not None:
+            # The cached page is shared by requests with different tokens
+            context["csrf_token"] = page_cache.CSRF_PLACEHOLDER
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        if not self.is_streamed():
+            return super().render_to_response(context, **response_kwargs)
+
+        page = render_to_string(self.get_template_names(), context, self.request)
+        head, tail = page.split(self.STREAM_MARKER)
+        # Read lazily while the response is sent, the database has to be the
+        # one the routers picked for this request
+        entries = self.object_list.using(self.object_list.db).iterator(
+            chunk_size=self.stream_chunk_size
+        )
+        chunks = self.render_entries(entries, context["page_query"])
+        streaming_content = chain([head], chunks, [tail])
+        if isinstance(self.request, ASGIRequest):
+            # Daphne would read a plain iterator into memory before sending it
+            streaming_content = iterate_in_thread(streaming_content)
+        return StreamingHttpResponse(streaming_content, **response_kwargs)
+
+    def render_entries(self, entries, page_query):
+        """Renders the entries stream_chunk_size at a time"""
+        template = get_template("catalog/_entry_item.html")
+        context = {"page_query": page_query, "csrf_token": get_token(self.request)}
+        for batch in batched(entries, self.stream_chunk_size):
+            yield "".join(
+                template.render({**context, "catalog_item": entry}) for entry in batch
+            )
+
+    def get_breadcrumbs(self):
+        """The selected group and its ancestors from the root, one query"""
+        if not hasattr(self, "_breadcrumbs"):
+            group_id = self.get_query_state().get("group")
+            self._breadcrumbs = (
+                list(ItemGroup.objects.path_to(group_id)) if group_id else []
+            )
+            if group_id and not self._breadcrumbs:
+                raise Http404("No item group matches the given query.")
+        return self._breadcrumbs
+
     def get_selected_group(self):
-        group_id = self.get_query_state().get("group")
-        return get_object_or_404(ItemGroup, id=group_id) if group_id else None
+        breadcrumbs = self.get_breadcrumbs()
+        return breadcrumbs[-1] if breadcrumbs else None
+
+
+async def iterate_in_thread(iterator):
+    """
+    Async iterator over a sync one. The items are produced in the thread
+    of the request, which owns its database connections.
+    """
+    next_item = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (item := await next_item(iterator, done)) is not done:
+        yield item
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class CatalogListFragmentView(CatalogListView):
+    """
+    The list section of the index page without the page around it, used by
+    the frontend to drill down and switch filters without a full page load
+    """
+
+    template_name = "catalog/_catalog_section.html"
 
 
 class CatalogGroupCreateView(LoginRequiredMixin, CreateView):
@@ -161,23 +364,47 @@ class CatalogGroupCreateView(LoginRequiredMixin, CreateView):
 
 class ItemGroupCreateView(LoginRequiredMixin, CreateView):
     model = ItemGroup
-    fields = ["title"]
+    fields = ["title", "parent"]
     success_url = reverse_lazy("catalog:index")
     template_name = "catalog/itemgroup_form.html"
 
 
 class UpdateEntryStatusView(LoginRequiredMixin, QueryParamsMixin, View):
-    """Toggle item's to_buy status"""
+    """
+    Toggle item's to_buy status. Responds with {"id", "to_buy"} when JSON is
+    requested, with the re-rendered list item when a fragment is requested,
+    otherwise redirects back to the list.
+    """
 
     def post(self, request, entry_id):
-        entry = get_object_or_404(
-            CatalogEntry, id=entry_id, catalog_group__owners=request.user
-        )
-        entry.to_buy = not entry.to_buy
-        entry.save()
-
+        entries = CatalogEntry.objects.filter(catalog_filter(request), id=entry_id)
+        toggled = write(self.toggle, entries, get_catalog_group(request))
+        if not toggled:
+            raise Http404("No catalog entry matches the given query.")
+
+        if wants_json(request):
+            return JsonResponse({"id": entry_id, "to_buy": toggled[entry_id]})
+        if wants_fragment(request):
+            entry = CatalogEntry.objects.select_related("item_definition").get(
+                id=entry_id
+            )
+            only_to_by = bool(self.get_query_state().get("only_to_by"))
+            return TemplateResponse(
+                request,
+                "catalog/_entry_item.html",
+                {
+                    "catalog_item": entry,
+                    "page_query": self.encode_query(),
+                    # The item no longer matches the list it is shown in
+                    "moved": entry.to_buy != only_to_by,
+                },
+            )
         return redirect(f"{reverse_lazy('catalog:index')}?{self.encode_query()}")
 
+    def toggle(self, entries, catalog_group):
+        with locked_shard(catalog_group):
+            return entries.toggle_to_buy()
+
     def get(self, request, *args, **kwargs):
         return HttpResponseBadRequest("POST method required")
 
@@ -189,3 +416,31 @@ class CatalogLoginView(TemplateView):
         if request.user.is_authenticated:
             return redirect("catalog:index")
         return super().dispatch(request, *args, **kwargs)
+
+
+class SlowQueriesView(UserPassesTestMixin, View):
+    """Slowest queries recorded by this process, superusers only"""
+
+    def test_func(self):
+        return self.request.user.is_superuser
+
+    def get(self, request):
+        return JsonResponse({"queries": slow_query_log.top()})
+
+
+class ReadyView(View):
+    """
+    Readiness probe: 200 once the migrations are applied and the warmup of
+    this process is done, 503 before that
+    """
+
+    def get(self, request):
+        ready = is_ready()
+        return JsonResponse(
+            {
+                "ready": ready,
+                "migrations": migrations_applied(),
+                "warmup": warmup_done.is_set(),
+            },
+            status=200 if ready else 503,
+        )
@@ -0,0 +1,174 @@
+"""
+Startup warmup, run by `manage.py warmup` or in a thread of every server
+process when WARMUP is set. It waits for the migrations, reads the hot
+tables and indexes into the OS page cache, loads the views and templates
+and primes the auth and page caches of recently active users, so the first
+requests after a deploy don't pay for all of that. /catalog/ready/ reports
+ready once it is done.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from .auth_cache import USER_KEY, get_user_catalog_group
+from .catalog_context import set_catalog_group
+from .models import (
+    CatalogEntry,
+    CatalogGroup,
+    ItemDefinition,
+    ItemGroup,
+    ItemGroupClosure,
+)
+
+logger = logging.getLogger("catalog.warmup")
+
+# Read in full at startup, every list page touches them
+HOT_MODELS = [CatalogEntry, ItemDefinition, ItemGroup, ItemGroupClosure, CatalogGroup]
+HOT_TEMPLATES = [
+    "catalog/index.html",
+    "catalog/_catalog_section.html",
+    "catalog/_entry_item.html",
+]
+# Bytes read per call while loading the database file
+READ_CHUNK_SIZE = 1 << 20
+
+warmup_done = threading.Event()
+# Databases known to be fully migrated
+_migrated = set()
+
+
+def migrations_applied():
+    """
+    True once every migration is applied to the default database and the
+    shards, remembered after that
+    """
+    for alias in [DEFAULT_DB_ALIAS, *settings.SHARDS]:
+        if alias not in _migrated:
+            executor = MigrationExecutor(connections[alias])
+            if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+                return False
+            _migrated.add(alias)
+    return True
+
+
+def is_ready():
+    """Migrations are applied and the warmup of this process is done"""
+    return migrations_applied() and (not settings.WARMUP or warmup_done.is_set())
+
+
+def load_database_file(using=DEFAULT_DB_ALIAS):
+    """
+    Reads the SQLite file up to WARMUP_MAX_BYTES into the OS page cache,
+    returns the number of bytes read
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return 0
+    size = 0
+    with open(connection.settings_dict["NAME"], "rb") as database_file:
+        while size < settings.WARMUP_MAX_BYTES:
+            chunk = database_file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+    return size
+
+
+def load_hot_tables(using=DEFAULT_DB_ALIAS):
+    """Counts the hot tables, which also opens their indexes"""
+    for model in HOT_MODELS:
+        model.objects.using(using).count()
+
+
+def load_templates():
+    # Compiled templates stay in the cached loader of this process
+    from . import api_views, views  # noqa: F401
+
+    for template_name in HOT_TEMPLATES:
+        get_template(template_name)
+
+
+def active_users():
+    since = timezone.now() - timedelta(days=settings.WARMUP_ACTIVE_DAYS)
+    return User.objects.filter(last_login__gte=since, is_active=True).order_by(
+        "-last_login"
+    )[: settings.WARMUP_USERS]
+
+
+def render_first_page(user, catalog_group):
+    """Renders the catalog list of the user, storing it in the page cache"""
+    from .views import CatalogListView
+
+    request = RequestFactory().get(reverse("catalog:index"))
+    request.user = user
+    # Never saved, the page doesn't depend on the session
+    request.session = SessionBase()
+    request.catalog_group = catalog_group
+    set_catalog_group(request, user, catalog_group)
+    response = CatalogListView.as_view()(request)
+    if hasattr(response, "render"):
+        response.render()
+
+
+def prime_caches():
+    """Primes the auth and page caches of active users, returns their count"""
+    count = 0
+    for user in active_users():
+        catalog_group = get_user_catalog_group(user)
+        if settings.CACHED_AUTH:
+            cache.set(USER_KEY.format(user.pk), user, settings.CACHED_AUTH_TIMEOUT)
+        if catalog_group is not None and settings.PAGE_CACHE:
+            render_first_page(user, catalog_group)
+        count += 1
+    return count
+
+
+def warmup():
+    """Runs every warmup step, returns a summary of what was loaded"""
+    started = time.perf_counter()
+    summary = {"bytes": load_database_file()}
+    load_hot_tables()
+    load_templates()
+    summary["users"] = prime_caches()
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    warmup_done.set()
+    logger.info("Warmup done %s", summary)
+    return summary
+
+
+def wait_and_warmup(poll_interval=1.0):
+    """
+    Waits until the migrations are applied, the deploy runs them after the
+    container started, then warms up. A failed warmup is logged and doesn't
+    keep the process from becoming ready.
+    """
+    try:
+        while not migrations_applied():
+            time.sleep(poll_interval)
+        warmup()
+    except Exception:
+        logger.exception("Warmup failed")
+        warmup_done.set()
+    finally:
+        connections.close_all()
+
+
+def start_warmup():
+    thread = threading.Thread(
+        target=wait_and_warmup, name="catalog-warmup", daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,182 @@
+"""
+Opt-in single writer, enabled by WRITE_COORDINATOR. Request handlers pass
+their writes to a writer thread instead of opening a write transaction
+each. Every set of databases written together has its own writer per
+process, so writes to different shards still commit in parallel. A writer
+runs the waiting writes in one transaction per database, each in its own
+savepoint (group commit), and hands the results back to the waiting
+requests. Batches that find a
+database locked by another process are retried with backoff instead of
+failing.
+"""
+
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+
+from .models import CatalogEntry
+from .routers import current_shard, use_shard
+
+logger = logging.getLogger("catalog.writes")
+
+# Attempts of a batch that finds the database locked, the first retry waits
+# LOCKED_BACKOFF seconds, then twice as long each time
+LOCKED_ATTEMPTS = 5
+LOCKED_BACKOFF = 0.01
+
+
+class WriteTimeout(Exception):
+    """
+    The writer didn't run the write within WRITE_TIMEOUT. It is still queued
+    and may be committed later.
+    """
+
+
+def is_locked(exc):
+    return isinstance(exc, OperationalError) and "locked" in str(exc)
+
+
+@contextmanager
+def atomic(databases):
+    """A transaction, or a savepoint inside one, on each of the databases"""
+    with ExitStack() as stack:
+        for alias in databases:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+class WriteOperation:
+    def __init__(self, func, args, kwargs, databases):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # Every database the write touches, sorted to group equal sets
+        self.databases = tuple(sorted(set(databases)))
+        # Connections are per thread, only the routing state moves along
+        self.shard = current_shard()
+        self.future = Future()
+
+    def run(self):
+        with use_shard(self.shard):
+            return self.func(*self.args, **self.kwargs)
+
+
+class WriteCoordinator(threading.Thread):
+    """Runs submitted writes in batches of up to batch_size per transaction"""
+
+    def __init__(self, batch_size=32, name="catalog-write-coordinator"):
+        super().__init__(name=name, daemon=True)
+        self.batch_size = batch_size
+        self.operations = queue.SimpleQueue()
+
+    def submit(self, operation):
+        self.operations.put(operation)
+        return operation.future
+
+    def stop(self):
+        self.operations.put(None)
+
+    def run(self):
+        try:
+            while True:
+                batch = [self.operations.get()]
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.operations.get_nowait())
+                    except queue.Empty:
+                        break
+                stopped = batch[-1] is None
+                operations = [operation for operation in batch if operation]
+                groups = defaultdict(list)
+                for operation in operations:
+                    groups[operation.databases].append(operation)
+                for databases, group in groups.items():
+                    self.commit(databases, group)
+                if stopped:
+                    break
+        finally:
+            connections.close_all()
+
+    def commit(self, databases, operations):
+        """
+        Runs the operations in one transaction per database and resolves
+        their futures. A retried batch is rolled back everywhere first.
+        """
+        for attempt in range(LOCKED_ATTEMPTS):
+            outcomes = []
+            try:
+                with atomic(databases):
+                    for operation in operations:
+                        try:
+                            with atomic(databases):
+                                outcomes.append((operation.run(), None))
+                        except Exception as exc:
+                            if is_locked(exc):
+                                raise
+                            outcomes.append((None, exc))
+                break
+            except Exception as exc:
+                if is_locked(exc) and attempt + 1 < LOCKED_ATTEMPTS:
+                    time.sleep(LOCKED_BACKOFF * 2**attempt)
+                    continue
+                logger.exception("Write batch of %s failed", len(operations))
+                outcomes = [(None, exc)] * len(operations)
+                break
+
+        for operation, (result, exc) in zip(operations, outcomes):
+            if exc is None:
+                operation.future.set_result(result)
+            else:
+                operation.future.set_exception(exc)
+
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+
+def get_coordinator(databases):
+    """The writer thread of this process for `databases`, started on first use"""
+    with _coordinators_lock:
+        coordinator = _coordinators.get(databases)
+        if coordinator is None or not coordinator.is_alive():
+            coordinator = WriteCoordinator(
+                batch_size=settings.WRITE_BATCH_SIZE,
+                name=f"catalog-write-coordinator-{'-'.join(databases)}",
+            )
+            coordinator.start()
+            _coordinators[databases] = coordinator
+        return coordinator
+
+
+def write(func, *args, using=None, **kwargs):
+    """
+    Returns func(*args, **kwargs), run by the writer thread when
+    WRITE_COORDINATOR is on. `using` is the database, or the list of every
+    database, func writes to. It defaults to the database of the current
+    catalog's entries. Writes inside a transaction run right away, the
+    writer would wait for the lock that transaction holds. Raises
+    WriteTimeout when the writer doesn't get to the write in time.
+    """
+    if using is None:
+        using = router.db_for_write(CatalogEntry)
+    databases = [using] if isinstance(using, str) else using
+    if (
+        not settings.WRITE_COORDINATOR
+        or any(connections[alias].in_atomic_block for alias in databases)
+        or isinstance(threading.current_thread(), WriteCoordinator)
+    ):
+        return func(*args, **kwargs)
+    operation = WriteOperation(func, args, kwargs, databases)
+    future = get_coordinator(operation.databases).submit(operation)
+    try:
+        return future.result(timeout=settings.WRITE_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        raise WriteTimeout(func) from None
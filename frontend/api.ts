@@ -33,3 +33,29 @@ export const buyApi = async (ctx: Window, pk: number, toBuy: boolean): Promise<C
   .then(response => response.json())
 };
 
+
+// Asks the views for an HTML fragment instead of a whole page
+const FRAGMENT_HEADERS = { 'X-Fragment': '1' };
+
+const textOrThrow = (response: Response): Promise<string> => {
+  if (!response.ok) {
+    throw new Error(`${response.status}`);
+  }
+  return response.text();
+};
+
+export const fragmentApi = async (url: string): Promise<string> => {
+  return fetch(url, { headers: FRAGMENT_HEADERS })
+    .then(textOrThrow)
+};
+
+export const toggleApi = async (ctx: Window, url: string): Promise<string> => {
+  return fetch(url, {
+    method: 'POST',
+    headers: {
+      ...FRAGMENT_HEADERS,
+      'X-CSRFToken': getCsrfToken(ctx),
+    },
+  })
+  .then(textOrThrow)
+};
@@ -0,0 +1,63 @@
+import { fragmentApi } from "./api";
+import { asserFalsy, assertType, DOM_ERROR } from "./utils/assert";
+
+declare global {
+  interface Window {
+    Element: typeof Element,
+    HTMLAnchorElement: typeof HTMLAnchorElement,
+    HTMLFormElement: typeof HTMLFormElement,
+    URLSearchParams: typeof URLSearchParams,
+    FormData: typeof FormData,
+  }
+}
+
+/**
+ * Group drill-down and the filter buttons of the list only replace the list
+ * section with its fragment, the browser history keeps the full page URLs.
+ */
+export const initFragments = (ctx: Window, selector: string) => {
+  const section = ctx.document.querySelector<HTMLElement>(selector);
+  if (!section) {
+    return;
+  }
+  const fragmentUrl = section.dataset.fragmentUrl;
+  asserFalsy(fragmentUrl, DOM_ERROR);
+  const pagePath = ctx.location.pathname;
+
+  const load = (search: string, push: boolean) => {
+    fragmentApi(`${fragmentUrl}${search}`)
+      .then((html) => {
+        section.innerHTML = html;
+        if (push) {
+          ctx.history.pushState(null, '', `${pagePath}${search}`);
+        }
+      })
+      .catch(() => {
+        ctx.location.href = `${pagePath}${search}`;
+      });
+  };
+
+  section.addEventListener('click', (event) => {
+    assertType(event.target, ctx.Element);
+    const link = event.target.closest('a');
+    if (!(link instanceof ctx.HTMLAnchorElement) || link.pathname !== pagePath) {
+      return;
+    }
+    event.preventDefault();
+    load(link.search, true);
+  });
+
+  section.addEventListener('submit', (event) => {
+    const form = event.target;
+    assertType(form, ctx.HTMLFormElement);
+    if (form.method !== 'get') {
+      return;
+    }
+    event.preventDefault();
+    const data = new ctx.FormData(form, (event as SubmitEvent).submitter);
+    const params = new ctx.URLSearchParams(data as unknown as Record<string, string>);
+    load(`?${params}`, true);
+  });
+
+  ctx.addEventListener('popstate', () => load(ctx.location.search, false));
+};
@@ -1,5 +1,9 @@
 import { intSelect } from './app';
+import { initFragments } from './fragments';
+import { initToggle } from './toggle';
 
 window.addEventListener('load', () => {
     intSelect(window, '.search-select');
+    initToggle(window, '.catalog_section');
+    initFragments(window, '.catalog_section');
 });
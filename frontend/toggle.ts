@@ -0,0 +1,35 @@
+import { toggleApi } from "./api";
+import { assertType } from "./utils/assert";
+
+declare global {
+  interface Window {
+    HTMLFormElement: typeof HTMLFormElement
+  }
+}
+
+/**
+ * Toggles entries of the list without reloading the page, only the
+ * toggled item is re-rendered. On errors the form is submitted as usual.
+ */
+export const initToggle = (ctx: Window, selector: string) => {
+  const section = ctx.document.querySelector(selector);
+  if (!section) {
+    return;
+  }
+  section.addEventListener('submit', (event) => {
+    const form = event.target;
+    assertType(form, ctx.HTMLFormElement);
+    if (form.method !== 'post') {
+      return;
+    }
+    event.preventDefault();
+    toggleApi(ctx, form.action)
+      .then((html) => {
+        const item = form.closest('li');
+        if (item) {
+          item.outerHTML = html;
+        }
+      })
+      .catch(() => form.submit());
+  });
+};
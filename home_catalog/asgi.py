@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "home_catalog.settings")
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TASK_WORKER_THREAD:
+    from catalog.tasks import start_worker  # noqa: E402
+
+    start_worker()
+
+if settings.WARMUP:
+    from catalog.warmup import start_warmup  # noqa: E402
+
+    start_warmup()
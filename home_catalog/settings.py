@@ -49,16 +49,24 @@ STORAGES = {
 }
 
 MIDDLEWARE = [
+    "catalog.middleware.AccessLogMiddleware",
+    "catalog.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "catalog.middleware.SlowQueryMiddleware",
+    "catalog.middleware.NPlusOneMiddleware",
+    "catalog.middleware.ReplicaRoutingMiddleware",
+    "catalog.middleware.ShardRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "catalog.middleware.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "catalog.middleware.CatalogGroupMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "catalog.middleware.RedirectToCreateCatalogMiddleware",
+    "catalog.middleware.WriteTimeoutMiddleware",
 ]
 
 ROOT_URLCONF = "home_catalog.urls"
@@ -93,6 +101,68 @@ DATABASES = {
     }
 }
 
+# Optional read-only replica of the default database, e.g. a snapshot kept up
+# to date by `manage.py refresh_replica --interval 30`. Safe-method requests
+# read catalog data from it, see catalog.routers.ReplicaRouter.
+DATABASE_REPLICA = os.environ.get("DATABASE_REPLICA")
+if DATABASE_REPLICA:
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"file:{DATABASE_REPLICA}?mode=ro",
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Optional shards: SHARDS=4 keeps the entries of every catalog in one of
+# four more SQLite files, so catalogs in different shards don't wait for each
+# other's writes. Users, items and groups stay in the default database. See
+# catalog.routers.ShardRouter and the rebalance_shards command.
+SHARDS = [f"shard_{n}" for n in range(int(os.environ.get("SHARDS", 0)))]
+for alias in SHARDS:
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db" / f"home_catalog_{alias}.sqlite3",
+    }
+
+DATABASE_ROUTERS = ["catalog.routers.ShardRouter", "catalog.routers.ReplicaRouter"]
+
+# Seconds a client keeps reading from the default database after a write,
+# should be longer than the replica refresh interval
+REPLICA_STICKY_SECONDS = 60
+
+
+# Cache shared by sessions, cached users and other per-request shortcuts.
+# Set CACHE_DIR so that all worker processes of the serve command share it.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if os.environ.get("CACHE_DIR"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ["CACHE_DIR"],
+    }
+
+# Opt-in: keep sessions, users and their catalog groups in the cache so the
+# auth plumbing of a warm request makes no database queries
+CACHED_AUTH = bool(os.environ.get("CACHED_AUTH"))
+# Seconds a cached user or catalog group is kept, entries are also dropped
+# as soon as the underlying rows change
+CACHED_AUTH_TIMEOUT = 300
+if CACHED_AUTH:
+    SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+    MIDDLEWARE[
+        MIDDLEWARE.index("django.contrib.auth.middleware.AuthenticationMiddleware")
+    ] = "catalog.middleware.CachedAuthenticationMiddleware"
+
+# Opt-in: cache rendered catalog list pages per user, catalog and query
+# state, see catalog/page_cache.py. With several serve workers CACHE_DIR has
+# to be set as well, otherwise workers don't see each other's invalidations.
+PAGE_CACHE = bool(os.environ.get("PAGE_CACHE"))
+# Seconds a rendered page is kept, pages are dropped as soon as the catalog,
+# its items or the user change
+PAGE_CACHE_TIMEOUT = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -141,12 +211,34 @@ LOGGING = {
         "django.db.backends": {
             "level": "DEBUG",
             "handlers": ["console"],
-        }
+        },
+        "catalog.access": {
+            "level": "INFO",
+            "handlers": ["access"],
+            "propagate": False,
+        },
+        "catalog.slow_queries": {
+            "level": "WARNING",
+            "handlers": ["background"],
+            "propagate": False,
+        },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
         },
+        "background": {
+            "class": "catalog.log_handlers.BackgroundHandler",
+        },
+        "access": {
+            "class": "catalog.log_handlers.BackgroundHandler",
+            "formatter": "json",
+        },
+    },
+    "formatters": {
+        "json": {
+            "()": "catalog.log_handlers.JsonFormatter",
+        },
     },
     "root": {
         "handlers": ["console"],
@@ -154,6 +246,63 @@ LOGGING = {
     },
 }
 ASGI_APPLICATION = "home_catalog.asgi.application"
+
+# Queries slower than SLOW_QUERY_THRESHOLD_MS milliseconds are logged to
+# "catalog.slow_queries" with a probability of SLOW_QUERY_SAMPLE_RATE (0
+# disables the recorder), the slowest SLOW_QUERY_TOP_N are kept in memory
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_SAMPLE_RATE", 1.0))
+SLOW_QUERY_TOP_N = 50
+
+# "log" warns about N+1 queries with their call site, "raise" fails the
+# request (the pytest suite does that, see catalog/tests/conftest.py). A query
+# counts as N+1 when it runs NPLUSONE_THRESHOLD times from the same place.
+NPLUSONE_DETECTION = "log" if DEBUG else None
+NPLUSONE_THRESHOLD = 3
+
+# Opt-in: log every request as JSON to the "catalog.access" logger
+ACCESS_LOG = bool(os.environ.get("ACCESS_LOG"))
+
+# Opt-in: send a Server-Timing header with the middleware, view, render and
+# database time of every request
+SERVER_TIMING = bool(os.environ.get("SERVER_TIMING"))
+
+# Background tasks, see catalog/tasks.py. TASK_WORKER_THREAD runs a worker
+# thread in every server process, `manage.py worker` runs one standalone.
+# TASKS_EAGER runs tasks inside enqueue() instead. Always on with SHARDS, which
+# leave deleting the entries of deleted catalogs and items to a task.
+TASK_WORKER_THREAD = bool(os.environ.get("TASK_WORKER_THREAD") or SHARDS)
+TASKS_EAGER = False
+# Seconds between polls of an idle worker, tasks claimed per poll
+TASK_POLL_INTERVAL = 1.0
+TASK_BATCH_SIZE = 20
+# Seconds after which a running task whose worker died is run again
+TASK_LEASE_SECONDS = 300
+# Days finished tasks are kept
+TASK_RETENTION_DAYS = 7
+
+# Opt-in: hand the writes of the item views to a writer thread per process and
+# set of databases that commits them in batches, see catalog/writes.py
+WRITE_COORDINATOR = bool(os.environ.get("WRITE_COORDINATOR"))
+# Writes committed per transaction, seconds a request waits for its write
+# before it gets a 503 (WriteTimeoutMiddleware)
+WRITE_BATCH_SIZE = 32
+WRITE_TIMEOUT = 30
+
+# Warm up every server process in a thread once the migrations are applied,
+# /catalog/ready/ answers 503 until then. See catalog/warmup.py.
+WARMUP = bool(os.environ.get("WARMUP"))
+# Bytes of the SQLite file read into the OS page cache
+WARMUP_MAX_BYTES = 512 * 1024 * 1024
+# Users who logged in within this many days get their caches primed, at most
+# WARMUP_USERS of them
+WARMUP_ACTIVE_DAYS = 14
+WARMUP_USERS = 50
+
+# Number of ASGI worker processes started by the serve command, 0 means one
+# worker per CPU core
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", 0))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ALLOWED_HOSTS = ["erdmko.dev", "localhost"]
 CSRF_TRUSTED_ORIGINS = ["https://erdmko.dev", "http://localhost"]
@@ -180,6 +329,14 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
 }
 
+# Token buckets of catalog.throttling.TokenBucketThrottle: every user may send
+# `burst` requests at once, refilled at `rate` requests per second
+CATALOG_THROTTLE_RATES = {
+    "search": {"burst": 20, "rate": 2},
+    "write": {"burst": 30, "rate": 2},
+    "invitation": {"burst": 5, "rate": 0.05},
+}
+
 try:
     from .local_settings import *  # noqa: F403
 except ImportError: